@@ -0,0 +1,52 @@
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+from utils.stats_engine import STORED_COUNTER_FIELDS, apply_statistics
+
+
+# Documents as stored in MongoDB (embedded layout) with random but consistent counters,
+# seeded so every run benchmarks the same data
+def game_document(generator: random.Random, status: int = 0) -> dict:
+    game: dict = {
+        "game_id": ObjectId(),
+        "game_date_time": datetime(2023, 1, 1) + timedelta(days=generator.randint(0, 365)),
+        "status": status,
+        "game_country": "Colombia",
+        "game_city": "Cali",
+        "opponent_team": "Random",
+        "player_position": "OH",
+        "player_number": "7",
+        **{field: generator.randint(0, 20) for field in STORED_COUNTER_FIELDS}}
+    return apply_statistics(game)
+
+
+def team_document(generator: random.Random, games: int) -> dict:
+    team_games: list[dict] = [game_document(generator) for _ in range(games)]
+    team: dict = {
+        "team_id": ObjectId(),
+        "team_name": "Vakif",
+        "team_category": "Women",
+        "games": team_games,
+        "total_games": games,
+        "team_creation_date_time": datetime(2023, 1, 1),
+        **{field: sum(game[field] for game in team_games) for field in STORED_COUNTER_FIELDS}}
+    return apply_statistics(team)
+
+
+def player_document(games: int, seed: int = 2023) -> dict:
+    generator = random.Random(seed)
+    team: dict = team_document(generator, games)
+    player: dict = {
+        "_id": ObjectId(),
+        "first_name": "Calixta",
+        "last_name": "Solar",
+        "category": "Women",
+        "position": "OH",
+        "email": "calixta@solar.com",
+        "password": "$2b$12$" + "x" * 53,
+        "teams": [team],
+        "total_teams": 1,
+        "total_games": games,
+        "player_creation_date_time": datetime(2023, 1, 1),
+        **{field: team[field] for field in STORED_COUNTER_FIELDS}}
+    return apply_statistics(player)
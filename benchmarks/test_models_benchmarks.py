@@ -0,0 +1,49 @@
+import json
+import sys
+import pytest
+from decouple import config
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append(config("PROJECT_PATH"))
+
+from benchmarks.documents import player_document
+from models.game_models import Game, GameAction
+from models.player_models import Player
+from models.response_models import ResponseModel
+from schemas.player_schemas import full_player
+from utils.fast_json import encode_document, model_response
+
+GAME_ACTION: dict = {
+    "team_id": "646575c9ecda2d0a13333de8",
+    "game_id": "646575c9ecda2d0a13333de7",
+    "action": "attack",
+    "action_result": "point"}
+
+NEW_GAME: dict = {
+    "game_country": "Colombia",
+    "game_city": "Cali",
+    "opponent_team": "Random",
+    "player_position": "OH",
+    "player_number": "7"}
+
+
+def test_game_action_validation(benchmark):
+    benchmark(GameAction, **GAME_ACTION)
+
+
+def test_game_validation(benchmark):
+    benchmark(Game, **NEW_GAME)
+
+
+# Same work FastAPI does for a ResponseModel: jsonable_encoder and json.dumps
+@pytest.mark.parametrize("games", [1, 50, 500])
+def test_response_model_serialization(benchmark, games: int):
+    player: Player = full_player(player_document(games))
+    benchmark(lambda: json.dumps(jsonable_encoder(ResponseModel(data=player)),
+                                 ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+@pytest.mark.parametrize("games", [1, 50, 500])
+def test_fast_json_serialization(benchmark, games: int):
+    player: dict = player_document(games)
+    benchmark(lambda: model_response(encode_document(player, Player)).body)
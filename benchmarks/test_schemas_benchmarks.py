@@ -0,0 +1,32 @@
+import sys
+import pytest
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from benchmarks.documents import player_document
+from schemas.game_schemas import full_game
+from schemas.player_schemas import full_player
+from schemas.team_schemas import full_team
+
+GAMES = [1, 50, 500]
+
+
+@pytest.mark.parametrize("games", GAMES)
+def test_full_player(benchmark, games: int):
+    player: dict = player_document(games)
+    result = benchmark(full_player, player)
+    assert len(result.teams[0].games) == games
+
+
+@pytest.mark.parametrize("games", GAMES)
+def test_full_team(benchmark, games: int):
+    team: dict = player_document(games)["teams"][0]
+    result = benchmark(full_team, team)
+    assert len(result.games) == games
+
+
+def test_full_game(benchmark):
+    game: dict = player_document(1)["teams"][0]["games"][0]
+    result = benchmark(full_game, game)
+    assert result.game_id == str(game["game_id"])
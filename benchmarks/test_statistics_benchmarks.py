@@ -0,0 +1,34 @@
+import sys
+import pytest
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from benchmarks.documents import player_document
+from schemas.player_schemas import full_player
+from services.games_service import update_game_statistics
+from services.players_service import update_player_statistics
+from services.teams_service import update_team_statistics
+from utils.stats_engine import compute_statistics, counters_matrix
+
+
+def test_update_game_statistics(benchmark):
+    game = full_player(player_document(1)).teams[0].games[0]
+    benchmark(update_game_statistics, game)
+
+
+def test_update_team_statistics(benchmark):
+    team = full_player(player_document(1)).teams[0]
+    benchmark(update_team_statistics, team)
+
+
+def test_update_player_statistics(benchmark):
+    player = full_player(player_document(1))
+    benchmark(update_player_statistics, player)
+
+
+@pytest.mark.parametrize("games", [50, 500])
+def test_compute_statistics_of_games(benchmark, games: int):
+    # Statistics of every game of a team at once
+    team_games: list[dict] = player_document(games)["teams"][0]["games"]
+    benchmark(lambda: compute_statistics(counters_matrix(team_games)))
@@ -1,20 +1,52 @@
+import asyncio
+from weakref import WeakKeyDictionary
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from pymongo import MongoClient
+from pymongo.database import Database
 from pymongo.server_api import ServerApi
 from decouple import config
+from utils.db_monitoring import COMMAND_MONITOR
+from utils.metrics import COMMAND_METRICS
 
 
-PASS = config("ATLASPASS")
-NAME = config("ATLASNAME")
-ENV = config("ENV")
+ENV = config("ENV", default="development")
 
-db_client = MongoClient(
-    f"mongodb+srv://{NAME}:{PASS}@{NAME}.dnbgzyq.mongodb.net/?retryWrites=true&w=majority",
-    server_api=ServerApi('1'))
+# Motor futures are bound to the event loop that created the client, so there is one
+# client per running loop (just one per worker when served by uvicorn)
+async_db_clients: WeakKeyDictionary = WeakKeyDictionary()
+sync_db_client: MongoClient | None = None
 
 
-def get_db_client():
+# Credentials are only read when a client is created, so the app can be imported and run
+# with REPOSITORY_BACKEND="memory" without them
+def db_uri() -> str:
+    name: str = config("ATLASNAME")
+    password: str = config("ATLASPASS")
+    return f"mongodb+srv://{name}:{password}@{name}.dnbgzyq.mongodb.net/" + \
+        "?retryWrites=true&w=majority"
+
+
+def get_db_client() -> AsyncIOMotorDatabase:
+    loop = asyncio.get_running_loop()
+    client = async_db_clients.get(loop)
+    if client is None:
+        client = AsyncIOMotorClient(db_uri(), server_api=ServerApi('1'), io_loop=loop,
+                                    event_listeners=[COMMAND_METRICS, COMMAND_MONITOR])
+        async_db_clients[loop] = client
+    return select_database(client)
+
+
+# Blocking client for scripts and test fixtures that run outside the event loop
+def get_sync_db_client() -> Database:
+    global sync_db_client
+    if sync_db_client is None:
+        sync_db_client = MongoClient(db_uri(), server_api=ServerApi('1'))
+    return select_database(sync_db_client)
+
+
+def select_database(client):
     if ENV == "development":
-        return db_client.dev
+        return client.dev
     elif ENV == "test":
-        return db_client.test
-    return db_client.prod
+        return client.test
+    return client.prod
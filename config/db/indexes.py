@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from config.db.client import get_db_client, get_sync_db_client
+from config.logger.logger import LOG
+from repositories.repository import REPOSITORY_BACKEND, STORAGE_MODE
+from utils.stats_pipeline import active_game_filter
+
+
+# Indexes required by the queries of each storage layout. They are created at API startup
+# (create_indexes) and can be created and checked from command line:
+#
+# Usage: python -m config.db.indexes [--verify]
+# --verify runs explain() for every query shape in query_shapes() and exits with an error
+# if any of them is planned as a collection scan (COLLSCAN).
+
+
+def required_indexes(storage_mode: str) -> dict[str, list[IndexModel]]:
+    indexes: dict[str, list[IndexModel]] = {
+        "players": [IndexModel("email", unique=True, name="email_unique")],
+        "game_actions": [
+            IndexModel([("game_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+            IndexModel("team_id"),
+            IndexModel("player_id")],
+        "player_daily_stats": [
+            IndexModel([("player_id", ASCENDING), ("day", ASCENDING)], unique=True)]}
+    if storage_mode == "normalized":
+        indexes["teams"] = [IndexModel("player_id")]
+        indexes["games"] = [
+            IndexModel([("team_id", ASCENDING), ("status", ASCENDING)]),
+            IndexModel("player_id")]
+    else:
+        # Players without teams are left out, otherwise all of them would share a null key
+        indexes["players"] += [
+            IndexModel("teams.team_id", unique=True, name="teams_team_id_unique",
+                       partialFilterExpression={"teams.team_id": {"$exists": True}}),
+            IndexModel("teams.games.game_id")]
+    return indexes
+
+
+async def create_indexes() -> None:
+    if REPOSITORY_BACKEND == "memory":
+        return
+
+    # API must not start without the unique indexes that reject duplicated emails and ids
+    async def create(collection: str, indexes: list[IndexModel]) -> None:
+        try:
+            await get_db_client()[collection].create_indexes(indexes)
+        except Exception as exception:
+            if any(index.document.get("unique", False) for index in indexes):
+                LOG.error("Unable to create %s unique indexes. Error: -> %s",
+                          collection, exception)
+                raise
+            LOG.warning("Unable to create %s indexes. Error: -> %s", collection, exception)
+    await asyncio.gather(*[create(collection, indexes) for collection, indexes
+                           in required_indexes(STORAGE_MODE).items()])
+
+
+def create_indexes_sync(storage_mode: str) -> None:
+    db = get_sync_db_client()
+    for collection, indexes in required_indexes(storage_mode).items():
+        db[collection].create_indexes(indexes)
+
+
+# (label, collection, filter, sort) of the filters used by repositories and services,
+# values do not need to exist as only the query plan is checked
+def query_shapes(storage_mode: str) -> list[tuple[str, str, dict, dict | None]]:
+    object_id = ObjectId()
+    shapes: list[tuple[str, str, dict, dict | None]] = [
+        ("players by email", "players", {"email": ""}, None),
+        ("player by id", "players", {"_id": object_id}, None),
+        ("players page", "players", {"_id": {"$gt": object_id}}, {"_id": 1}),
+        ("game actions by game", "game_actions", {"game_id": object_id}, {"seq": 1}),
+        ("game actions by team", "game_actions", {"team_id": object_id}, None),
+        ("game actions by player", "game_actions", {"player_id": object_id}, None),
+        ("player daily stats", "player_daily_stats",
+         {"player_id": object_id, "day": {"$gte": datetime(2023, 1, 1)}}, {"day": 1})]
+    if storage_mode == "normalized":
+        shapes += [
+            ("team by id", "teams", {"_id": object_id}, None),
+            ("teams by player", "teams", {"player_id": {"$in": [object_id]}}, None),
+            ("teams page", "teams", {"_id": {"$gt": object_id}}, {"_id": 1}),
+            ("game by id", "games", {"_id": object_id}, None),
+            ("active game", "games", {"_id": object_id, "team_id": object_id,
+                                      "player_id": object_id, "status": 1}, None),
+            ("games by team", "games", {"team_id": {"$in": [object_id]}}, None),
+            ("games by player", "games", {"player_id": {"$in": [object_id]}}, None)]
+    else:
+        shapes += [
+            ("player by team", "players", {"teams.team_id": object_id}, None),
+            ("player by game", "players", {"teams.games.game_id": object_id}, None),
+            ("active game", "players", active_game_filter(object_id, object_id, object_id),
+             None),
+            ("teams page", "players", {"teams.0": {"$exists": True}, "_id": {"$gte": object_id}},
+             {"_id": 1})]
+    return shapes
+
+
+def plan_stages(plan: dict | list) -> list[str]:
+    stages: list[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += plan_stages(value)
+    return stages
+
+
+# Labels of the query shapes whose winning plan scans the whole collection
+def verify_query_plans(storage_mode: str) -> list[str]:
+    db = get_sync_db_client()
+    collscans: list[str] = []
+    for label, collection, query, sort in query_shapes(storage_mode):
+        command: dict = {"find": collection, "filter": query}
+        if sort is not None:
+            command["sort"] = sort
+        explanation: dict = db.command("explain", command, verbosity="queryPlanner")
+        if "COLLSCAN" in plan_stages(explanation["queryPlanner"]["winningPlan"]):
+            collscans.append(label)
+    return collscans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Creates indexes required by STORAGE_MODE.")
+    parser.add_argument("--verify", action="store_true",
+                        help="Fail if any query shape is planned as a collection scan.")
+    arguments = parser.parse_args()
+    create_indexes_sync(STORAGE_MODE)
+    LOG.info("Indexes created for %s layout.", STORAGE_MODE)
+    if arguments.verify:
+        collscans: list[str] = verify_query_plans(STORAGE_MODE)
+        if len(collscans) > 0:
+            raise SystemExit(f"Collection scans: {', '.join(collscans)}.")
+        LOG.info("No query shape is planned as a collection scan.")
@@ -0,0 +1,110 @@
+import argparse
+from bson import ObjectId
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
+from config.db.client import get_sync_db_client
+from config.db.indexes import create_indexes_sync
+from config.logger.logger import LOG
+from repositories.normalized_repository import game_document, team_document
+from repositories.repository import STORAGE_MODE
+
+
+# Copies teams and games embedded in players documents to the teams and games collections
+# used by STORAGE_MODE="normalized". Players are read in _id order and in batches while
+# the API keeps serving: a team or game is only replaced if its embedded version is newer
+# than the copied one, so migration can be stopped and resumed with --after, run again to
+# copy what changed meanwhile and never overwrites documents written with the normalized
+# layout.
+#
+# Writes made with the embedded layout after the last copy are not in the collections: run
+# the last copy while no API process is writing (maintenance window) and then switch
+# STORAGE_MODE, otherwise actions scored in between are lost.
+#
+# Usage: python -m config.db.migrate_storage [--batch-size 200] [--after <player_id>] [--prune]
+# --prune only empties embedded teams of players (nothing is copied), only allowed once API
+# is running with the normalized layout.
+
+DUPLICATE_KEY: int = 11000
+
+
+def migrate_players(players: list[dict]) -> tuple[int, int]:
+    teams_operations: list[ReplaceOne] = []
+    games_operations: list[ReplaceOne] = []
+    for player in players:
+        for team in player["teams"]:
+            teams_operations.append(ReplaceOne(
+                newer_filter(team["team_id"], team), team_document(team, player["_id"]),
+                upsert=True))
+            for game in team["games"]:
+                games_operations.append(ReplaceOne(
+                    newer_filter(game["game_id"], game),
+                    game_document(game, team["team_id"], player["_id"]),
+                    upsert=True))
+    db = get_sync_db_client()
+    return bulk_copy(db.teams, teams_operations), bulk_copy(db.games, games_operations)
+
+
+# Matches the copied document only if it is older than the embedded one. An existing
+# document that is not older is not matched and the upsert fails with a duplicate key
+# error, which leaves it as it is.
+def newer_filter(document_id: ObjectId, embedded: dict) -> dict:
+    return {"_id": document_id, "$or": [
+        {"version": {"$lt": embedded.get("version", 0)}},
+        {"version": {"$exists": False}}]}
+
+
+# Returns the number of documents copied, the ones skipped for being up to date are not
+def bulk_copy(collection, operations: list[ReplaceOne]) -> int:
+    if len(operations) == 0:
+        return 0
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.modified_count
+    except BulkWriteError as error:
+        if any(write_error["code"] != DUPLICATE_KEY
+               for write_error in error.details["writeErrors"]):
+            raise
+        return error.details["nUpserted"] + error.details["nModified"]
+
+
+def migrate(batch_size: int, after: str | None, prune: bool) -> None:
+    if prune and STORAGE_MODE != "normalized":
+        raise SystemExit("--prune requires STORAGE_MODE=normalized.")
+    db = get_sync_db_client()
+    create_indexes_sync("normalized")
+    last_id: ObjectId | None = ObjectId(after) if after else None
+    totals = [0, 0, 0]
+    while True:
+        query: dict = {"teams.0": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        players: list[dict] = list(
+            db.players.find(query, {"_id": 1} if prune else {"teams": 1})
+            .sort("_id", ASCENDING).limit(batch_size))
+        if len(players) == 0:
+            break
+        # Collections are the source of truth once API runs normalized, copying would only
+        # bring back embedded counters older than them
+        if prune:
+            teams, games = 0, 0
+            db.players.update_many(
+                {"_id": {"$in": [player["_id"] for player in players]}},
+                {"$set": {"teams": []}})
+        else:
+            teams, games = migrate_players(players)
+        last_id = players[-1]["_id"]
+        totals = [totals[0] + len(players), totals[1] + teams, totals[2] + games]
+        LOG.info("Migrated %s players (%s teams, %s games copied). Last player: %s.",
+                 len(players), teams, games, last_id)
+    LOG.info("Migration finished. Players: %s, teams: %s, games: %s.", *totals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moves embedded teams and games to their "
+                                                 "own collections.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--after", help="Resume after this player id.")
+    parser.add_argument("--prune", action="store_true",
+                        help="Only empty embedded teams of players, without copying them.")
+    arguments = parser.parse_args()
+    migrate(arguments.batch_size, arguments.after, arguments.prune)
@@ -0,0 +1,66 @@
+import argparse
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReplaceOne
+from config.db.client import get_sync_db_client
+from config.db.indexes import create_indexes_sync
+from config.logger.logger import LOG
+from repositories.repository import STORAGE_MODE
+from utils.stats_pipeline import counter_name
+
+
+# Builds the daily counters of players (player_daily_stats) from the game actions log, for
+# actions logged before play_game kept them or days whose counters were not updated.
+# Days are replaced, so it can be run again; actions scored while it runs may be counted
+# in the log but not in their day, run it again afterwards to fix them. Days are UTC days,
+# the same buckets play_game updates (see game_actions_service.utc_day).
+#
+# Usage: python -m config.db.rollup_daily_stats [--player <player_id>] [--batch-size 500]
+
+
+def daily_counts_pipeline(player_id: str | None) -> list[dict]:
+    pipeline: list[dict] = [] if player_id is None else \
+        [{"$match": {"player_id": ObjectId(player_id)}}]
+    return pipeline + [{"$group": {
+        "_id": {
+            "player_id": "$player_id",
+            "day": {"$dateFromParts": {
+                "year": {"$year": {"date": "$timestamp", "timezone": "UTC"}},
+                "month": {"$month": {"date": "$timestamp", "timezone": "UTC"}},
+                "day": {"$dayOfMonth": {"date": "$timestamp", "timezone": "UTC"}},
+                "timezone": "UTC"}},
+            "action": "$action",
+            "action_result": "$action_result"},
+        "count": {"$sum": 1}}}]
+
+
+def daily_documents(groups) -> dict[tuple[ObjectId, datetime], dict]:
+    days: dict[tuple[ObjectId, datetime], dict] = {}
+    for group in groups:
+        key = group["_id"]
+        document: dict = days.setdefault((key["player_id"], key["day"]), {
+            "player_id": key["player_id"], "day": key["day"]})
+        document[counter_name(key["action"], key["action_result"])] = group["count"]
+    return days
+
+
+def roll_up(player_id: str | None, batch_size: int) -> None:
+    db = get_sync_db_client()
+    create_indexes_sync(STORAGE_MODE)
+    days: dict = daily_documents(
+        db.game_actions.aggregate(daily_counts_pipeline(player_id), allowDiskUse=True))
+    operations: list[ReplaceOne] = [
+        ReplaceOne({"player_id": player, "day": day}, document, upsert=True)
+        for (player, day), document in days.items()]
+    for start in range(0, len(operations), batch_size):
+        db.player_daily_stats.bulk_write(operations[start:start + batch_size], ordered=False)
+    LOG.info("Daily counters rebuilt. Days: %s.", len(operations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuilds daily counters of players from "
+                                                 "the game actions log.")
+    parser.add_argument("--player", help="Only rebuild days of this player id.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    arguments = parser.parse_args()
+    roll_up(arguments.player, arguments.batch_size)
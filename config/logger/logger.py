@@ -1,7 +1,35 @@
+import atexit
 import logging
+import queue
 from logging.config import dictConfig
-from config.logger.logger_config import LogConfig
+from logging.handlers import QueueHandler, QueueListener
+from decouple import config
+from config.logger.logger_config import DebugSamplingFilter, LogConfig
 
 
-dictConfig(LogConfig().dict())
-LOG = logging.getLogger("volleystats")
+LOG_CONFIG = LogConfig()
+dictConfig(LOG_CONFIG.dict())
+LOG = logging.getLogger(LOG_CONFIG.LOGGER_NAME)
+
+
+# Records are put in a queue as they are logged and formatted and written to stderr by
+# LOG_LISTENER thread, so request handlers never wait for the stream
+class LazyQueueHandler(QueueHandler):
+
+    # QueueHandler formats the message before enqueueing it, here it is left to the
+    # listener. Log arguments are ids, counts and strings, they do not change once logged.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+LOG_QUEUE: queue.SimpleQueue = queue.SimpleQueue()
+LOG_LISTENER = QueueListener(LOG_QUEUE, *LOG.handlers, respect_handler_level=True)
+LOG.handlers = [LazyQueueHandler(LOG_QUEUE)]
+LOG.handlers[0].addFilter(DebugSamplingFilter(config("LOG_DEBUG_SAMPLING", default="")))
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
+
+
+# Child logger ("volleystats.<name>") so its records can be sampled on their own
+def get_logger(name: str) -> logging.Logger:
+    return LOG.getChild(name)
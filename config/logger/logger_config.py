@@ -1,3 +1,7 @@
+import logging
+import random
+import orjson
+from decouple import config
 from pydantic import BaseModel
 
 
@@ -6,7 +10,9 @@ class LogConfig(BaseModel):
 
     LOGGER_NAME: str = "volleystats"
     LOG_FORMAT: str = "%(levelprefix)s | %(asctime)s | %(message)s"
-    LOG_LEVEL: str = "DEBUG"
+    LOG_LEVEL: str = config("LOG_LEVEL", default="INFO")
+    # One JSON object per line instead of text, for log collectors
+    LOG_JSON: bool = config("LOG_JSON", default=False, cast=bool)
 
     # Logging config
     version = 1
@@ -17,10 +23,13 @@ class LogConfig(BaseModel):
             "fmt": LOG_FORMAT,
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "json": {
+            "()": "config.logger.logger_config.JSONFormatter",
+        },
     }
     handlers = {
         "default": {
-            "formatter": "default",
+            "formatter": "json" if LOG_JSON else "default",
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stderr",
         },
@@ -28,4 +37,39 @@ class LogConfig(BaseModel):
     loggers = {
         LOGGER_NAME: {"handlers": ["default"], "level": LOG_LEVEL},
     }
-    
\ No newline at end of file
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+# Keeps a fraction of the DEBUG records of some loggers (their children included), set as
+# LOG_DEBUG_SAMPLING="volleystats.games:0.01,volleystats.teams:0.1"
+class DebugSamplingFilter(logging.Filter):
+
+    def __init__(self, rates: str = ""):
+        super().__init__()
+        self.rates: dict[str, float] = {}
+        for entry in filter(None, rates.split(",")):
+            name, rate = entry.rsplit(":", 1)
+            self.rates[name.strip()] = float(rate)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or len(self.rates) == 0:
+            return True
+        name: str = record.name
+        while name not in self.rates:
+            if "." not in name:
+                return True
+            name = name.rsplit(".", 1)[0]
+        return random.random() < self.rates[name]
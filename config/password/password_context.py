@@ -1,4 +1,28 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
 from passlib.context import CryptContext
 
 
-PASSWORD_CONTEXT = CryptContext(schemes=["bcrypt"])
+# Cost of new hashes, hashes stored with another cost are replaced on next login
+BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", default=12, cast=int)
+# Hashes computed at the same time, further requests wait for a free worker
+PASSWORD_WORKERS: int = config("PASSWORD_WORKERS", default=2, cast=int)
+
+PASSWORD_CONTEXT = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so hashing in threads keeps the event loop serving requests
+PASSWORD_EXECUTOR = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS,
+                                       thread_name_prefix="password")
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(
+        PASSWORD_EXECUTOR, PASSWORD_CONTEXT.hash, password)
+
+
+# Returns if password is valid and, if hash must be updated (e.g. BCRYPT_ROUNDS changed),
+# the new hash of the password
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await asyncio.get_running_loop().run_in_executor(
+        PASSWORD_EXECUTOR, PASSWORD_CONTEXT.verify_and_update, password, hashed_password)
@@ -1,8 +1,195 @@
-from locust import HttpUser, task
+import logging
+import os
+import random
+import uuid
+from locust import HttpUser, between, events, task
 
 
-class GetPlayers(HttpUser):
-    
+# Load scenarios of real traffic: scorers play whole matches (sign up, log in, create a
+# team, start a game, score actions, poll the game, refresh tokens and finish the game),
+# spectators poll games being played and admins read the players listing.
+#
+# Local run, against the in-memory backend (no Atlas needed):
+#   REPOSITORY_BACKEND=memory uvicorn main:app --port 8000
+#   locust --host http://localhost:8000 --headless -u 60 -r 10 -t 5m
+#
+# Configuration (environment variables):
+#   LOAD_USER_MIX: weights of scorer, spectator and admin users, default "8,3,1"
+#   LOAD_ACTIONS_PER_GAME: actions scored in each game, default 300
+#   LOAD_PASSWORD: password of the players created by scorers
+#   LOAD_SLO: SLOs overriding DEFAULT_SLO, as "endpoint:p95:p99;..." in ms,
+#             e.g. "PUT /games/play_game:100:250"
+# Run exits with code 1 if any endpoint is over its SLO or if more than 1% of requests fail.
+
+SCORER_WEIGHT, SPECTATOR_WEIGHT, ADMIN_WEIGHT = (
+    int(weight) for weight in os.getenv("LOAD_USER_MIX", "8,3,1").split(","))
+ACTIONS_PER_GAME = int(os.getenv("LOAD_ACTIONS_PER_GAME", "300"))
+PASSWORD = os.getenv("LOAD_PASSWORD", "LoadTest2023Password")
+MAX_FAILURE_RATIO = 0.01
+
+# (p95, p99) in ms, endpoints without SLO are only reported
+DEFAULT_SLO: dict[str, tuple[int, int]] = {
+    "POST /auth/login": (800, 1500),
+    "POST /auth/refresh-token": (100, 250),
+    "POST /players": (800, 1500),
+    "POST /teams/new_team": (250, 500),
+    "POST /games/[team_id]": (250, 500),
+    "PUT /games/play_game": (150, 300),
+    "GET /games/[game_id]": (100, 250),
+    "PUT /games/finish_game": (250, 500),
+    "GET /players": (500, 1000),
+}
+
+# Action weights and result ratios of an average amateur match
+ACTIONS: dict[str, int] = {
+    "attack": 25, "set": 20, "reception": 18, "defense": 17, "service": 15, "block": 5}
+RESULTS: dict[str, dict[str, int]] = {
+    "attack": {"point": 45, "neutral": 40, "error": 15},
+    "block": {"point": 30, "neutral": 50, "error": 20},
+    "service": {"point": 10, "neutral": 75, "error": 15},
+    "defense": {"perfect": 40, "neutral": 40, "error": 20},
+    "reception": {"perfect": 45, "neutral": 40, "error": 15},
+    "set": {"perfect": 70, "neutral": 25, "error": 5},
+}
+
+# Games being played, read by spectators
+ACTIVE_GAMES: set[str] = set()
+
+
+def slo_table() -> dict[str, tuple[int, int]]:
+    slo: dict[str, tuple[int, int]] = dict(DEFAULT_SLO)
+    for entry in filter(None, os.getenv("LOAD_SLO", "").split(";")):
+        endpoint, p95, p99 = entry.rsplit(":", 2)
+        slo[endpoint] = (int(p95), int(p99))
+    return slo
+
+
+def random_action() -> tuple[str, str]:
+    action: str = random.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+    results: dict[str, int] = RESULTS[action]
+    return action, random.choices(list(results), weights=list(results.values()))[0]
+
+
+class PlayerUser(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        self.email = f"load-{uuid.uuid4().hex}@loadtest.com"
+        self.client.post("/players", name="POST /players", json={
+            "first_name": "Load", "last_name": "Test", "category": "Women",
+            "position": "OH", "email": self.email, "password": PASSWORD})
+        self.login()
+
+    def login(self):
+        response = self.client.post(
+            "/auth/login", name="POST /auth/login",
+            data={"username": self.email, "password": PASSWORD})
+        self.set_tokens(response.json())
+
+    def set_tokens(self, tokens: dict):
+        self.refresh_token = tokens["refresh_token"]
+        self.headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+class ScorerUser(PlayerUser):
+    weight = SCORER_WEIGHT
+    # Time between two scored actions while watching the match
+    wait_time = between(0.5, 3)
+
+    def on_start(self):
+        super().on_start()
+        response = self.client.post(
+            "/teams/new_team", name="POST /teams/new_team", headers=self.headers,
+            json={"team_name": f"Team {self.email[5:13]}", "team_category": "Women"})
+        self.team_id = response.json()["data"]["team_id"]
+        self.game_id = None
+        self.actions_left = 0
+
+    def on_stop(self):
+        ACTIVE_GAMES.discard(self.game_id)
+
+    @task(40)
+    def score(self):
+        if self.game_id is None:
+            self.start_game()
+        elif self.actions_left == 0:
+            self.finish_game()
+        else:
+            action, action_result = random_action()
+            self.client.put("/games/play_game", name="PUT /games/play_game",
+                            headers=self.headers, json={
+                                "team_id": self.team_id, "game_id": self.game_id,
+                                "action": action, "action_result": action_result})
+            self.actions_left -= 1
+
+    @task(4)
+    def poll_game(self):
+        if self.game_id is not None:
+            self.client.get(f"/games/{self.game_id}", name="GET /games/[game_id]",
+                            headers=self.headers)
+
+    @task(1)
+    def refresh_tokens(self):
+        response = self.client.post("/auth/refresh-token", name="POST /auth/refresh-token",
+                                    json={"refresh_token": self.refresh_token})
+        self.set_tokens(response.json())
+
+    def start_game(self):
+        response = self.client.post(
+            f"/games/{self.team_id}", name="POST /games/[team_id]", headers=self.headers,
+            json={"game_country": "Colombia", "game_city": "Cali", "opponent_team": "Random",
+                  "player_position": "OH", "player_number": "7"})
+        self.game_id = response.json()["data"]["game_id"]
+        self.actions_left = ACTIONS_PER_GAME
+        ACTIVE_GAMES.add(self.game_id)
+
+    def finish_game(self):
+        ACTIVE_GAMES.discard(self.game_id)
+        self.client.put("/games/finish_game", name="PUT /games/finish_game",
+                        headers=self.headers,
+                        json={"team_id": self.team_id, "game_id": self.game_id})
+        self.game_id = None
+
+
+class SpectatorUser(PlayerUser):
+    weight = SPECTATOR_WEIGHT
+    wait_time = between(1, 5)
+
+    @task
+    def poll_game(self):
+        if len(ACTIVE_GAMES) > 0:
+            game_id: str = random.choice(list(ACTIVE_GAMES))
+            self.client.get(f"/games/{game_id}", name="GET /games/[game_id]",
+                            headers=self.headers)
+
+
+class AdminUser(HttpUser):
+    weight = ADMIN_WEIGHT
+    wait_time = between(5, 15)
+
     @task
     def get_players(self):
-        self.client.get("/players")
+        self.client.get("/players", name="GET /players", params={"limit": 50})
+
+
+@events.quitting.add_listener
+def check_slo(environment, **kwargs):
+    stats = environment.runner.stats
+    failed: list[str] = []
+    for endpoint, (p95, p99) in slo_table().items():
+        # Requests are named after their endpoint, "<method> <path>"
+        entry = stats.entries.get((endpoint, endpoint.split(" ", 1)[0]))
+        if entry is None or entry.num_requests == 0:
+            continue
+        measured = (entry.get_response_time_percentile(0.95),
+                    entry.get_response_time_percentile(0.99))
+        if measured[0] > p95 or measured[1] > p99:
+            failed.append(f"{endpoint}: p95 {measured[0]} ms (SLO {p95}), " +
+                          f"p99 {measured[1]} ms (SLO {p99})")
+    if stats.total.fail_ratio > MAX_FAILURE_RATIO:
+        failed.append(f"Failure ratio {stats.total.fail_ratio:.2%} " +
+                      f"(max {MAX_FAILURE_RATIO:.0%})")
+    for failure in failed:
+        logging.error(f"SLO failed. {failure}")
+    if len(failed) > 0:
+        environment.process_exit_code = 1
@@ -1,14 +1,54 @@
-from fastapi import FastAPI
-from routers import games_controller, login_controller, players_controller, teams_controller
+from fastapi import FastAPI, Request
+from fastapi.exception_handlers import http_exception_handler, \
+    request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from starlette.exceptions import HTTPException
+from routers import games_controller, login_controller, metrics_controller, players_controller, \
+    teams_controller
 from fastapi.middleware.cors import CORSMiddleware
+from config.db.indexes import create_indexes
+import services.write_behind_service as WriteBehindService
+from utils.metrics import MetricsMiddleware, record_error
 
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+async def create_database_indexes():
+    await create_indexes()
+
+
+@app.on_event("startup")
+async def start_write_behind():
+    await WriteBehindService.start()
+
+
+# Buffered actions are written before the process exits
+@app.on_event("shutdown")
+async def stop_write_behind():
+    await WriteBehindService.stop()
+
+
 app.include_router(login_controller.router)
 app.include_router(players_controller.router)
 app.include_router(teams_controller.router)
 app.include_router(games_controller.router)
+app.include_router(metrics_controller.router)
+
+
+# Error responses are counted by GET /metrics, default handlers send them
+@app.exception_handler(HTTPException)
+async def count_http_exception(request: Request, exception: HTTPException):
+    record_error(exception)
+    return await http_exception_handler(request, exception)
+
+
+@app.exception_handler(RequestValidationError)
+async def count_validation_error(request: Request, exception: RequestValidationError):
+    record_error(exception)
+    return await request_validation_exception_handler(request, exception)
+
 
 origins = [
     "http://localhost:4200",
@@ -22,3 +62,6 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# Outermost middleware, so latency includes CORS handling
+app.add_middleware(MetricsMiddleware)
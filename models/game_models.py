@@ -121,3 +121,9 @@ class GameAction(EndGame):
         if result not in ACTION_RESULTS:
             ex.invalid_value("action result")
         return result
+
+
+class LoggedGameAction(GameAction):
+    player_id: str
+    seq: int  # Position of the action in its game, starts at 1
+    timestamp: datetime
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel, validator
 from models.team_models import Team
 from utils.constants import PLAYER_POSITIONS, PLAYER_CATEGORIES
@@ -147,6 +147,13 @@ class LoginPlayer(BaseModel):
     password: str
 
 
+# Value of a statistic for the actions of a period (day, week or month) of a time series
+class PlayerStatisticPoint(BaseModel):
+    period_start: date
+    value: float
+    total_actions: int
+
+
 class NewPassword(BaseModel):
     old_password: str
     new_password: str
@@ -5,4 +5,9 @@ from pydantic import BaseModel
 class ResponseModel(BaseModel):
     detail: str = None
     # Type Any makes this attribute to be optional
-    data: Any
\ No newline at end of file
+    data: Any
+
+
+class PageResponseModel(ResponseModel):
+    # Cursor for the next page, None when this is the last one
+    next_cursor: str = None
@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+
+# Data access used by services. Implementations return plain documents (dicts) with the
+# shape of the embedded layout (players with teams, teams with games, team_id/game_id
+# keys) or counters, conversion to models and error responses are left to services.
+# Write methods return the number of modified documents, like MongoDB does: 0 when
+# nothing matched or values did not change. Unique keys (players email, team and game ids)
+# raise pymongo DuplicateKeyError.
+# Every write that changes a game, team or player increases its "version" field and the
+# version of the documents that contain it (game -> team -> player), missing versions are 0.
+class Repository(ABC):
+
+    # PLAYERS
+
+    # Players in _id order after cursor (a player id), as (cursor, document) pairs.
+    # Raises ValueError for invalid cursors before reading anything.
+    @abstractmethod
+    def iterate_players(self, after: str | None,
+                        batch_size: int) -> AsyncIterator[tuple[str, dict]]: ...
+
+    @abstractmethod
+    async def find_player(self, player_id: str, projection: dict = None) -> dict | None: ...
+
+    # Only the version is read, None if player does not exist
+    @abstractmethod
+    async def find_player_version(self, player_id: str) -> int | None: ...
+
+    @abstractmethod
+    async def find_player_by_email(self, email: str,
+                                   projection: dict = None) -> dict | None: ...
+
+    @abstractmethod
+    async def count_players(self, player_id: str) -> int: ...
+
+    @abstractmethod
+    async def insert_player(self, player: dict) -> ObjectId: ...
+
+    @abstractmethod
+    async def update_player(self, player_id: str, fields: dict) -> int: ...
+
+    @abstractmethod
+    async def delete_player(self, player_id: str) -> int: ...
+
+    # TEAMS
+
+    # Same as iterate_players for teams, cursor format depends on implementation
+    @abstractmethod
+    def iterate_teams(self, after: str | None,
+                      batch_size: int) -> AsyncIterator[tuple[str, dict]]: ...
+
+    @abstractmethod
+    async def find_player_teams(self, player_id: str) -> list[dict] | None: ...
+
+    # Teams of the player that owns team_id
+    @abstractmethod
+    async def find_owner_teams(self, team_id: str) -> list[dict] | None: ...
+
+    @abstractmethod
+    async def find_team(self, team_id: str) -> dict | None: ...
+
+    @abstractmethod
+    async def find_team_version(self, team_id: str) -> int | None: ...
+
+    @abstractmethod
+    async def count_teams(self, team_id: str) -> int: ...
+
+    @abstractmethod
+    async def push_team(self, player_id: str, team: dict) -> int: ...
+
+    @abstractmethod
+    async def update_team(self, team_id: str, fields: dict) -> int: ...
+
+    @abstractmethod
+    async def pull_team(self, player_id: str, team_id: str) -> int: ...
+
+    # GAMES
+
+    @abstractmethod
+    async def find_game(self, game_id: str) -> dict | None: ...
+
+    @abstractmethod
+    async def find_game_version(self, game_id: str) -> int | None: ...
+
+    @abstractmethod
+    async def count_games(self, game_id: str) -> int: ...
+
+    # 1 only if game is in a team of player (in team_id if given)
+    @abstractmethod
+    async def count_player_games(self, player_id: str, game_id: str,
+                                 team_id: str | None = None) -> int: ...
+
+    @abstractmethod
+    async def push_game(self, team_id: str, game: dict) -> int: ...
+
+    # Only active games are finished
+    @abstractmethod
+    async def finish_game(self, team_id: str, game_id: str) -> int: ...
+
+    # Adds deltas to game, team and player counters and recomputes their statistics,
+    # returns updated game or None if game is not active for that player and team.
+    # Counters and statistics of each document are computed from its current values in the
+    # same atomic update (no read-modify-write), so concurrent calls are all counted.
+    @abstractmethod
+    async def register_actions(self, player_id: str, team_id: str, game_id: str,
+                               deltas: dict[str, int]) -> dict | None: ...
+
+    @abstractmethod
+    async def update_game(self, team_id: str, game_id: str, fields: dict) -> int: ...
+
+    # GAME ACTIONS LOG
+
+    # Unordered, a failed entry (duplicated game_id and seq) does not stop the rest
+    @abstractmethod
+    async def insert_game_actions(self, game_actions: list[dict]) -> int: ...
+
+    @abstractmethod
+    async def find_game_actions(self, game_id: str) -> list[dict]: ...
+
+    # Number of logged actions per counter, filter is one of game_id, team_id or player_id
+    @abstractmethod
+    async def count_game_actions(self, field: str, entity_id: str) -> dict[str, int]: ...
+
+    # DAILY ROLLUPS
+
+    # Adds deltas to the counters of player on day (a midnight), day is created if needed
+    @abstractmethod
+    async def increment_daily_counters(self, player_id: str, day: datetime,
+                                       deltas: dict[str, int]) -> None: ...
+
+    # Days of player from since (included) to until (excluded) in day order, as documents
+    # with player_id, day and counters. Bounds are optional.
+    @abstractmethod
+    async def find_daily_counters(self, player_id: str, since: datetime | None,
+                                  until: datetime | None) -> list[dict]: ...
+
+
+def object_id_cursor(cursor: str) -> ObjectId:
+    if not ObjectId.is_valid(cursor):
+        raise ValueError(f"Invalid cursor: {cursor}.")
+    return ObjectId(cursor)
+
+
+# Cursor of teams stored inside players documents: "<player_id>.<team_id>". It is a keyset
+# like the one of players, teams added or removed between pages do not shift the next ones.
+def team_cursor(cursor: str | None) -> tuple[ObjectId | None, ObjectId | None]:
+    if cursor is None:
+        return None, None
+    player_id, _, team_id = cursor.partition(".")
+    return object_id_cursor(player_id), object_id_cursor(team_id)
+
+
+# Teams of player in team_id order, only the ones after the cursor for its player
+def teams_after(player_id: ObjectId, teams: list[dict], after_player: ObjectId | None,
+                after_team: ObjectId | None) -> list[dict]:
+    teams = sorted(teams, key=lambda team: team["team_id"])
+    if player_id != after_player:
+        return teams
+    return [team for team in teams if team["team_id"] > after_team]
+
+
+# Same error MongoDB raises when a unique key is already in use
+def duplicate_key(field: str, value) -> DuplicateKeyError:
+    return DuplicateKeyError(f"E11000 duplicate key error, {field}: {value}", 11000)
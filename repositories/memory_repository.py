@@ -0,0 +1,359 @@
+import copy
+from collections import Counter
+from datetime import datetime
+from threading import RLock
+from typing import AsyncIterator
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from repositories.base_repository import (Repository, duplicate_key, object_id_cursor,
+                                             team_cursor, teams_after)
+from utils.stats_engine import apply_statistics
+from utils.stats_pipeline import counter_name
+
+
+# In-process storage with the embedded layout (REPOSITORY_BACKEND="memory"), nothing is
+# persisted. It keeps the semantics of MongoRepository for the operations services use:
+# modified counts, unique keys, projections and atomic register_actions, so tests,
+# benchmarks and load tests can run without a MongoDB server. Documents are copied in and
+# out, callers can not change stored data by mutating what they sent or received.
+class MemoryRepository(Repository):
+
+    def __init__(self):
+        self._lock = RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._players: dict[ObjectId, dict] = {}
+            # Lookups by unique keys: email -> player _id, team_id -> player _id,
+            # game_id -> team_id and (game_id, seq) of logged actions
+            self._emails: dict[str, ObjectId] = {}
+            self._teams: dict[ObjectId, ObjectId] = {}
+            self._games: dict[ObjectId, ObjectId] = {}
+            self._game_actions: list[dict] = []
+            self._game_action_keys: set[tuple[ObjectId, int]] = set()
+            # Daily counters by (player_id, day)
+            self._daily_counters: dict[tuple[ObjectId, datetime], dict] = {}
+
+    # PLAYERS
+
+    def iterate_players(self, after: str | None,
+                        batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        after_id: ObjectId | None = None if after is None else object_id_cursor(after)
+        return self._iterate_players(after_id)
+
+    async def _iterate_players(self, after_id: ObjectId | None) -> AsyncIterator[tuple[str, dict]]:
+        with self._lock:
+            player_ids: list[ObjectId] = sorted(
+                player_id for player_id in self._players
+                if after_id is None or player_id > after_id)
+        for player_id in player_ids:
+            with self._lock:
+                player: dict | None = copy.deepcopy(self._players.get(player_id))
+            if player is not None:
+                yield str(player_id), player
+
+    async def find_player(self, player_id: str, projection: dict = None) -> dict | None:
+        with self._lock:
+            player: dict | None = self._players.get(ObjectId(player_id))
+            return None if player is None else project(player, projection)
+
+    async def find_player_version(self, player_id: str) -> int | None:
+        with self._lock:
+            player: dict | None = self._players.get(ObjectId(player_id))
+            return None if player is None else player.get("version", 0)
+
+    async def find_player_by_email(self, email: str, projection: dict = None) -> dict | None:
+        with self._lock:
+            player: dict | None = self._players.get(self._emails.get(email))
+            return None if player is None else project(player, projection)
+
+    async def count_players(self, player_id: str) -> int:
+        with self._lock:
+            return int(ObjectId(player_id) in self._players)
+
+    # Like insert_one, _id is added to player if it has none
+    async def insert_player(self, player: dict) -> ObjectId:
+        with self._lock:
+            if player["email"] in self._emails:
+                raise duplicate_key("email", player["email"])
+            for team in player.get("teams", []):
+                self._check_new_team(team)
+            player.setdefault("_id", ObjectId())
+            document: dict = copy.deepcopy(player)
+            self._players[document["_id"]] = document
+            self._emails[document["email"]] = document["_id"]
+            for team in document.get("teams", []):
+                self._index_team(team, document["_id"])
+            return document["_id"]
+
+    async def update_player(self, player_id: str, fields: dict) -> int:
+        with self._lock:
+            player: dict | None = self._players.get(ObjectId(player_id))
+            if player is None:
+                return 0
+            email: str = fields.get("email", player["email"])
+            if email != player["email"]:
+                if email in self._emails:
+                    raise duplicate_key("email", email)
+                del self._emails[player["email"]]
+                self._emails[email] = player["_id"]
+            return set_fields(fields, player)
+
+    async def delete_player(self, player_id: str) -> int:
+        with self._lock:
+            player: dict | None = self._players.pop(ObjectId(player_id), None)
+            if player is None:
+                return 0
+            del self._emails[player["email"]]
+            for team in player["teams"]:
+                self._unindex_team(team)
+            return 1
+
+    # TEAMS
+
+    def iterate_teams(self, after: str | None,
+                      batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        player_id, team_id = team_cursor(after)
+        return self._iterate_teams(player_id, team_id)
+
+    async def _iterate_teams(self, after_player: ObjectId | None,
+                             after_team: ObjectId | None) -> AsyncIterator[tuple[str, dict]]:
+        with self._lock:
+            player_ids: list[ObjectId] = sorted(
+                player_id for player_id in self._players
+                if after_player is None or player_id >= after_player)
+        for player_id in player_ids:
+            with self._lock:
+                player: dict | None = self._players.get(player_id)
+                teams: list[dict] = [] if player is None else copy.deepcopy(player["teams"])
+            for team in teams_after(player_id, teams, after_player, after_team):
+                yield f"{player_id}.{team['team_id']}", team
+
+    async def find_player_teams(self, player_id: str) -> list[dict] | None:
+        with self._lock:
+            player: dict | None = self._players.get(ObjectId(player_id))
+            return None if player is None else copy.deepcopy(player["teams"])
+
+    async def find_owner_teams(self, team_id: str) -> list[dict] | None:
+        with self._lock:
+            player: dict | None = self._players.get(self._teams.get(ObjectId(team_id)))
+            return None if player is None else copy.deepcopy(player["teams"])
+
+    async def find_team(self, team_id: str) -> dict | None:
+        with self._lock:
+            _, team = self._find_team(ObjectId(team_id))
+            return copy.deepcopy(team)
+
+    async def find_team_version(self, team_id: str) -> int | None:
+        with self._lock:
+            _, team = self._find_team(ObjectId(team_id))
+            return None if team is None else team.get("version", 0)
+
+    async def count_teams(self, team_id: str) -> int:
+        with self._lock:
+            return int(ObjectId(team_id) in self._teams)
+
+    async def push_team(self, player_id: str, team: dict) -> int:
+        with self._lock:
+            player: dict | None = self._players.get(ObjectId(player_id))
+            if player is None:
+                return 0
+            self._check_new_team(team)
+            document: dict = copy.deepcopy(team)
+            player["teams"].append(document)
+            self._index_team(document, player["_id"])
+            increase_versions(player)
+            return 1
+
+    async def update_team(self, team_id: str, fields: dict) -> int:
+        with self._lock:
+            player, team = self._find_team(ObjectId(team_id))
+            return 0 if team is None else set_fields(fields, team, player)
+
+    async def pull_team(self, player_id: str, team_id: str) -> int:
+        with self._lock:
+            player, team = self._find_team(ObjectId(team_id))
+            if team is None or player["_id"] != ObjectId(player_id):
+                return 0
+            player["teams"].remove(team)
+            self._unindex_team(team)
+            increase_versions(player)
+            return 1
+
+    # GAMES
+
+    async def find_game(self, game_id: str) -> dict | None:
+        with self._lock:
+            _, _, game = self._find_game(ObjectId(game_id))
+            return copy.deepcopy(game)
+
+    async def find_game_version(self, game_id: str) -> int | None:
+        with self._lock:
+            _, _, game = self._find_game(ObjectId(game_id))
+            return None if game is None else game.get("version", 0)
+
+    async def count_games(self, game_id: str) -> int:
+        with self._lock:
+            return int(ObjectId(game_id) in self._games)
+
+    async def count_player_games(self, player_id: str, game_id: str,
+                                 team_id: str | None = None) -> int:
+        with self._lock:
+            player, team, game = self._find_game(ObjectId(game_id))
+            return int(game is not None and player["_id"] == ObjectId(player_id)
+                       and (team_id is None or team["team_id"] == ObjectId(team_id)))
+
+    async def push_game(self, team_id: str, game: dict) -> int:
+        with self._lock:
+            player, team = self._find_team(ObjectId(team_id))
+            if team is None:
+                return 0
+            if game["game_id"] in self._games:
+                raise duplicate_key("game_id", game["game_id"])
+            team["games"].append(copy.deepcopy(game))
+            self._games[game["game_id"]] = team["team_id"]
+            increase_versions(team, player)
+            return 1
+
+    async def finish_game(self, team_id: str, game_id: str) -> int:
+        with self._lock:
+            player, team, game = self._find_game(ObjectId(game_id))
+            if game is None or team["team_id"] != ObjectId(team_id):
+                return 0
+            return set_fields({"status": 0}, game, team, player)
+
+    # Nothing is awaited while counters change, so concurrent calls can not interleave
+    async def register_actions(self, player_id: str, team_id: str, game_id: str,
+                               deltas: dict[str, int]) -> dict | None:
+        with self._lock:
+            player, team, game = self._find_game(ObjectId(game_id))
+            if game is None or game["status"] != 1 or team["team_id"] != ObjectId(team_id) \
+                    or player["_id"] != ObjectId(player_id):
+                return None
+            for document in (game, team, player):
+                for field, delta in deltas.items():
+                    document[field] = document.get(field, 0) + delta
+                apply_statistics(document)
+            increase_versions(game, team, player)
+            return copy.deepcopy(game)
+
+    async def update_game(self, team_id: str, game_id: str, fields: dict) -> int:
+        with self._lock:
+            player, team, game = self._find_game(ObjectId(game_id))
+            if game is None or team["team_id"] != ObjectId(team_id):
+                return 0
+            return set_fields(fields, game, team, player)
+
+    # GAME ACTIONS LOG
+
+    async def insert_game_actions(self, game_actions: list[dict]) -> int:
+        with self._lock:
+            write_errors: list[dict] = []
+            for index, game_action in enumerate(game_actions):
+                key: tuple[ObjectId, int] = (game_action["game_id"], game_action["seq"])
+                if key in self._game_action_keys:
+                    write_errors.append({"index": index, "code": 11000})
+                    continue
+                game_action.setdefault("_id", ObjectId())
+                self._game_actions.append(copy.deepcopy(game_action))
+                self._game_action_keys.add(key)
+            inserted: int = len(game_actions) - len(write_errors)
+        if len(write_errors) > 0:
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": inserted})
+        return inserted
+
+    async def find_game_actions(self, game_id: str) -> list[dict]:
+        with self._lock:
+            game_actions: list[dict] = [
+                game_action for game_action in self._game_actions
+                if game_action["game_id"] == ObjectId(game_id)]
+            return copy.deepcopy(sorted(game_actions, key=lambda action: action["seq"]))
+
+    async def count_game_actions(self, field: str, entity_id: str) -> dict[str, int]:
+        with self._lock:
+            return dict(Counter(
+                counter_name(game_action["action"], game_action["action_result"])
+                for game_action in self._game_actions
+                if game_action[field] == ObjectId(entity_id)))
+
+    # DAILY ROLLUPS
+
+    async def increment_daily_counters(self, player_id: str, day: datetime,
+                                       deltas: dict[str, int]) -> None:
+        with self._lock:
+            document: dict = self._daily_counters.setdefault(
+                (ObjectId(player_id), day), {"player_id": ObjectId(player_id), "day": day})
+            for field, delta in deltas.items():
+                document[field] = document.get(field, 0) + delta
+
+    async def find_daily_counters(self, player_id: str, since: datetime | None,
+                                  until: datetime | None) -> list[dict]:
+        with self._lock:
+            days: list[dict] = [
+                document for (day_player_id, day), document in self._daily_counters.items()
+                if day_player_id == ObjectId(player_id) and (since is None or day >= since)
+                and (until is None or day < until)]
+            return copy.deepcopy(sorted(days, key=lambda document: document["day"]))
+
+    # LOOKUPS, callers hold the lock
+
+    def _find_team(self, team_id: ObjectId) -> tuple[dict | None, dict | None]:
+        player: dict | None = self._players.get(self._teams.get(team_id))
+        if player is None:
+            return None, None
+        team: dict | None = next(
+            (team for team in player["teams"] if team["team_id"] == team_id), None)
+        return player, team
+
+    def _find_game(self, game_id: ObjectId) -> tuple[dict | None, dict | None, dict | None]:
+        player, team = self._find_team(self._games.get(game_id))
+        if team is None:
+            return None, None, None
+        game: dict | None = next(
+            (game for game in team["games"] if game["game_id"] == game_id), None)
+        return player, team, game
+
+    def _check_new_team(self, team: dict) -> None:
+        if team["team_id"] in self._teams:
+            raise duplicate_key("team_id", team["team_id"])
+        for game in team.get("games", []):
+            if game["game_id"] in self._games:
+                raise duplicate_key("game_id", game["game_id"])
+
+    def _index_team(self, team: dict, player_id: ObjectId) -> None:
+        self._teams[team["team_id"]] = player_id
+        for game in team.get("games", []):
+            self._games[game["game_id"]] = team["team_id"]
+
+    def _unindex_team(self, team: dict) -> None:
+        self._teams.pop(team["team_id"], None)
+        for game in team.get("games", []):
+            self._games.pop(game["game_id"], None)
+
+
+# Inclusion projections of top level fields, the only ones used by services
+def project(document: dict, projection: dict | None) -> dict:
+    if projection is None:
+        return copy.deepcopy(document)
+    projected: dict = {} if projection.get("_id", 1) == 0 else {"_id": document["_id"]}
+    for field, included in projection.items():
+        if included and field != "_id" and field in document:
+            projected[field] = copy.deepcopy(document[field])
+    return projected
+
+
+# Same as $set of fields in document: returns 1 only if some value actually changed, then
+# versions of document and the documents containing it are increased
+def set_fields(fields: dict, document: dict, *containers: dict) -> int:
+    modified: bool = any(field not in document or document[field] != value
+                         for field, value in fields.items())
+    if modified:
+        document.update(copy.deepcopy(fields))
+        increase_versions(document, *containers)
+    return int(modified)
+
+
+def increase_versions(*documents: dict) -> None:
+    for document in documents:
+        document["version"] = document.get("version", 0) + 1
@@ -0,0 +1,283 @@
+from datetime import datetime
+from typing import AsyncIterator
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from config.db.client import get_db_client
+from repositories.base_repository import (Repository, duplicate_key, object_id_cursor,
+                                             team_cursor, teams_after)
+from utils.stats_pipeline import active_game_filter, counter_name, register_actions_pipeline
+
+
+# Data access for the embedded layout: teams and games live inside each players document
+class MongoRepository(Repository):
+
+    # PLAYERS
+
+    # Players in _id order after cursor (a player id), as (cursor, document) pairs
+    def iterate_players(self, after: str | None,
+                        batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        query: dict = {} if after is None else {"_id": {"$gt": object_id_cursor(after)}}
+        return documents(
+            get_db_client().players.find(query).sort("_id", ASCENDING).batch_size(batch_size))
+
+    async def find_player(self, player_id: str, projection: dict = None) -> dict | None:
+        return await get_db_client().players.find_one({"_id": ObjectId(player_id)}, projection)
+
+    async def find_player_version(self, player_id: str) -> int | None:
+        player = await get_db_client().players.find_one(
+            {"_id": ObjectId(player_id)}, {"_id": 0, "version": 1})
+        return None if player is None else player.get("version", 0)
+
+    async def find_player_by_email(self, email: str, projection: dict = None) -> dict | None:
+        return await get_db_client().players.find_one({"email": email}, projection)
+
+    async def count_players(self, player_id: str) -> int:
+        return await get_db_client().players.count_documents({"_id": ObjectId(player_id)})
+
+    async def insert_player(self, player: dict) -> ObjectId:
+        return (await get_db_client().players.insert_one(player)).inserted_id
+
+    # Player is only matched if some value changes, so version is kept otherwise
+    async def update_player(self, player_id: str, fields: dict) -> int:
+        result = await get_db_client().players.update_one(
+            {"_id": ObjectId(player_id), **changed_filter(fields)},
+            {"$set": fields, "$inc": {"version": 1}})
+        return result.modified_count
+
+    async def delete_player(self, player_id: str) -> int:
+        result = await get_db_client().players.delete_one({"_id": ObjectId(player_id)})
+        return result.deleted_count
+
+    # TEAMS
+
+    # Teams in owner _id order and then in team_id order, cursor is "<player_id>.<team_id>"
+    def iterate_teams(self, after: str | None,
+                      batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        player_id, team_id = team_cursor(after)
+        query: dict = {"teams.0": {"$exists": True}}
+        if player_id is not None:
+            query["_id"] = {"$gte": player_id}
+        players = get_db_client().players.find(query, {"teams": 1}).sort("_id", ASCENDING)
+        return embedded_teams(players.batch_size(batch_size), player_id, team_id)
+
+    async def find_player_teams(self, player_id: str) -> list[dict] | None:
+        player = await get_db_client().players.find_one(
+            {"_id": ObjectId(player_id)}, {"teams": 1})
+        return None if player is None else player["teams"]
+
+    # Teams of the player that owns team_id
+    async def find_owner_teams(self, team_id: str) -> list[dict] | None:
+        player = await get_db_client().players.find_one(
+            {"teams.team_id": ObjectId(team_id)}, {"teams": 1})
+        return None if player is None else player["teams"]
+
+    # $elemMatch projection returns only the requested team
+    async def find_team(self, team_id: str) -> dict | None:
+        player = await get_db_client().players.find_one(
+            {"teams.team_id": ObjectId(team_id)},
+            {"_id": 0, "teams": {"$elemMatch": {"team_id": ObjectId(team_id)}}})
+        return None if player is None else player["teams"][0]
+
+    # Only the version of the team is sent back by the server
+    async def find_team_version(self, team_id: str) -> int | None:
+        player = await get_db_client().players.find_one(
+            {"teams.team_id": ObjectId(team_id)},
+            {"_id": 0, "version": first_version("$teams", "team_id", ObjectId(team_id))})
+        return None if player is None else player["version"]
+
+    async def count_teams(self, team_id: str) -> int:
+        return await get_db_client().players.count_documents({"teams.team_id": ObjectId(team_id)})
+
+    async def push_team(self, player_id: str, team: dict) -> int:
+        result = await get_db_client().players.update_one(
+            {"_id": ObjectId(player_id)},
+            {"$push": {"teams": team}, "$inc": {"version": 1}})
+        return result.modified_count
+
+    async def update_team(self, team_id: str, fields: dict) -> int:
+        result = await get_db_client().players.update_one(
+            {"teams": {"$elemMatch": {"team_id": ObjectId(team_id), **changed_filter(fields)}}},
+            {"$set": {f"teams.$.{field}": value for field, value in fields.items()},
+             "$inc": {"version": 1, "teams.$.version": 1}})
+        return result.modified_count
+
+    async def pull_team(self, player_id: str, team_id: str) -> int:
+        result = await get_db_client().players.update_one(
+            {"_id": ObjectId(player_id), "teams.team_id": ObjectId(team_id)},
+            {"$pull": {"teams": {"team_id": ObjectId(team_id)}}, "$inc": {"version": 1}})
+        return result.modified_count
+
+    # GAMES
+
+    async def find_game(self, game_id: str) -> dict | None:
+        player = await get_db_client().players.find_one(
+            {"teams.games.game_id": ObjectId(game_id)}, game_projection(ObjectId(game_id)))
+        return None if player is None else player.get("game")
+
+    async def find_game_version(self, game_id: str) -> int | None:
+        player = await get_db_client().players.find_one(
+            {"teams.games.game_id": ObjectId(game_id)},
+            {"_id": 0, "version": first_version(
+                {"$reduce": {
+                    "input": "$teams",
+                    "initialValue": [],
+                    "in": {"$concatArrays": ["$$value", "$$this.games"]}}},
+                "game_id", ObjectId(game_id))})
+        return None if player is None else player["version"]
+
+    async def count_games(self, game_id: str) -> int:
+        return await get_db_client().players.count_documents(
+            {"teams.games.game_id": ObjectId(game_id)})
+
+    async def count_player_games(self, player_id: str, game_id: str,
+                                 team_id: str | None = None) -> int:
+        team_query: dict = {"games.game_id": ObjectId(game_id)}
+        if team_id is not None:
+            team_query["team_id"] = ObjectId(team_id)
+        return await get_db_client().players.count_documents(
+            {"_id": ObjectId(player_id), "teams": {"$elemMatch": team_query}})
+
+    # No unique index can cover game ids nested in two arrays (teams without games would
+    # share a missing key), so ids are rejected like a unique key: the update only matches
+    # if the player does not have the id yet, and players are looked up first for the rest
+    async def push_game(self, team_id: str, game: dict) -> int:
+        if await get_db_client().players.count_documents(
+                {"teams.games.game_id": game["game_id"]}, limit=1) > 0:
+            raise duplicate_key("teams.games.game_id", game["game_id"])
+        result = await get_db_client().players.update_one(
+            {"teams.team_id": ObjectId(team_id), "teams.games.game_id": {"$ne": game["game_id"]}},
+            {"$push": {"teams.$[t].games": game},
+             "$inc": {"version": 1, "teams.$[t].version": 1}},
+            array_filters=[{"t.team_id": ObjectId(team_id)}])
+        if result.matched_count == 0 and await self.count_teams(team_id) == 1:
+            raise duplicate_key("teams.games.game_id", game["game_id"])
+        return result.modified_count
+
+    async def finish_game(self, team_id: str, game_id: str) -> int:
+        return await self._update_game(team_id, game_id, {"status": 0}, {"status": 1})
+
+    # Adds deltas to game, team and player counters in one atomic update,
+    # returns updated game or None if game is not active for that player and team
+    async def register_actions(self, player_id: str, team_id: str, game_id: str,
+                               deltas: dict[str, int]) -> dict | None:
+        player = await get_db_client().players.find_one_and_update(
+            active_game_filter(ObjectId(player_id), ObjectId(team_id), ObjectId(game_id)),
+            register_actions_pipeline(ObjectId(team_id), ObjectId(game_id), deltas),
+            projection=game_projection(ObjectId(game_id)),
+            return_document=ReturnDocument.AFTER)
+        return None if player is None else player.get("game")
+
+    async def update_game(self, team_id: str, game_id: str, fields: dict) -> int:
+        return await self._update_game(team_id, game_id, fields, changed_filter(fields))
+
+    # Player is only matched if the game (filtered by game_query) is in that team, so
+    # versions are not increased when nothing is updated
+    async def _update_game(self, team_id: str, game_id: str, fields: dict,
+                           game_query: dict) -> int:
+        result = await get_db_client().players.update_one(
+            {"teams": {"$elemMatch": {
+                "team_id": ObjectId(team_id),
+                "games": {"$elemMatch": {"game_id": ObjectId(game_id), **game_query}}}}},
+            {"$set": {
+                f"teams.$[t].games.$[g].{field}": value for field, value in fields.items()},
+             "$inc": {
+                "version": 1,
+                "teams.$[t].version": 1,
+                "teams.$[t].games.$[g].version": 1}},
+            array_filters=[
+                {"t.team_id": ObjectId(team_id)},
+                {"g.game_id": ObjectId(game_id)}])
+        return result.modified_count
+
+    # GAME ACTIONS LOG
+
+    # Unordered bulk insert, a failed entry does not stop the rest of the batch
+    async def insert_game_actions(self, game_actions: list[dict]) -> int:
+        result = await get_db_client().game_actions.insert_many(game_actions, ordered=False)
+        return len(result.inserted_ids)
+
+    async def find_game_actions(self, game_id: str) -> list[dict]:
+        return await get_db_client().game_actions.find(
+            {"game_id": ObjectId(game_id)}).sort("seq", ASCENDING).to_list(length=None)
+
+    # Number of logged actions per counter, filter is one of game_id, team_id or player_id
+    async def count_game_actions(self, field: str, entity_id: str) -> dict[str, int]:
+        groups = await get_db_client().game_actions.aggregate([
+            {"$match": {field: ObjectId(entity_id)}},
+            {"$group": {
+                "_id": {"action": "$action", "action_result": "$action_result"},
+                "count": {"$sum": 1}}}]).to_list(length=None)
+        return {counter_name(group["_id"]["action"], group["_id"]["action_result"]):
+                group["count"] for group in groups}
+
+    # DAILY ROLLUPS, same collection for both layouts
+
+    async def increment_daily_counters(self, player_id: str, day: datetime,
+                                       deltas: dict[str, int]) -> None:
+        await get_db_client().player_daily_stats.update_one(
+            {"player_id": ObjectId(player_id), "day": day}, {"$inc": deltas}, upsert=True)
+
+    async def find_daily_counters(self, player_id: str, since: datetime | None,
+                                  until: datetime | None) -> list[dict]:
+        query: dict = {"player_id": ObjectId(player_id)}
+        day_range: dict = {operator: value for operator, value in (("$gte", since), ("$lt", until))
+                           if value is not None}
+        if len(day_range) > 0:
+            query["day"] = day_range
+        return await get_db_client().player_daily_stats.find(
+            query, {"_id": 0}).sort("day", ASCENDING).to_list(length=None)
+
+
+# Only the requested game is sent back by the server, as "game" field
+def game_projection(game_id: ObjectId) -> dict:
+    return {
+        "_id": 0,
+        "game": {"$arrayElemAt": [
+            {"$reduce": {
+                "input": "$teams",
+                "initialValue": [],
+                "in": {"$concatArrays": ["$$value", {"$filter": {
+                    "input": "$$this.games",
+                    "as": "g",
+                    "cond": {"$eq": ["$$g.game_id", game_id]}}}]}}},
+            0]}}
+
+
+# Version of the first element of items whose key is value, 0 if it has no version
+def first_version(items: str | dict, key: str, value: ObjectId) -> dict:
+    return {"$ifNull": [
+        {"$arrayElemAt": [
+            {"$map": {
+                "input": {"$filter": {
+                    "input": items,
+                    "as": "item",
+                    "cond": {"$eq": [f"$$item.{key}", value]}}},
+                "as": "item",
+                "in": "$$item.version"}},
+            0]},
+        0]}
+
+
+# Query of documents (or elements) where some of the fields have another value
+def changed_filter(fields: dict) -> dict:
+    return {"$or": [{field: {"$ne": value}} for field, value in fields.items()]}
+
+
+# Documents are read as the cursor yields them, server cursor is closed if the consumer
+# stops early
+async def documents(cursor) -> AsyncIterator[tuple[str, dict]]:
+    try:
+        async for document in cursor:
+            yield str(document["_id"]), document
+    finally:
+        await cursor.close()
+
+
+async def embedded_teams(players, after_player: ObjectId | None,
+                         after_team: ObjectId | None) -> AsyncIterator[tuple[str, dict]]:
+    try:
+        async for player in players:
+            for team in teams_after(player["_id"], player["teams"], after_player, after_team):
+                yield f"{player['_id']}.{team['team_id']}", team
+    finally:
+        await players.close()
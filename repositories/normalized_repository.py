@@ -0,0 +1,242 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from config.db.client import get_db_client
+from repositories.base_repository import object_id_cursor
+from repositories.mongo_repository import MongoRepository, changed_filter, documents
+from utils.stats_pipeline import register_document_actions_pipeline
+
+
+# Data access for the normalized layout: teams and games have their own collections keyed
+# by their id (_id) and reference their owner, so reading or updating one game does not
+# load the whole career of the player. Documents are returned with the same shape as the
+# embedded layout (team_id/game_id keys, teams with their games) so services and schemas
+# work the same with both layouts. Writes of teams and games also increase the version of
+# their team and player documents (see Repository).
+class NormalizedMongoRepository(MongoRepository):
+
+    # PLAYERS
+
+    # Teams and games are read once per batch of players
+    def iterate_players(self, after: str | None,
+                        batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        return self._players_with_teams(super().iterate_players(after, batch_size), batch_size)
+
+    async def _players_with_teams(self, players: AsyncIterator[tuple[str, dict]],
+                                  batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        async with aclosing(in_batches(players, batch_size)) as batches:
+            async for batch in batches:
+                player_ids: list[ObjectId] = [player["_id"] for _, player in batch]
+                teams: list[dict] = await self._find_teams(
+                    {"player_id": {"$in": player_ids}}, {"player_id": {"$in": player_ids}})
+                teams_by_player: dict = {}
+                for team in teams:
+                    teams_by_player.setdefault(team["player_id"], []).append(team)
+                for cursor, player in batch:
+                    player["teams"] = teams_by_player.get(player["_id"], [])
+                    yield cursor, player
+
+    async def find_player(self, player_id: str, projection: dict = None) -> dict | None:
+        if projection is not None:
+            return await super().find_player(player_id, projection)
+        player, teams = await asyncio.gather(
+            super().find_player(player_id),
+            self._find_teams(
+                {"player_id": ObjectId(player_id)}, {"player_id": ObjectId(player_id)}))
+        if player is not None:
+            player["teams"] = teams
+        return player
+
+    async def delete_player(self, player_id: str) -> int:
+        deleted_count, _, _ = await asyncio.gather(
+            super().delete_player(player_id),
+            get_db_client().teams.delete_many({"player_id": ObjectId(player_id)}),
+            get_db_client().games.delete_many({"player_id": ObjectId(player_id)}))
+        return deleted_count
+
+    # TEAMS
+
+    async def _find_teams(self, teams_query: dict, games_query: dict) -> list[dict]:
+        teams, games = await asyncio.gather(
+            get_db_client().teams.find(teams_query).to_list(length=None),
+            get_db_client().games.find(games_query).to_list(length=None))
+        return join_games(teams, games)
+
+    # Teams in _id order after cursor (a team id), games are read once per batch of teams
+    def iterate_teams(self, after: str | None,
+                      batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        query: dict = {} if after is None else {"_id": {"$gt": object_id_cursor(after)}}
+        teams = get_db_client().teams.find(query).sort("_id", ASCENDING).batch_size(batch_size)
+        return self._teams_with_games(documents(teams), batch_size)
+
+    async def _teams_with_games(self, teams: AsyncIterator[tuple[str, dict]],
+                                batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+        async with aclosing(in_batches(teams, batch_size)) as batches:
+            async for batch in batches:
+                team_ids: list[ObjectId] = [team["_id"] for _, team in batch]
+                games: list[dict] = await get_db_client().games.find(
+                    {"team_id": {"$in": team_ids}}).to_list(length=None)
+                joined: list[dict] = join_games([team for _, team in batch], games)
+                for (cursor, _), team in zip(batch, joined):
+                    yield cursor, team
+
+    async def find_player_teams(self, player_id: str) -> list[dict] | None:
+        players, teams = await asyncio.gather(
+            super().count_players(player_id),
+            self._find_teams(
+                {"player_id": ObjectId(player_id)}, {"player_id": ObjectId(player_id)}))
+        return None if players == 0 else teams
+
+    async def find_owner_teams(self, team_id: str) -> list[dict] | None:
+        team = await get_db_client().teams.find_one({"_id": ObjectId(team_id)}, {"player_id": 1})
+        return None if team is None else await self.find_player_teams(team["player_id"])
+
+    async def find_team(self, team_id: str) -> dict | None:
+        teams = await self._find_teams({"_id": ObjectId(team_id)}, {"team_id": ObjectId(team_id)})
+        return teams[0] if len(teams) > 0 else None
+
+    async def find_team_version(self, team_id: str) -> int | None:
+        team = await get_db_client().teams.find_one({"_id": ObjectId(team_id)}, {"version": 1})
+        return None if team is None else team.get("version", 0)
+
+    async def count_teams(self, team_id: str) -> int:
+        return await get_db_client().teams.count_documents({"_id": ObjectId(team_id)})
+
+    async def push_team(self, player_id: str, team: dict) -> int:
+        await get_db_client().teams.insert_one(team_document(team, ObjectId(player_id)))
+        await increase_versions(ObjectId(player_id))
+        return 1
+
+    async def update_team(self, team_id: str, fields: dict) -> int:
+        team = await get_db_client().teams.find_one_and_update(
+            {"_id": ObjectId(team_id), **changed_filter(fields)},
+            {"$set": fields, "$inc": {"version": 1}},
+            projection={"player_id": 1})
+        if team is None:
+            return 0
+        await increase_versions(team["player_id"])
+        return 1
+
+    async def pull_team(self, player_id: str, team_id: str) -> int:
+        result, _ = await asyncio.gather(
+            get_db_client().teams.delete_one(
+                {"_id": ObjectId(team_id), "player_id": ObjectId(player_id)}),
+            get_db_client().games.delete_many(
+                {"team_id": ObjectId(team_id), "player_id": ObjectId(player_id)}))
+        if result.deleted_count == 1:
+            await increase_versions(ObjectId(player_id))
+        return result.deleted_count
+
+    # GAMES
+
+    async def find_game(self, game_id: str) -> dict | None:
+        game = await get_db_client().games.find_one({"_id": ObjectId(game_id)})
+        return None if game is None else from_game_document(game)
+
+    async def find_game_version(self, game_id: str) -> int | None:
+        game = await get_db_client().games.find_one({"_id": ObjectId(game_id)}, {"version": 1})
+        return None if game is None else game.get("version", 0)
+
+    async def count_games(self, game_id: str) -> int:
+        return await get_db_client().games.count_documents({"_id": ObjectId(game_id)})
+
+    async def count_player_games(self, player_id: str, game_id: str,
+                                 team_id: str | None = None) -> int:
+        query: dict = {"_id": ObjectId(game_id), "player_id": ObjectId(player_id)}
+        if team_id is not None:
+            query["team_id"] = ObjectId(team_id)
+        return await get_db_client().games.count_documents(query)
+
+    async def push_game(self, team_id: str, game: dict) -> int:
+        team = await get_db_client().teams.find_one({"_id": ObjectId(team_id)}, {"player_id": 1})
+        if team is None:
+            return 0
+        await get_db_client().games.insert_one(
+            game_document(game, ObjectId(team_id), team["player_id"]))
+        await increase_versions(team["player_id"], ObjectId(team_id))
+        return 1
+
+    async def finish_game(self, team_id: str, game_id: str) -> int:
+        return await self._update_game(team_id, game_id, {"status": 0}, {"status": 1})
+
+    # Game update is conditional on the game being active, team and player are only
+    # updated (concurrently) after it matched
+    async def register_actions(self, player_id: str, team_id: str, game_id: str,
+                               deltas: dict[str, int]) -> dict | None:
+        pipeline: list[dict] = register_document_actions_pipeline(deltas)
+        game = await get_db_client().games.find_one_and_update(
+            {"_id": ObjectId(game_id), "team_id": ObjectId(team_id),
+             "player_id": ObjectId(player_id), "status": 1},
+            pipeline,
+            return_document=ReturnDocument.AFTER)
+        if game is None:
+            return None
+        await asyncio.gather(
+            get_db_client().teams.update_one({"_id": ObjectId(team_id)}, pipeline),
+            get_db_client().players.update_one({"_id": ObjectId(player_id)}, pipeline))
+        return from_game_document(game)
+
+    async def update_game(self, team_id: str, game_id: str, fields: dict) -> int:
+        return await self._update_game(team_id, game_id, fields, changed_filter(fields))
+
+    async def _update_game(self, team_id: str, game_id: str, fields: dict,
+                           game_query: dict) -> int:
+        game = await get_db_client().games.find_one_and_update(
+            {"_id": ObjectId(game_id), "team_id": ObjectId(team_id), **game_query},
+            {"$set": fields, "$inc": {"version": 1}},
+            projection={"player_id": 1})
+        if game is None:
+            return 0
+        await increase_versions(game["player_id"], ObjectId(team_id))
+        return 1
+
+
+# Versions of the player and the team that contain a written team or game
+async def increase_versions(player_id: ObjectId, team_id: ObjectId | None = None) -> None:
+    updates: list = [get_db_client().players.update_one(
+        {"_id": player_id}, {"$inc": {"version": 1}})]
+    if team_id is not None:
+        updates.append(get_db_client().teams.update_one(
+            {"_id": team_id}, {"$inc": {"version": 1}}))
+    await asyncio.gather(*updates)
+
+
+async def in_batches(items: AsyncIterator, size: int) -> AsyncIterator[list]:
+    async with aclosing(items):
+        batch: list = []
+        async for item in items:
+            batch.append(item)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+
+def team_document(team: dict, player_id: ObjectId) -> dict:
+    document: dict = {key: value for key, value in team.items()
+                      if key not in ("team_id", "games")}
+    return {"_id": team["team_id"], "player_id": player_id, **document}
+
+
+def game_document(game: dict, team_id: ObjectId, player_id: ObjectId) -> dict:
+    document: dict = {key: value for key, value in game.items() if key != "game_id"}
+    return {"_id": game["game_id"], "team_id": team_id, "player_id": player_id, **document}
+
+
+def from_game_document(game: dict) -> dict:
+    game["game_id"] = game.pop("_id")
+    return game
+
+
+# Teams with the same shape as embedded ones, games are sorted in creation order
+def join_games(teams: list[dict], games: list[dict]) -> list[dict]:
+    games_by_team: dict = {}
+    for game in sorted(games, key=lambda game: game["_id"]):
+        games_by_team.setdefault(game["team_id"], []).append(from_game_document(game))
+    for team in teams:
+        team["team_id"] = team.pop("_id")
+        team["games"] = games_by_team.get(team["team_id"], [])
+    return teams
@@ -0,0 +1,29 @@
+from decouple import config
+from repositories.base_repository import Repository
+from repositories.memory_repository import MemoryRepository
+from repositories.mongo_repository import MongoRepository
+from repositories.normalized_repository import NormalizedMongoRepository
+
+
+# "mongo": MongoDB with the layout given by STORAGE_MODE
+# "memory": in-process storage without persistence, for tests, benchmarks and load tests
+REPOSITORY_BACKEND = config("REPOSITORY_BACKEND", default="mongo")
+
+# "embedded": teams and games inside players documents
+# "normalized": teams and games collections (see config/db/migrate_storage.py)
+STORAGE_MODE = config("STORAGE_MODE", default="embedded")
+
+
+def create_repository() -> Repository:
+    if REPOSITORY_BACKEND == "memory":
+        return MemoryRepository()
+    if STORAGE_MODE == "normalized":
+        return NormalizedMongoRepository()
+    return MongoRepository()
+
+
+REPOSITORY: Repository = create_repository()
+
+
+def get_repository() -> Repository:
+    return REPOSITORY
@@ -1,38 +1,82 @@
-from fastapi import APIRouter, status, Depends
-from routers.login_controller import get_current_player
-from models.game_models import Game, GameAction, EndGame
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, status, Depends
+from routers.login_controller import decode_token, get_current_player
+from models.game_models import Game, GameAction, EndGame, LoggedGameAction
 from models.response_models import ResponseModel
 import services.games_service as GameService
-from config.logger.logger import LOG
+import services.game_actions_service as GameActionService
+from config.logger.logger import get_logger
+from utils.etag import entity_tag, etag_headers, etag_matches, not_modified
+from utils.fast_json import FastJSONResponse, encode_document, model_response
+from utils.live_feed import LIVE_FEED, Subscriber, encode_event, snapshot_event, stream
+
+
+# Actions are scored all game long, its DEBUG records can be sampled (LOG_DEBUG_SAMPLING)
+LOG = get_logger("games")
 
 
 router = APIRouter(prefix="/games", tags=["Games"])
 
 
-@router.get("/{game_id}", status_code=status.HTTP_200_OK, response_model=ResponseModel)
-async def get_game_by_id(game_id: str, player_id: str = Depends(get_current_player)):
+@router.get("/{game_id}", status_code=status.HTTP_200_OK, response_model=ResponseModel,
+            response_class=FastJSONResponse)
+async def get_game_by_id(game_id: str, player_id: str = Depends(get_current_player),
+                         if_none_match: str = Header(None)):
     LOG.info("Request for get_game_by_id.")
-    LOG.debug(f"User: {player_id}. Game: {game_id}.")
-    game: Game = GameService.get_game_by_id(game_id)
+    LOG.debug("User: %s. Game: %s.", player_id, game_id)
+    # Only the version is read to check if client copy is still valid
+    if if_none_match is not None:
+        etag: str = entity_tag(game_id, await GameService.get_game_version(game_id))
+        if etag_matches(if_none_match, etag):
+            LOG.info("Game not modified, response sent.")
+            return not_modified(etag)
+    game: dict = await GameService.get_game_document(game_id)
     LOG.info("Game info sent as response. Model: Game.")
-    return ResponseModel(data=game)
+    return model_response(encode_document(game, Game),
+                          headers=etag_headers(entity_tag(game_id, game.get("version", 0))))
+
+
+# Live feed of a game: a snapshot of the game and then the counter deltas of every action
+# registered, feed is closed when the game is finished. Browsers can not set headers on
+# WebSockets, so the access token is sent as "token" query parameter.
+@router.websocket("/{game_id}/live")
+async def follow_game(websocket: WebSocket, game_id: str, token: str = Query(...)):
+    LOG.info("Request for follow_game.")
+    subscriber: Subscriber | None = None
+    try:
+        player_id: str = await decode_token(token)
+        LOG.debug("User: %s. Game: %s.", player_id, game_id)
+        subscriber = LIVE_FEED.subscribe(game_id)
+        game: dict = await GameService.get_game_document(game_id)
+        await websocket.accept()
+        await websocket.send_text(encode_event(
+            snapshot_event(game_id, encode_document(game, Game))))
+        LOG.info("Game snapshot sent, following game.")
+        if game["status"] == 0 or await stream(websocket, subscriber):
+            await websocket.close()
+        LOG.info("Game feed closed.")
+    except HTTPException as exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=exception.detail)
+    finally:
+        if subscriber is not None:
+            LIVE_FEED.unsubscribe(subscriber)
 
 
 @router.post("/{team_id}", status_code=status.HTTP_201_CREATED, response_model=ResponseModel)
 async def create_game(team_id: str, new_game: Game, player_id: str = Depends(get_current_player)):
     LOG.info("Request for create_game.")
-    LOG.debug(f"User: {player_id}. Team: {team_id}.")
-    game: Game = GameService.create_game(team_id, new_game, player_id)
+    LOG.debug("User: %s. Team: %s.", player_id, team_id)
+    game: Game = await GameService.create_game(team_id, new_game, player_id)
     LOG.info("New game created, response sent.")
-    LOG.debug(f"New game: {new_game.game_id}")
+    LOG.debug("New game: %s", new_game.game_id)
     return ResponseModel(data=game, detail=f"Game {new_game.game_id} has started.")
 
 
 @router.put("/finish_game", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def finish_game(game_to_finish: EndGame, player_id: str = Depends(get_current_player)):
     LOG.info("Request for finish_game.")
-    LOG.debug(f"User: {player_id}. Team: {game_to_finish.team_id}. Game: {game_to_finish.game_id}.")
-    GameService.finish_game(game_to_finish)
+    LOG.debug("User: %s. Team: %s. Game: %s.",
+              player_id, game_to_finish.team_id, game_to_finish.game_id)
+    await GameService.finish_game(game_to_finish)
     LOG.info("Game finished , response sent.")
     return ResponseModel(detail=f"Game with id {game_to_finish.game_id} was finished.")
     
@@ -40,7 +84,39 @@ async def finish_game(game_to_finish: EndGame, player_id: str = Depends(get_curr
 @router.put("/play_game", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def play_game(game_action: GameAction, player_id: str = Depends(get_current_player)):
     LOG.info("Request for play_game.")
-    LOG.debug(f"User: {player_id}. Team: {game_action.team_id}. Game: {game_action.game_id}.")
-    game: Game = GameService.play_game(game_action, player_id)
+    LOG.debug("User: %s. Team: %s. Game: %s.", player_id, game_action.team_id, game_action.game_id)
+    game: Game = await GameService.play_game(game_action, player_id)
     LOG.info("Game updated, response sent. Model: Game.")
     return ResponseModel(data=game)
+
+
+@router.put("/{game_id}/actions:batch", status_code=status.HTTP_200_OK,
+            response_model=ResponseModel)
+async def play_game_actions(game_id: str, game_actions: list[GameAction],
+                            player_id: str = Depends(get_current_player)):
+    LOG.info("Request for play_game_actions.")
+    LOG.debug("User: %s. Game: %s. Actions: %s.", player_id, game_id, len(game_actions))
+    game: Game = await GameService.play_game_actions(game_id, game_actions, player_id)
+    LOG.info("Game updated with batch of actions, response sent. Model: Game.")
+    return ResponseModel(data=game, detail=f"{len(game_actions)} actions registered.")
+
+
+@router.get("/{game_id}/actions", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+async def get_game_actions(game_id: str, player_id: str = Depends(get_current_player)):
+    LOG.info("Request for get_game_actions.")
+    LOG.debug("User: %s. Game: %s.", player_id, game_id)
+    game_actions: list[LoggedGameAction] = await GameActionService.get_game_actions(
+        game_id, player_id)
+    LOG.info("List of game actions sent as response. Model: LoggedGameAction.")
+    return ResponseModel(data=game_actions)
+
+
+@router.put("/rebuild_statistics", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+async def rebuild_game_statistics(game_to_rebuild: EndGame,
+                                  player_id: str = Depends(get_current_player)):
+    LOG.info("Request for rebuild_game_statistics.")
+    LOG.debug("User: %s. Team: %s. Game: %s.",
+              player_id, game_to_rebuild.team_id, game_to_rebuild.game_id)
+    game: Game = await GameService.rebuild_game_statistics(game_to_rebuild, player_id)
+    LOG.info("Game statistics rebuilt from actions log, response sent. Model: Game.")
+    return ResponseModel(data=game)
@@ -8,6 +8,7 @@ from jose import JWTError, jwt
 import services.login_service as LoginService
 from config.logger.logger import LOG
 from models.login_models import AuthResponse, RefreshToken
+from models.response_models import ResponseModel
 from utils import exceptions as ex
 
 router = APIRouter(prefix="/auth", tags=["Login"])
@@ -20,25 +21,31 @@ ALGORITHM = config("ALGORITHM")
 
 
 async def get_current_player(token: str = Depends(oauth2)) -> str:
-    return decode_token(token)
+    return await decode_token(token)
 
 
 @router.post("/login", status_code=status.HTTP_200_OK, response_model=AuthResponse or JSONResponse)
 async def login(form: OAuth2PasswordRequestForm = Depends()):
-    LOG.info(f"Login request for {form.username}.")
-    LOG.debug(f"Data for login request, username: {form.username}, password: {form.password}.")
-    player_id: str = LoginService.check_username_and_password(form.username, form.password)
+    LOG.info("Login request for %s.", form.username)
+    player_id: str = await LoginService.check_username_and_password(form.username, form.password)
     return create_auth_response(player_id)
 
 
 @router.post("/refresh-token", status_code=status.HTTP_200_OK, response_model=AuthResponse)
 async def update_tokens(refresh_token: RefreshToken):
     LOG.info("Refresh token request.")
-    LOG.debug(f"Refresh token for request: {refresh_token.refresh_token}.")
-    player_id: str = decode_token(refresh_token.refresh_token)
+    player_id: str = await decode_token(refresh_token.refresh_token)
     return create_auth_response(player_id)
 
 
+# Currently does not depend on AUTH through Depends(get_current_player)
+# because this is meant to be an ADMIN endpoint
+@router.get("/principal-cache", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+async def get_principal_cache_stats():
+    LOG.info("Request for get_principal_cache_stats.")
+    return ResponseModel(data=LoginService.PRINCIPAL_CACHE.stats())
+
+
 def create_auth_response(player_id: str) -> AuthResponse:
     access_token = {
         "sub": player_id,
@@ -50,21 +57,25 @@ def create_auth_response(player_id: str) -> AuthResponse:
     }
     token: str = jwt.encode(access_token, SECRET, algorithm=ALGORITHM)
     token2: str = jwt.encode(refresh_token, SECRET, algorithm=ALGORITHM)
-    LOG.debug(f"Access Token: {token}")
-    LOG.debug(f"Refresh Token: {token2}")
     LOG.info("Access and refresh tokens were created and sent as response.")
     # If user authentication is ok API returns access token
     return AuthResponse(access_token=token, refresh_token=token2)
 
 
-def decode_token(token: str) -> str:
+async def decode_token(token: str) -> str:
+    player_id: str | None = LoginService.get_cached_principal(token)
+    if player_id is not None:
+        return player_id
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
-        player_id: str = payload.get("sub")
+        # Every token issued has exp, principals are cached until it
+        payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM],
+                             options={"require_exp": True})
+        player_id = payload.get("sub")
         if player_id is None or not ObjectId.is_valid(player_id):
             ex.invalid_token()
-        if not LoginService.check_if_player_exists(player_id):
+        if not await LoginService.check_if_player_exists(player_id):
             ex.invalid_token()
     except JWTError:
         ex.invalid_token()
+    LoginService.cache_principal(token, player_id, payload["exp"])
     return player_id
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+from models.response_models import ResponseModel
+from utils.db_monitoring import COMMAND_MONITOR
+from utils.metrics import METRICS, PROMETHEUS_MEDIA_TYPE
+
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+# Currently does not depend on AUTH, meant to be scraped by Prometheus
+@router.get("", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+# Currently does not depend on AUTH because this is meant to be an ADMIN endpoint
+# Mongo commands by service call site (label of the DB call) and command name, most time
+# spent first. Percentiles are computed over the last CALL_SITE_WINDOW commands.
+@router.get("/db-calls", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+async def get_db_calls():
+    return ResponseModel(data=COMMAND_MONITOR.call_sites())
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, Header, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from routers.login_controller import get_current_player
-from models.player_models import NewPlayer, Player, PlayerBase, NewPassword
-from models.response_models import ResponseModel
+from datetime import date
+from models.player_models import NewPlayer, Player, PlayerBase, NewPassword, PlayerStatisticPoint
+from models.response_models import ResponseModel, PageResponseModel
 import services.players_service as PlayerService
 from config.logger.logger import LOG
+from utils.etag import entity_tag, etag_headers, etag_matches, not_modified
+from utils.fast_json import FastJSONResponse, encode_document, encode_documents, model_response
+from utils.pagination import MAX_PAGE_SIZE, NDJSON_MEDIA_TYPE, PAGE_SIZE
 
 
 router = APIRouter(prefix="/players", tags=["Players"])
@@ -11,21 +16,52 @@ router = APIRouter(prefix="/players", tags=["Players"])
 
 # Currently does not depend on AUTH through Depends(get_current_player)
 # because this is meant to be an ADMIN endpoint
-@router.get("", status_code=status.HTTP_200_OK, response_model=ResponseModel)
-async def get_all_players():
+# Pages are read after the cursor of the previous page (next_cursor), stream=true sends
+# every player after the cursor as NDJSON instead
+@router.get("", status_code=status.HTTP_200_OK, response_model=PageResponseModel,
+            response_class=FastJSONResponse)
+async def get_all_players(after: str = None,
+                          limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          stream: bool = False):
     LOG.info("Request for get_all_players.")
-    players: list[Player] = PlayerService.get_all_players()
-    LOG.info("List of players sent as response. Model: Player.")
-    return ResponseModel(data=players)
+    if stream:
+        LOG.info("Players streamed as response. Model: Player.")
+        return StreamingResponse(PlayerService.stream_players(after), media_type=NDJSON_MEDIA_TYPE)
+    players, next_cursor = await PlayerService.get_all_players(after, limit)
+    LOG.info("Page of players sent as response. Model: Player.")
+    return model_response(encode_documents(players, Player), next_cursor=next_cursor)
 
 
-@router.get("/player", status_code=status.HTTP_200_OK, response_model=ResponseModel)
-async def get_player_by_id(player_id: str = Depends(get_current_player)):
+@router.get("/player", status_code=status.HTTP_200_OK, response_model=ResponseModel,
+            response_class=FastJSONResponse)
+async def get_player_by_id(player_id: str = Depends(get_current_player),
+                           if_none_match: str = Header(None)):
     LOG.info("Request for get_player_by_id.")
-    LOG.debug(f"User: {player_id}.")
-    player: Player = PlayerService.get_player_by_id(player_id)
+    LOG.debug("User: %s.", player_id)
+    if if_none_match is not None:
+        version: int | None = await PlayerService.get_player_version(player_id)
+        if version is not None and etag_matches(if_none_match, entity_tag(player_id, version)):
+            LOG.info("Player not modified, response sent.")
+            return not_modified(entity_tag(player_id, version))
+    player: dict = await PlayerService.get_player_by_id(player_id)
     LOG.info("Player info sent as response. Model: Player.")
-    return ResponseModel(data=player)
+    if player is None:
+        return model_response(None)
+    return model_response(encode_document(player, Player),
+                          headers=etag_headers(entity_tag(player_id, player.get("version", 0))))
+
+
+# Periods (bucket: day, week or month) from since to until, both included and optional,
+# periods without actions are not sent
+@router.get("/player/timeseries", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+async def get_player_timeseries(metric: str, bucket: str = "day", since: date = None,
+                                until: date = None, player_id: str = Depends(get_current_player)):
+    LOG.info("Request for get_player_timeseries.")
+    LOG.debug("User: %s. Metric: %s. Bucket: %s.", player_id, metric, bucket)
+    points: list[PlayerStatisticPoint] = await PlayerService.get_player_timeseries(
+        player_id, metric, bucket, since, until)
+    LOG.info("Player time series sent as response. Model: PlayerStatisticPoint.")
+    return ResponseModel(data=points)
 
 
 # Does not depend on AUTH through Depends(get_current_player) because 
@@ -33,9 +69,9 @@ async def get_player_by_id(player_id: str = Depends(get_current_player)):
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=ResponseModel)
 async def create_player(player: NewPlayer):
     LOG.info("Request for create_player.")    
-    new_player_id: str = PlayerService.create_player(player)
+    new_player_id: str = await PlayerService.create_player(player)
     LOG.info("New player created, response sent.")
-    LOG.debug(f"New user: {new_player_id}.")
+    LOG.debug("New user: %s.", new_player_id)
     return ResponseModel(
         detail=f"Player {player.first_name} {player.last_name} successfully registered.")
 
@@ -43,8 +79,8 @@ async def create_player(player: NewPlayer):
 @router.put("/password", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def update_password(new_password: NewPassword, player_id: str = Depends(get_current_player)):
     LOG.info("Request for update_password.")
-    LOG.debug(f"User: {player_id}.")
-    PlayerService.update_password(new_password, player_id)
+    LOG.debug("User: %s.", player_id)
+    await PlayerService.update_password(new_password, player_id)
     LOG.info("Password updated, response sent.")
     return ResponseModel(detail="Password successfully changed.")
 
@@ -52,8 +88,8 @@ async def update_password(new_password: NewPassword, player_id: str = Depends(ge
 @router.put("", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def update_player(player: PlayerBase, player_id: str = Depends(get_current_player)):
     LOG.info("Request for update_player.")
-    LOG.debug(f"User: {player_id}.")
-    PlayerService.update_player(player, player_id)
+    LOG.debug("User: %s.", player_id)
+    await PlayerService.update_player(player, player_id)
     LOG.info("Player updated, response sent.")
     return ResponseModel(detail="Player successfully updated.")
 
@@ -61,7 +97,7 @@ async def update_player(player: PlayerBase, player_id: str = Depends(get_current
 @router.delete("/delete", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def delete_player(player_id: str = Depends(get_current_player)):
     LOG.info("Request for delete_player.")
-    LOG.debug(f"User: {player_id}.")
-    PlayerService.delete_player(player_id)
+    LOG.debug("User: %s.", player_id)
+    await PlayerService.delete_player(player_id)
     LOG.info("Player deleted, response sent.")
     return ResponseModel(detail="Player successfully deleted.")
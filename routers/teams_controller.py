@@ -1,9 +1,13 @@
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, Header, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from routers.login_controller import get_current_player
 from models.team_models import Team, UpdatedTeam
-from models.response_models import ResponseModel
+from models.response_models import ResponseModel, PageResponseModel
 import services.teams_service as TeamService
 from config.logger.logger import LOG
+from utils.etag import entity_tag, etag_headers, etag_matches, not_modified
+from utils.fast_json import FastJSONResponse, encode_document, encode_documents, model_response
+from utils.pagination import MAX_PAGE_SIZE, NDJSON_MEDIA_TYPE, PAGE_SIZE
 
 
 router = APIRouter(prefix="/teams", tags=["Teams"])
@@ -11,39 +15,56 @@ router = APIRouter(prefix="/teams", tags=["Teams"])
 
 # Currently does not depend on AUTH through Depends(get_current_player)
 # because this is meant to be an ADMIN endpoint
-@router.get("", status_code=status.HTTP_200_OK, response_model=ResponseModel)
-async def get_all_teams():
+# Pages are read after the cursor of the previous page (next_cursor), stream=true sends
+# every team after the cursor as NDJSON instead
+@router.get("", status_code=status.HTTP_200_OK, response_model=PageResponseModel,
+            response_class=FastJSONResponse)
+async def get_all_teams(after: str = None,
+                        limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        stream: bool = False):
     LOG.info("Request for get_all_teams.")
-    teams: list[Team] = TeamService.get_all_teams()
-    LOG.info("List of teams sent as response. Model: Team.")
-    return ResponseModel(data=teams)
+    if stream:
+        LOG.info("Teams streamed as response. Model: Team.")
+        return StreamingResponse(TeamService.stream_teams(after), media_type=NDJSON_MEDIA_TYPE)
+    teams, next_cursor = await TeamService.get_all_teams(after, limit)
+    LOG.info("Page of teams sent as response. Model: Team.")
+    return model_response(encode_documents(teams, Team), next_cursor=next_cursor)
 
 
-@router.get("/player", status_code=status.HTTP_200_OK, response_model=ResponseModel)
+@router.get("/player", status_code=status.HTTP_200_OK, response_model=ResponseModel,
+            response_class=FastJSONResponse)
 async def get_teams_by_player(player_id: str = Depends(get_current_player)):
     LOG.info("Request for get_teams_by_player.")
-    LOG.debug(f"User: {player_id}.")
-    teams: list[Team] = TeamService.get_teams_by_player(player_id)
+    LOG.debug("User: %s.", player_id)
+    teams: list[dict] = await TeamService.get_player_teams_documents(player_id)
     LOG.info("List of teams sent as response. Model: Team.")
-    return ResponseModel(data=teams)
+    return model_response(encode_documents(teams, Team))
 
 
-@router.get("/{team_id}", status_code=status.HTTP_200_OK, response_model=ResponseModel)
-async def get_team_by_id(team_id: str, player_id: str = Depends(get_current_player)):
+@router.get("/{team_id}", status_code=status.HTTP_200_OK, response_model=ResponseModel,
+            response_class=FastJSONResponse)
+async def get_team_by_id(team_id: str, player_id: str = Depends(get_current_player),
+                         if_none_match: str = Header(None)):
     LOG.info("Request for get_team_by_id.")
-    LOG.debug(f"User: {player_id}. Team: {team_id}.")
-    team: Team = TeamService.get_team_by_id(team_id)
+    LOG.debug("User: %s. Team: %s.", player_id, team_id)
+    if if_none_match is not None:
+        etag: str = entity_tag(team_id, await TeamService.get_team_version(team_id))
+        if etag_matches(if_none_match, etag):
+            LOG.info("Team not modified, response sent.")
+            return not_modified(etag)
+    team: dict = await TeamService.get_team_document(team_id)
     LOG.info("Team info sent as response. Model: Team.")
-    return ResponseModel(data=team)
+    return model_response(encode_document(team, Team),
+                          headers=etag_headers(entity_tag(team_id, team.get("version", 0))))
 
 
 @router.post("/new_team", status_code=status.HTTP_201_CREATED, response_model=ResponseModel)
 async def create_team(new_team: Team, player_id: str = Depends(get_current_player)):
     LOG.info("Request for create_team.")
-    LOG.debug(f"User: {player_id}.")
-    team: Team = TeamService.create_team(new_team, player_id)
+    LOG.debug("User: %s.", player_id)
+    team: Team = await TeamService.create_team(new_team, player_id)
     LOG.info("New team created, response sent.")
-    LOG.debug(f"New team: {new_team.team_id}.") 
+    LOG.debug("New team: %s.", new_team.team_id) 
     return ResponseModel(
         detail=f"Team {new_team.team_name} successfully registered.",
         data=team)
@@ -52,8 +73,8 @@ async def create_team(new_team: Team, player_id: str = Depends(get_current_playe
 @router.put("", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def update_team_name(updated_team: UpdatedTeam, player_id: str = Depends(get_current_player)):
     LOG.info("Request for updateteam_name.")
-    LOG.debug(f"User: {player_id}. Team: {updated_team.team_id}")
-    TeamService.update_team_name(updated_team)
+    LOG.debug("User: %s. Team: %s", player_id, updated_team.team_id)
+    await TeamService.update_team_name(updated_team)
     LOG.info("Team updated, response sent.")
     return ResponseModel(detail=f"Team changed it's name to {updated_team.new_team_name}.")
 
@@ -61,7 +82,7 @@ async def update_team_name(updated_team: UpdatedTeam, player_id: str = Depends(g
 @router.delete("/{team_id}", status_code=status.HTTP_200_OK, response_model=ResponseModel)
 async def delete_team(team_id: str, player_id: str = Depends(get_current_player)):
     LOG.info("Request for delete_team.")
-    LOG.debug(f"User: {player_id}. Team: {team_id}")
-    TeamService.delete_team(team_id, player_id)
+    LOG.debug("User: %s. Team: %s", player_id, team_id)
+    await TeamService.delete_team(team_id, player_id)
     LOG.info("Team deleted, response sent.")
     return ResponseModel(detail="Team successfully deleted.")
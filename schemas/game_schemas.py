@@ -1,5 +1,4 @@
-from bson import ObjectId
-from models.game_models import Game
+from models.game_models import Game, LoggedGameAction
 
 
 def full_game(game: dict) -> Game:
@@ -57,11 +56,17 @@ def full_games(games: list[dict]) -> list[Game]:
     return [full_game(game) for game in games]
 
 
-def game_from_player(player: dict, game_id: str) -> Game | None:
-    if player is None:
-        return None
-    for team in player["teams"]:
-        for game in team["games"]:
-            if game["game_id"] == ObjectId(game_id):
-                return full_game(game)
-    return None
+def full_game_action(game_action: dict) -> LoggedGameAction:
+    return LoggedGameAction(**({
+        "team_id": str(game_action["team_id"]),
+        "game_id": str(game_action["game_id"]),
+        "player_id": str(game_action["player_id"]),
+        "action": game_action["action"],
+        "action_result": game_action["action_result"],
+        "seq": game_action["seq"],
+        "timestamp": game_action["timestamp"]
+    }))
+
+
+def full_game_actions(game_actions: list[dict]) -> list[LoggedGameAction]:
+    return [full_game_action(game_action) for game_action in game_actions]
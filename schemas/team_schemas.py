@@ -1,4 +1,3 @@
-from bson import ObjectId
 from models.team_models import Team
 from schemas.game_schemas import full_games
 
@@ -52,25 +51,3 @@ def full_team(team: dict) -> Team:
 
 def full_teams(teams: list[dict]) -> list[Team]:
     return [full_team(team) for team in teams]
-
-
-def all_teams(players: list[dict]) -> list[Team]:
-    teams = []
-    for player in players:
-        teams += full_teams(player["teams"])
-    return teams
-
-
-def teams_from_player(player: dict) -> list[Team]:
-    if player is None:
-        return None
-    return full_teams(player["teams"]) if len(player["teams"]) > 0 else []
-
-
-def team_from_player(player: dict, team_id: str) -> Team | None:
-    if player is None:
-        return None
-    for team in player["teams"]:
-        if team["team_id"] == ObjectId(team_id):
-            return full_team(team)
-    return None
@@ -0,0 +1,32 @@
+from decouple import config
+from utils.cache import TTLCache
+
+
+# Games known to be active, by game id, with the team and player that own them. Saves the
+# team and game checks run before finishing or rebuilding a game. Entries are added when a
+# game is created or an action is registered and removed when the game is finished or its
+# team or player is deleted; TTL bounds how long a game finished by another API process
+# is taken as active.
+ACTIVE_GAMES = TTLCache(max_size=config("ACTIVE_GAMES_CACHE_SIZE", default=10000, cast=int),
+                        ttl=config("ACTIVE_GAMES_CACHE_TTL", default=3600, cast=float))
+
+
+def cache_active_game(game_id: str, team_id: str, player_id: str) -> None:
+    ACTIVE_GAMES.set(str(game_id), {"team_id": str(team_id), "player_id": str(player_id)})
+
+
+def is_active_game(game_id: str, team_id: str) -> bool:
+    active_game: dict | None = ACTIVE_GAMES.get(game_id)
+    return active_game is not None and active_game["team_id"] == team_id
+
+
+def forget_game(game_id: str) -> None:
+    ACTIVE_GAMES.pop(game_id)
+
+
+def forget_team_games(team_id: str) -> None:
+    ACTIVE_GAMES.discard_where(lambda active_game: active_game["team_id"] == team_id)
+
+
+def forget_player_games(player_id: str) -> None:
+    ACTIVE_GAMES.discard_where(lambda active_game: active_game["player_id"] == player_id)
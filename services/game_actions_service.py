@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timezone
+from bson import ObjectId
+from models.game_models import GameAction, LoggedGameAction
+from schemas.game_schemas import full_game_actions
+from repositories.repository import get_repository
+from config.logger.logger import get_logger
+from utils import exceptions as ex
+from utils.db_monitoring import db_call
+from utils.concurrency import gather_in_order
+from utils.stats_engine import STORED_COUNTER_FIELDS, statistics_from_counts
+from utils.stats_pipeline import counter_name
+
+
+LOG = get_logger("games")
+
+
+# Game actions are stored in game_actions collection as an append-only log, counters in
+# games, teams and players are rollups of this log and can be rebuilt from it.
+
+
+async def log_game_actions(game_actions: list[GameAction], player_id: str,
+                           last_seq: int) -> None:
+    # last_seq is game's total_actions after registering the actions, as every action
+    # increments exactly one counter the batch takes the last len(game_actions) positions
+    timestamp: datetime = datetime.utcnow()
+    first_seq: int = last_seq - len(game_actions) + 1
+    documents: list[dict] = [{
+        "game_id": ObjectId(game_action.game_id),
+        "team_id": ObjectId(game_action.team_id),
+        "player_id": ObjectId(player_id),
+        "action": game_action.action,
+        "action_result": game_action.action_result,
+        "seq": first_seq + index,
+        "timestamp": timestamp
+    } for index, game_action in enumerate(game_actions)]
+    await asyncio.gather(
+        insert_game_actions(documents, first_seq, last_seq),
+        roll_up_game_actions(game_actions, player_id, timestamp))
+
+
+async def insert_game_actions(documents: list[dict], first_seq: int, last_seq: int) -> None:
+    try:
+        with db_call("gameActionsService/log_game_actions/insert_many"):
+            await get_repository().insert_game_actions(documents)
+    except Exception as exception:
+        # Counters were already updated, the request must not fail (a retry would count
+        # the actions twice), missing entries are reported to be fixed from the logs
+        LOG.warning("Unable to log game actions. Game: %s, seq: %s-%s. Error: -> %s",
+                    documents[0]["game_id"], first_seq, last_seq, exception)
+
+
+# Daily counters of the player (player_daily_stats), read by time series of statistics
+async def roll_up_game_actions(game_actions: list[GameAction], player_id: str,
+                               timestamp: datetime) -> None:
+    deltas: dict[str, int] = {}
+    for game_action in game_actions:
+        counter: str = counter_name(game_action.action, game_action.action_result)
+        deltas[counter] = deltas.get(counter, 0) + 1
+    day: datetime = utc_day(timestamp)
+    try:
+        with db_call("gameActionsService/roll_up_game_actions/update_one"):
+            await get_repository().increment_daily_counters(player_id, day, deltas)
+    except Exception as exception:
+        # Same as log entries, missing counters can be rebuilt from the log
+        LOG.warning("Unable to update daily counters. Player: %s, day: %s. Error: -> %s",
+                    player_id, day.date(), exception)
+
+
+# Start of the UTC day of timestamp, naive timestamps are taken as UTC like the ones of the
+# log. Same buckets as config/db/rollup_daily_stats.py, whatever the timezone of the host.
+def utc_day(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+async def get_game_actions(game_id: str, player_id: str) -> list[LoggedGameAction]:
+    if not ObjectId.is_valid(game_id):
+        ex.invalid_value("game id")
+    await check_game_owner(player_id, game_id)
+    try:
+        with db_call("gameActionsService/get_game_actions/find") as call_site:
+            game_actions: list[LoggedGameAction] = full_game_actions(
+                await get_repository().find_game_actions(game_id))
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    return game_actions
+
+
+# Games of other players are not found, their log can not be read nor their counters rebuilt
+async def check_game_owner(player_id: str, game_id: str, team_id: str | None = None) -> None:
+    try:
+        with db_call("gameActionsService/check_game_owner/count_documents") as call_site:
+            owned: int = await get_repository().count_player_games(player_id, game_id, team_id)
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    if owned != 1:
+        ex.game_not_found()
+
+
+# Recomputes counters and statistics of game from the log. Team and player (its owner, see
+# check_game_owner) only get the difference between old and rebuilt game counters: the log
+# does not have actions scored before it existed, so their careers can not be rebuilt from it.
+async def rebuild_statistics(team_id: str, game_id: str, player_id: str) -> None:
+    try:
+        with db_call("gameActionsService/rebuild_statistics/aggregate") as call_site:
+            game_counts: dict[str, int] = await get_repository().count_game_actions(
+                "game_id", game_id)
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    try:
+        with db_call("gameActionsService/rebuild_statistics/find_one") as call_site:
+            game, team, player = await gather_in_order(
+                get_repository().find_game(game_id),
+                get_repository().find_team(team_id),
+                get_repository().find_player(
+                    player_id, {field: 1 for field in STORED_COUNTER_FIELDS}))
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    if game is None or team is None or player is None:
+        ex.game_not_found()
+    deltas: dict[str, int] = {field: game_counts.get(field, 0) - game.get(field, 0)
+                              for field in STORED_COUNTER_FIELDS}
+    team_counts: dict[str, int] = {field: team.get(field, 0) + deltas[field]
+                                   for field in STORED_COUNTER_FIELDS}
+    player_counts: dict[str, int] = {field: player.get(field, 0) + deltas[field]
+                                     for field in STORED_COUNTER_FIELDS}
+    try:
+        with db_call("gameActionsService/rebuild_statistics/update_one") as call_site:
+            await gather_in_order(
+                get_repository().update_game(team_id, game_id, statistics_from_counts(game_counts)),
+                get_repository().update_team(team_id, statistics_from_counts(team_counts)),
+                get_repository().update_player(player_id, statistics_from_counts(player_counts)))
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    LOG.debug("Statistics rebuilt from game actions log. Game: %s.", game_id)
@@ -1,170 +1,223 @@
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models.game_models import EndGame, Game, GameAction
 from models.team_models import Team
-from schemas.game_schemas import game_from_player
-from schemas.team_schemas import teams_from_player
+from schemas.game_schemas import full_game
+from schemas.team_schemas import full_teams
 import services.teams_service as TeamService
-from config.db.client import get_db_client
-from config.logger.logger import LOG
-from utils.constants import GAME_ACTIONS
+import services.active_games_service as ActiveGameService
+import services.game_actions_service as GameActionService
+import services.write_behind_service as WriteBehindService
+from repositories.repository import get_repository
+from config.logger.logger import get_logger
+from utils.concurrency import gather_in_order
+from utils.constants import GAME_ACTIONS, NEW_ID_ATTEMPTS
+from utils.stats_pipeline import counter_name
 from utils import exceptions as ex
+from utils.db_monitoring import db_call
+from utils.live_feed import LIVE_FEED, action_event, finished_event
+from utils.stats_engine import apply_statistics
 
 
-def get_game_by_id(game_id: str) -> Game:
+LOG = get_logger("games")
+
+
+async def get_game_by_id(game_id: str) -> Game:
+    return full_game(await get_game_document(game_id))
+
+
+async def get_game_document(game_id: str) -> dict:
     if not ObjectId.is_valid(game_id):
         ex.invalid_value("game id")
+    # Games with buffered actions (WRITE_BEHIND) are read from memory
+    buffered_game: dict | None = WriteBehindService.buffered_game(game_id)
+    if buffered_game is not None:
+        return buffered_game
     try:
-        game: Game = game_from_player(get_db_client().players.find_one(
-            {"teams.games.game_id": ObjectId(game_id)},
-            {"teams.games": 1}),
-            game_id)
+        with db_call("gamesService/get_game_by_id/find_one") as call_site:
+            game_document: dict = await get_repository().find_game(game_id)
     except Exception as exception:
-        ex.no_data_connection("gamesService/get_game_by_id/find_one", exception)
-    if game is None:
+        ex.no_data_connection(call_site, exception)
+    if game_document is None:
         ex.game_not_found()
-    return game
+    return game_document
+
+
+async def get_game_version(game_id: str) -> int | str:
+    if not ObjectId.is_valid(game_id):
+        ex.invalid_value("game id")
+    buffered_version: int | str | None = WriteBehindService.buffered_version(game_id)
+    if buffered_version is not None:
+        return buffered_version
+    try:
+        with db_call("gamesService/get_game_version/find_one") as call_site:
+            version: int | None = await get_repository().find_game_version(game_id)
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
+    if version is None:
+        ex.game_not_found()
+    return version
 
 
-def create_game(team_id: str, new_game: Game, player_id: str) -> bool:
+async def create_game(team_id: str, new_game: Game, player_id: str) -> bool:
     try:
-        teams: list[Team] = teams_from_player(get_db_client().players.find_one(
-            {"teams.team_id": ObjectId(team_id)}, 
-            {"teams": 1}))
+        with db_call("teamsService/create_game/find_one") as call_site:
+            teams_documents: list[dict] = await get_repository().find_owner_teams(team_id)
     except Exception as exception:
-        ex.no_data_connection("teamsService/create_game/find_one", exception)
-    if teams is None:
+        ex.no_data_connection(call_site, exception)
+    if teams_documents is None:
         ex.team_not_found()
-    TeamService.check_for_existing_team(team_id)
+    teams: list[Team] = full_teams(teams_documents)
+    await TeamService.check_for_existing_team(team_id)
     # Can´t begin a new match if there are others that have not finished yet
     check_for_active_games(teams)
-    new_game.game_id = ObjectId()
-    while not validate_game_id(new_game.game_id):
-        LOG.debug("Repeated game_id in DB, trying again with new value.")
+    modified_count: int = 0
+    # game_id uniqueness is enforced by DB, a new id is tried on the (unlikely) collision
+    for _ in range(NEW_ID_ATTEMPTS):
         new_game.game_id = ObjectId()
-    game_dict: dict = dict(new_game)
-    try:
-        result = get_db_client().players.update_one(
-            {"teams": {"$elemMatch": {"team_id": ObjectId(team_id)}}},
-            {"$push": {"teams.$.games": game_dict}})
-    except Exception as exception:
-        ex.no_data_connection("teamsService/create_game/update_one", exception)
-    if result.modified_count != 1:
+        try:
+            with db_call("teamsService/create_game/update_one") as call_site:
+                modified_count = await get_repository().push_game(team_id, dict(new_game))
+            break
+        except DuplicateKeyError:
+            LOG.debug("Repeated game_id in DB, trying again with new value.")
+        except Exception as exception:
+            ex.no_data_connection(call_site, exception)
+    if modified_count != 1:
         ex.unable_to_create_game()
-    TeamService.sum_team_games(team_id, player_id)
-    return get_game_by_id(new_game.game_id)
+    ActiveGameService.cache_active_game(new_game.game_id, team_id, player_id)
+    await TeamService.sum_team_games(team_id, player_id)
+    return await get_game_by_id(new_game.game_id)
 
 
-def finish_game(game_to_finish: EndGame) -> bool:
-    TeamService.check_for_existing_team(game_to_finish.team_id)
-    check_for_existing_game(game_to_finish.game_id)
+async def finish_game(game_to_finish: EndGame) -> bool:
+    await check_for_existing_team_and_game(game_to_finish.team_id, game_to_finish.game_id)
+    await WriteBehindService.close_game(game_to_finish.game_id)
     try:
-        result = get_db_client().players.update_one(
-            {"teams.games.game_id": ObjectId(game_to_finish.game_id)},
-            {"$set": {"teams.$[t].games.$[g].status": 0}},
-            array_filters=[
-                {"t.team_id": ObjectId(game_to_finish.team_id)},
-                {"g.game_id": ObjectId(game_to_finish.game_id)}])
+        with db_call("teamsService/finish_game/update_one") as call_site:
+            modified_count: int = await get_repository().finish_game(
+                game_to_finish.team_id, game_to_finish.game_id)
     except Exception as exception:
-        ex.no_data_connection("teamsService/finish_game/update_one", exception)
-    if result.modified_count != 1:
+        ex.no_data_connection(call_site, exception)
+    finally:
+        WriteBehindService.forget_game(game_to_finish.game_id)
+    ActiveGameService.forget_game(game_to_finish.game_id)
+    if modified_count != 1:
+        # Cached games may have been finished by another worker or lost their team
+        await gather_in_order(
+            TeamService.check_for_existing_team(game_to_finish.team_id),
+            check_for_existing_game(game_to_finish.game_id))
         ex.game_already_finished()
+    LIVE_FEED.publish(game_to_finish.game_id, finished_event(game_to_finish.game_id),
+                      final=True)
     return True
 
 
-def play_game(game_action: GameAction, player_id: str) -> Game:
-    TeamService.check_for_existing_team(game_action.team_id)
-    check_for_existing_game(game_action.game_id)
-    check_if_game_is_active(game_action.game_id)
+async def play_game(game_action: GameAction, player_id: str) -> Game:
     if not valid_action_and_action_result(game_action.action, game_action.action_result):
         ex.invalid_action_and_action_result()
-    try:
-        # REGISTER ACTION: Updates action in DB
-        # Is different form update_statistics method if something goes wrong then
-        # statistics will be updated next time this method is called
-        game: Game = game_from_player(get_db_client().players.find_one_and_update(
-            {"teams.games.game_id": ObjectId(game_action.game_id)},
-            {"$inc": {
-                f"teams.$[t].games.$[g].{game_action.action}_{game_action.action_result}s": 1}},
-            array_filters=[
-                {"t.team_id": ObjectId(game_action.team_id)},
-                {"g.game_id": ObjectId(game_action.game_id)}],
-            projection={"teams.games": 1},
-            return_document=ReturnDocument.AFTER),
-            game_action.game_id)
-    except Exception as exception:
-        ex.no_data_connection("teamsService/play_game/find_one_and_update/register_action",
-                              exception)
+    # REGISTER ACTION: Increments counters of game, team and player and recomputes their
+    # statistics in a single atomic update, only matches if game is still active
+    return await register_game_actions(
+        [game_action], player_id, "teamsService/play_game/find_one_and_update/register_action")
+
+
+async def play_game_actions(game_id: str, game_actions: list[GameAction], player_id: str) -> Game:
+    if not ObjectId.is_valid(game_id):
+        ex.invalid_value("game id")
+    if len(game_actions) == 0:
+        ex.invalid_value("game actions")
+    team_id: str = game_actions[0].team_id
+    for game_action in game_actions:
+        if game_action.game_id != game_id:
+            ex.invalid_value("game id")
+        if game_action.team_id != team_id:
+            ex.invalid_value("team id")
+        if not valid_action_and_action_result(game_action.action, game_action.action_result):
+            ex.invalid_action_and_action_result()
+    # REGISTER ACTIONS: Whole batch is applied as one update with the same pipeline
+    # used for a single action, statistics are recomputed once
+    return await register_game_actions(
+        game_actions, player_id, "gamesService/play_game_actions/find_one_and_update")
+
+
+# Actions must all be for the same game and team
+async def register_game_actions(game_actions: list[GameAction], player_id: str,
+                                call_site_label: str) -> Game:
+    team_id, game_id = game_actions[0].team_id, game_actions[0].game_id
+    deltas: dict[str, int] = fold_game_actions(game_actions)
+    # With WRITE_BEHIND, actions of games already checked are only buffered
+    game: Game | None = await WriteBehindService.buffer_actions(game_actions, player_id)
     if game is None:
-        ex.unable_to_update_game()
-    updated_game = update_game_statistics(game)
-    updated_game_dict: dict = dict(updated_game)
+        try:
+            with db_call(call_site_label) as call_site:
+                game_document: dict | None = await get_repository().register_actions(
+                    player_id, team_id, game_id, deltas)
+        except Exception as exception:
+            ex.no_data_connection(call_site, exception)
+        if game_document is None:
+            # Nothing was updated, checks are only run to send the proper error response
+            ActiveGameService.forget_game(game_id)
+            await gather_in_order(
+                TeamService.check_for_existing_team(team_id),
+                check_for_existing_game(game_id),
+                check_if_game_is_active(game_id))
+            ex.unable_to_update_game()
+        game = full_game(game_document)
+        await GameActionService.log_game_actions(game_actions, player_id, game.total_actions)
+        ActiveGameService.cache_active_game(game_id, team_id, player_id)
+        WriteBehindService.track_game(game_document, team_id, player_id)
+    LIVE_FEED.publish(game_id, action_event(game_id, deltas, game.total_actions))
+    return game
+
+
+async def rebuild_game_statistics(game_to_rebuild: EndGame, player_id: str) -> Game:
+    await check_for_existing_team_and_game(game_to_rebuild.team_id, game_to_rebuild.game_id)
+    await GameActionService.check_game_owner(
+        player_id, game_to_rebuild.game_id, game_to_rebuild.team_id)
+    # Log must have every action, and buffered counters are replaced by the rebuilt ones
+    await WriteBehindService.close_game(game_to_rebuild.game_id)
     try:
-        # UPDATED STATISTICS: Updates whole game with updated statistics
-        game_to_return: Game = game_from_player(get_db_client().players.find_one_and_update(
-            {"teams.games.game_id": ObjectId(game_action.game_id)},
-            {"$set": {
-                "teams.$[t].games.$[g]": updated_game_dict}},
-            array_filters=[
-                {"t.team_id": ObjectId(game_action.team_id)},
-                {"g.game_id": ObjectId(game_action.game_id)}],
-            projection={"teams.games": 1},
-            return_document=ReturnDocument.AFTER),
-            game_action.game_id)
-    except Exception as exception:
-        ex.no_data_connection("teamsService/play_game/find_one_and_update/updated_statistics",
-                              exception)
-    if game_to_return is None:
-        ex.unable_to_update_game()
-    TeamService.register_game_action(game_action, player_id)
-    return game_to_return
+        await GameActionService.rebuild_statistics(
+            game_to_rebuild.team_id, game_to_rebuild.game_id, player_id)
+    finally:
+        WriteBehindService.forget_game(game_to_rebuild.game_id)
+    return await get_game_by_id(game_to_rebuild.game_id)
+
+
+# Counts how many times each counter must be incremented for a list of actions
+def fold_game_actions(game_actions: list[GameAction]) -> dict[str, int]:
+    deltas: dict[str, int] = {}
+    for game_action in game_actions:
+        counter: str = counter_name(game_action.action, game_action.action_result)
+        deltas[counter] = deltas.get(counter, 0) + 1
+    return deltas
 
 
 def update_game_statistics(game: Game) -> Game:
     game.game_id = ObjectId(game.game_id)
-    game.total_attacks = game.attack_points + game.attack_neutrals + game.attack_errors
-    game.attack_effectiveness = round(game.attack_points / game.total_attacks, 2) \
-        if game.total_attacks > 0 else 0.00
-    game.total_blocks = game.block_points + game.block_neutrals + game.block_errors
-    game.block_effectiveness = round(game.block_points / game.total_blocks, 2) \
-        if game.total_blocks > 0 else 0.00
-    game.total_services = game.service_points + game.service_neutrals \
-        + game.service_errors
-    game.service_effectiveness = round(game.service_points / game.total_services, 2) \
-        if game.total_services > 0 else 0.00
-    game.total_defenses = game.defense_perfects + game.defense_neutrals + game.defense_errors
-    game.defense_effectiveness = round(game.defense_perfects / game.total_defenses, 2) \
-        if game.total_defenses > 0 else 0.00
-    game.total_receptions = game.reception_perfects + game.reception_neutrals \
-        + game.reception_errors
-    game.reception_effectiveness = round(game.reception_perfects / game.total_receptions, 2) \
-        if game.total_receptions > 0 else 0.00
-    game.total_sets = game.set_perfects + game.set_neutrals + game.set_errors
-    game.set_effectiveness = round(game.set_perfects / game.total_sets, 2) \
-        if game.total_sets > 0 else 0.00
-    game.total_points = game.attack_points + game.block_points + game.service_points
-    game.total_perfects = game.defense_perfects + game.reception_perfects + game.set_perfects
-    game.total_neutrals = game.attack_neutrals + game.block_neutrals + game.service_neutrals \
-        + game.defense_neutrals + game.reception_neutrals + game.set_neutrals
-    game.total_errors = game.attack_errors + game.block_errors + game.service_errors \
-        + game.defense_errors + game.reception_errors + game.set_errors
-    game.total_actions = game.total_points + game.total_perfects + game.total_neutrals \
-        + game.total_errors
-    game.total_effectiveness = round(
-        (game.total_points + game.total_perfects) / game.total_actions, 2) \
-        if game.total_actions > 0 else 0.00
-    return game
+    return apply_statistics(game)
 
 
-def check_for_existing_game(game_id: str) -> None:
+async def check_for_existing_game(game_id: str) -> None:
     try:
-        game: int = get_db_client().players.count_documents(
-            {"teams.games.game_id": ObjectId(game_id)})
+        with db_call("teamsService/check_for_existing_game/count_documents") as call_site:
+            game: int = await get_repository().count_games(game_id)
     except Exception as exception:
-        ex.no_data_connection("teamsService/check_for_existing_game/count_documents", exception)
+        ex.no_data_connection(call_site, exception)
     if game != 1:
         ex.game_not_found()
-    LOG.debug(f"Game found: {game_id}.")
+    LOG.debug("Game found: %s.", game_id)
+
+
+# Active games of team found in ACTIVE_GAMES cache are not checked in DB
+async def check_for_existing_team_and_game(team_id: str, game_id: str) -> None:
+    if ActiveGameService.is_active_game(game_id, team_id):
+        LOG.debug("Game found in active games cache: %s.", game_id)
+        return
+    await gather_in_order(
+        TeamService.check_for_existing_team(team_id),
+        check_for_existing_game(game_id))
 
 
 def check_for_active_games(teams: list[Team]) -> None:
@@ -175,13 +228,13 @@ def check_for_active_games(teams: list[Team]) -> None:
     LOG.debug("No active games found.")
 
 
-def check_if_game_is_active(game_id: str) -> None:
+async def check_if_game_is_active(game_id: str) -> None:
     try:
-        game: Game = game_from_player(get_db_client().players.find_one(
-            {"teams.games.game_id": ObjectId(game_id)}, {"teams.games": 1}), game_id)
+        with db_call("teamsService/check_if_game_is_active/find_one") as call_site:
+            game: Game = full_game(await get_repository().find_game(game_id))
     except Exception as exception:
-        ex.no_data_connection("teamsService/check_if_game_is_active/find_one", exception)
-    if game.game_id == game_id and game.status == 0:
+        ex.no_data_connection(call_site, exception)
+    if game is not None and game.status == 0:
         ex.game_already_finished()
     LOG.debug("Game is still active.")
 
@@ -197,21 +250,3 @@ def valid_action_and_action_result(action: str, action_result: str) -> bool:
     return True
 
 
-def validate_game_id(object_id: ObjectId) -> bool:
-    # Checks if object_id exists as a team_id in DB
-    try:
-        teams_count: int = get_db_client().players.count_documents(
-            {"teams.team_id": object_id})
-    except Exception as exception:
-        ex.no_data_connection("gamesService/validate_game_id/count_documents/teams", exception)
-    if teams_count > 0:
-        return False
-    # Checks if object_id exists as a game_id in DB
-    try:
-        games_count: int = get_db_client().players.count_documents(
-            {"teams.games.game_id": object_id})
-    except Exception as exception:
-        ex.no_data_connection("gamesServices/validate_game_id/count_documents/games", exception)
-    if games_count > 0:
-        return False
-    return True
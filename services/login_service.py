@@ -1,39 +1,72 @@
-from bson import ObjectId
+import hashlib
+from decouple import config
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from models.player_models import LoginPlayer
 from utils import exceptions as ex
-from config.db.client import get_db_client
+from utils.db_monitoring import db_call
+from repositories.repository import get_repository
 from schemas.player_schemas import login_player
+from utils.cache import TTLCache
+from config.password.password_context import verify_password
+from config.logger.logger import LOG
 
 
 oauth2 = OAuth2PasswordBearer(tokenUrl="login")
 
-password_context = CryptContext(schemes=["bcrypt"])
+# Verified tokens, saves checking player existence in DB on every authenticated request
+PRINCIPAL_CACHE = TTLCache(max_size=config("PRINCIPAL_CACHE_SIZE", default=10000, cast=int))
 
 
-def check_username_and_password(username: str, password: str) -> str:
+async def check_username_and_password(username: str, password: str) -> str:
     try:
-        player: LoginPlayer = login_player(
-            get_db_client().players.find_one({"email": username}, {"email": 1, "password": 1}))
+        with db_call("loginService/checkUsernameAndPassword/find_one") as call_site:
+            player: LoginPlayer = login_player(await get_repository().find_player_by_email(
+                username, {"email": 1, "password": 1}))
     except Exception as exception:
-        ex.no_data_connection("loginService/checkUsernameAndPassword/find_one", exception)
+        ex.no_data_connection(call_site, exception)
     if player is None:
         ex.wrong_credentials()
-    if not verify_password(password, player.password):
+    valid, new_hash = await verify_password(password, player.password)
+    if not valid:
         ex.wrong_credentials()
+    if new_hash is not None:
+        await update_password_hash(player.player_id, new_hash)
     return player.player_id
 
 
-def check_if_player_exists(player_id: str) -> bool:
+# Login goes on if the new hash can not be stored, it is tried again on next login
+async def update_password_hash(player_id: str, new_hash: str) -> None:
     try:
-        result: int = get_db_client().players.count_documents({"_id": ObjectId(player_id)})
+        with db_call("loginService/update_password_hash/update_one"):
+            await get_repository().update_player(player_id, {"password": new_hash})
     except Exception as exception:
-        ex.no_data_connection("loginService/checkIfPlayerExists/find_one", exception)
+        LOG.warning("Unable to update password hash. Player: %s. Error: -> %s",
+                    player_id, exception)
+
+
+async def check_if_player_exists(player_id: str) -> bool:
+    try:
+        with db_call("loginService/checkIfPlayerExists/find_one") as call_site:
+            result: int = await get_repository().count_players(player_id)
+    except Exception as exception:
+        ex.no_data_connection(call_site, exception)
     if result != 1:
         return False
     return True
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return password_context.verify(plain_password, hashed_password)
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_principal(token: str) -> str | None:
+    return PRINCIPAL_CACHE.get(token_digest(token))
+
+
+# Player id is kept until token expiration (exp claim)
+def cache_principal(token: str, player_id: str, expires_at: float) -> None:
+    PRINCIPAL_CACHE.set(token_digest(token), player_id, expires_at)
+
+
+def invalidate_principal(player_id: str) -> None:
+    PRINCIPAL_CACHE.discard_where(lambda cached_player_id: cached_player_id == player_id)
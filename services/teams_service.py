@@ -1,118 +1,154 @@
+from typing import AsyncIterator
 from bson import ObjectId
-from pymongo import ReturnDocument
-from models.game_models import GameAction
+from pymongo.errors import DuplicateKeyError
 from models.team_models import Team, UpdatedTeam
-from schemas.team_schemas import all_teams, team_from_player, teams_from_player
-from config.db.client import get_db_client
+from schemas.team_schemas import full_team, full_teams
+from repositories.repository import get_repository
 from config.logger.logger import LOG
 import services.players_service as PlayerService
+import services.active_games_service as ActiveGameService
 from utils import exceptions as ex
+from utils.db_monitoring import db_call
+from utils.stats_engine import apply_statistics
+from utils.pagination import PAGE_SIZE, ndjson_lines, take_page
+from utils.constants import NEW_ID_ATTEMPTS
 
 
-def get_all_teams() -> list[Team]:
+async def get_all_teams(after: str | None, limit: int) -> tuple[list[dict], str | None]:
+    teams_documents = iterate_teams(after, limit + 1)
     try:
-        teams: list[Team] = all_teams(get_db_client().players.find({}, {"teams": 1}))
+        with db_call("teams_service/get_all_teams/find") as call_site:
+            page, next_cursor = await take_page(teams_documents, limit)
     except Exception as exception:
-        ex.no_data_connection("teams_service/get_all_teams/find", exception)
-    return teams
+        ex.no_data_connection(call_site, exception)
+    return page, next_cursor
 
 
-def get_teams_by_player(player_id: str) -> list[Team]:
+def stream_teams(after: str | None) -> AsyncIterator[bytes]:
+    return ndjson_lines(
+        iterate_teams(after, PAGE_SIZE), Team, "teams_service/stream_teams/find")
+
+
+def iterate_teams(after: str | None, batch_size: int) -> AsyncIterator[tuple[str, dict]]:
+    try:
+        return get_repository().iterate_teams(after, batch_size)
+    except ValueError:
+        ex.invalid_value("cursor")
+
+
+async def get_teams_by_player(player_id: str) -> list[Team]:
+    return full_teams(await get_player_teams_documents(player_id))
+
+
+async def get_player_teams_documents(player_id: str) -> list[dict]:
     try:
-        teams: list[Team] = teams_from_player(get_db_client().players.find_one(
-            {"_id": ObjectId(player_id)},
-            {"teams": 1}))
+        with db_call("teams_service/get_teams_by_player/find_one") as call_site:
+            teams_documents: list[dict] = await get_repository().find_player_teams(player_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/get_teams_by_player/find_one", exception)
-    if teams is None:
+        ex.no_data_connection(call_site, exception)
+    if teams_documents is None:
         ex.player_not_found()
-    return teams
+    return teams_documents
+
 
+async def get_team_by_id(team_id: str) -> Team:
+    return full_team(await get_team_document(team_id))
 
-def get_team_by_id(team_id: str) -> Team:
+
+async def get_team_document(team_id: str) -> dict:
     if not ObjectId.is_valid(team_id):
         ex.invalid_value("team id")
     try:
-        team: Team = team_from_player(get_db_client().players.find_one(
-            {"teams.team_id": ObjectId(team_id)},
-            {"teams": 1}),
-            team_id)
+        with db_call("teams_service/get_team_by_id/find_one") as call_site:
+            team_document: dict = await get_repository().find_team(team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/get_team_by_id/find_one", exception)
-    if team is None:
+        ex.no_data_connection(call_site, exception)
+    if team_document is None:
         ex.team_not_found()
-    return team
+    return team_document
 
 
-def create_team(new_team: Team, player_id: str) -> None:
+async def get_team_version(team_id: str) -> int:
+    if not ObjectId.is_valid(team_id):
+        ex.invalid_value("team id")
     try:
-        teams: list[Team] = teams_from_player(get_db_client().players.find_one(
-            {"_id": ObjectId(player_id)},
-            {"teams": 1}))
+        with db_call("teams_service/get_team_version/find_one") as call_site:
+            version: int | None = await get_repository().find_team_version(team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/create_team/find_one", exception)
-    if teams is None:
-        ex.player_not_found()
-    check_team_existence(teams, new_team.team_name)
-    new_team.team_id = ObjectId()
-    while not validate_team_id(new_team.team_id):
-        LOG.debug("Repeated team_id in DB, trying again with new value.")
-        new_team.team_id = ObjectId()
-    new_team_dict = dict(new_team)
+        ex.no_data_connection(call_site, exception)
+    if version is None:
+        ex.team_not_found()
+    return version
+
+
+async def create_team(new_team: Team, player_id: str) -> None:
     try:
-        result = get_db_client().players.update_one(
-            {"_id": ObjectId(player_id)},
-            {"$push": {"teams": new_team_dict}})
+        with db_call("teams_service/create_team/find_one") as call_site:
+            teams_documents: list[dict] = await get_repository().find_player_teams(player_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/create_team/update_one", exception)
-    if result.modified_count != 1:
+        ex.no_data_connection(call_site, exception)
+    if teams_documents is None:
+        ex.player_not_found()
+    check_team_existence(full_teams(teams_documents), new_team.team_name)
+    modified_count: int = 0
+    # team_id uniqueness is enforced by DB, a new id is tried on the (unlikely) collision
+    for _ in range(NEW_ID_ATTEMPTS):
+        new_team.team_id = ObjectId()
+        try:
+            with db_call("teams_service/create_team/update_one") as call_site:
+                modified_count = await get_repository().push_team(player_id, dict(new_team))
+            break
+        except DuplicateKeyError:
+            LOG.debug("Repeated team_id in DB, trying again with new value.")
+        except Exception as exception:
+            ex.no_data_connection(call_site, exception)
+    if modified_count != 1:
         ex.unable_to_create_team()
-    player_teams: list[Team] = get_teams_by_player(player_id)
-    PlayerService.sum_player_teams(player_teams, player_id)
-    return get_team_by_id(new_team.team_id)
+    player_teams: list[Team] = await get_teams_by_player(player_id)
+    await PlayerService.sum_player_teams(player_teams, player_id)
+    return await get_team_by_id(new_team.team_id)
 
 
-def update_team_name(updated_team: UpdatedTeam) -> None:
+async def update_team_name(updated_team: UpdatedTeam) -> None:
     try:
-        teams: list[Team] = teams_from_player(get_db_client().players.find_one(
-            {"teams.team_id": ObjectId(updated_team.team_id)},
-            {"teams": 1}))
+        with db_call("teams_service/update_team_name/find_one") as call_site:
+            teams_documents: list[dict] = await get_repository().find_owner_teams(
+                updated_team.team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/update_team_name/find_one", exception)
-    if teams is None:
+        ex.no_data_connection(call_site, exception)
+    if teams_documents is None:
         ex.team_not_found()
-    check_team_existence(teams, updated_team.new_team_name)
+    check_team_existence(full_teams(teams_documents), updated_team.new_team_name)
     try:
-        result = get_db_client().players.update_one(
-            {"teams": {"$elemMatch": {"team_id": ObjectId(updated_team.team_id)}}},
-            {"$set": {"teams.$.team_name": updated_team.new_team_name}})
+        with db_call("teams_service/update_team_name/update_one") as call_site:
+            modified_count: int = await get_repository().update_team(
+                updated_team.team_id, {"team_name": updated_team.new_team_name})
     except Exception as exception:
-        ex.no_data_connection("teams_service/update_team_name/update_one", exception)
-    if result.modified_count != 1:
+        ex.no_data_connection(call_site, exception)
+    if modified_count != 1:
         ex.unable_to_update_team()
 
 
-def delete_team(team_id: str, player_id: str) -> None:
+async def delete_team(team_id: str, player_id: str) -> None:
     if not ObjectId.is_valid(team_id):
         ex.invalid_value("team id")
     try:
-        teams: list[Team] = teams_from_player(get_db_client().players.find_one(
-            {"teams.team_id": ObjectId(team_id)},
-            {"teams": 1}))
+        with db_call("teams_service/delete_team/find_one") as call_site:
+            teams_documents: list[dict] = await get_repository().find_owner_teams(team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/delete_team/find_one", exception)
-    if teams is None:
+        ex.no_data_connection(call_site, exception)
+    if teams_documents is None:
         ex.team_not_found()
     try:
-        result = get_db_client().players.update_one(
-            {"_id": ObjectId(player_id)},
-            {"$pull": {"teams": {"team_id": ObjectId(team_id)}}})
+        with db_call("teams_service/delete_team/update_one") as call_site:
+            modified_count: int = await get_repository().pull_team(player_id, team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/delete_team/update_one", exception)
-    if result.modified_count != 1:
+        ex.no_data_connection(call_site, exception)
+    if modified_count != 1:
         ex.unable_to_delete_team()
-    player_teams: list[Team] = get_teams_by_player(player_id)
-    PlayerService.sum_player_teams(player_teams, player_id)
+    ActiveGameService.forget_team_games(team_id)
+    player_teams: list[Team] = await get_teams_by_player(player_id)
+    await PlayerService.sum_player_teams(player_teams, player_id)
 
 
 def check_team_existence(teams: list[Team], team_name: str) -> None:
@@ -123,134 +159,38 @@ def check_team_existence(teams: list[Team], team_name: str) -> None:
             ex.team_already_exists()
 
 
-def check_for_existing_team(team_id: str) -> None:
+async def check_for_existing_team(team_id: str) -> None:
     if not ObjectId.is_valid(team_id):
         ex.invalid_value("team id")
     try:
-        team: int = get_db_client().players.count_documents({"teams.team_id": ObjectId(team_id)})
+        with db_call("teams_service/check_for_existing_team/count_documents") as call_site:
+            team: int = await get_repository().count_teams(team_id)
     except Exception as exception:
-        ex.no_data_connection("teams_service/check_for_existing_team/count_documents", exception)
+        ex.no_data_connection(call_site, exception)
     if team != 1:
         ex.team_not_found()
-    LOG.debug(f"Team found: {team_id}.")
+    LOG.debug("Team found: %s.", team_id)
 
 
-def sum_team_games(team_id: str, player_id: str) -> None:
-    LOG.debug(f"Counting games of team: {team_id}.")
-    team: Team = get_team_by_id(team_id)
+async def sum_team_games(team_id: str, player_id: str) -> None:
+    LOG.debug("Counting games of team: %s.", team_id)
+    team: Team = await get_team_by_id(team_id)
     games: int = len(team.games)
-    LOG.debug(f"Total team games: {games}.")
+    LOG.debug("Total team games: %s.", games)
     try:
-        result = get_db_client().players.update_one(  
-            {"teams": {"$elemMatch": {"team_id": ObjectId(team_id)}}},
-            {"$set": {"teams.$.total_games": games}})
+        with db_call("teams_service/sum_team_games/update_one") as call_site:
+            modified_count: int = await get_repository().update_team(
+                team_id, {"total_games": games})
     except Exception as exception:
-        ex.no_data_connection("teams_service/sum_team_games/update_one", exception)
-    if result.modified_count != 1:
+        ex.no_data_connection(call_site, exception)
+    if modified_count != 1:
         ex.unable_to_update_game()
     LOG.debug("Team total games were updated.")
-    teams: list[Team] = get_teams_by_player(player_id)
-    PlayerService.sum_player_games(teams, player_id)
+    teams: list[Team] = await get_teams_by_player(player_id)
+    await PlayerService.sum_player_games(teams, player_id)
 
 
-def register_game_action(game_action: GameAction, player_id: str) -> None:
-    LOG.debug(f"Updating team statistics: {game_action.team_id}.")
-    try:
-        # REGISTER ACTION: Updates action in DB
-        # Is different form updateStatistics method if something goes wrong then
-        # statistics will be updated next time this method is called
-        team: Team = team_from_player(get_db_client().players.find_one_and_update(
-            {"teams": {
-                "$elemMatch": {"team_id": ObjectId(game_action.team_id)}}},
-            {"$inc": {
-                f"teams.$.{game_action.action}_{game_action.action_result}s": 1}},
-            projection={"teams": 1},
-            return_document=ReturnDocument.AFTER), game_action.team_id)
-    except Exception as exception:
-        ex.no_data_connection(
-            "teams_service/register_game_action/find_one_and_update/register_action", exception)
-    if team is None:
-        ex.unable_to_update_team()
-    team = update_team_statistics(team)
-    try:
-        # UPDATED STATISTICS: Updates whole team with updated statistics
-        result = get_db_client().players.update_one(
-            {"teams": {"$elemMatch": {"team_id": ObjectId(game_action.team_id)}}},
-            {"$set": {
-                "teams.$.total_attacks": team.total_attacks,
-                "teams.$.attack_effectiveness": team.attack_effectiveness,
-                "teams.$.total_blocks": team.total_blocks,
-                "teams.$.block_effectiveness": team.block_effectiveness,
-                "teams.$.total_services": team.total_services,
-                "teams.$.service_effectiveness": team.service_effectiveness,
-                "teams.$.total_defenses": team.total_defenses,
-                "teams.$.defense_effectiveness": team.defense_effectiveness,
-                "teams.$.total_receptions": team.total_receptions,
-                "teams.$.reception_effectiveness": team.reception_effectiveness,
-                "teams.$.total_sets": team.total_sets,
-                "teams.$.set_effectiveness": team.set_effectiveness,
-                "teams.$.total_points": team.total_points,
-                "teams.$.total_perfects": team.total_perfects,
-                "teams.$.total_neutrals": team.total_neutrals,
-                "teams.$.total_errors": team.total_errors,
-                "teams.$.total_actions": team.total_actions,
-                "teams.$.total_effectiveness": team.total_effectiveness}})
-    except Exception as exception:
-        ex.no_data_connection(
-            "teams_service/register_game_action/find_one_and_update/updated_statistics", exception)
-    if result.modified_count != 1:
-        ex.unable_to_update_team()
-    LOG.debug("Team statistics were updated.")
-    PlayerService.register_game_action(game_action, player_id)
+def update_team_statistics(team: Team) -> Team:
+    return apply_statistics(team)
 
 
-def update_team_statistics(team: Team) -> Team:
-    team.total_attacks = team.attack_points + team.attack_neutrals + team.attack_errors
-    team.attack_effectiveness = round(team.attack_points / team.total_attacks, 2) \
-        if team.total_attacks > 0 else 0.00
-    team.total_blocks = team.block_points + team.block_neutrals + team.block_errors
-    team.block_effectiveness = round(team.block_points / team.total_blocks, 2) \
-        if team.total_blocks > 0 else 0.00
-    team.total_services = team.service_points + team.service_neutrals + team.service_errors
-    team.service_effectiveness = round(team.service_points / team.total_services, 2) \
-        if team.total_services > 0 else 0.00
-    team.total_defenses = team.defense_perfects + team.defense_neutrals + team.defense_errors
-    team.defense_effectiveness = round(team.defense_perfects / team.total_defenses, 2) \
-        if team.total_defenses > 0 else 0.00
-    team.total_receptions = team.reception_perfects + team.reception_neutrals \
-        + team.reception_errors
-    team.reception_effectiveness = round(team.reception_perfects / team.total_receptions, 2) \
-        if team.total_receptions > 0 else 0.00
-    team.total_sets = team.set_perfects + team.set_neutrals + team.set_errors
-    team.set_effectiveness = round(team.set_perfects / team.total_sets, 2) \
-        if team.total_sets > 0 else 0.00
-    team.total_points = team.attack_points + team.block_points + team.service_points
-    team.total_perfects = team.defense_perfects + team.reception_perfects + team.set_perfects
-    team.total_neutrals = team.attack_neutrals + team.block_neutrals + team.service_neutrals \
-        + team.defense_neutrals + team.reception_neutrals + team.set_neutrals
-    team.total_errors = team.attack_errors + team.block_errors + team.service_errors \
-        + team.defense_errors + team.reception_errors + team.set_errors
-    team.total_actions = team.total_points + team.total_perfects + team.total_neutrals \
-        + team.total_errors
-    team.total_effectiveness = round(
-        (team.total_points + team.total_perfects) / team.total_actions, 2) \
-        if team.total_actions > 0 else 0.00
-    return team
-
-
-def validate_team_id(object_id: ObjectId) -> bool:
-    # Checks if object_id exists as a team_id in DB
-    try:
-        count: int = get_db_client().players.count_documents({"teams.team_id": object_id})
-    except Exception as exception:
-        ex.no_data_connection("teams_service/validate_team_id/count_documents/teams", exception)
-    if count > 0:
-        return False
-    # Checks if object_id exists as a gameId in DB
-    try:
-        count: int = get_db_client().players.count_documents({"teams.games.game_id": object_id})
-    except Exception as exception:
-        ex.no_data_connection("teams_service/validate_team_id/count_documents/games", exception)
-    if count > 0:
-        return False
-    return True
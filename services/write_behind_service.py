@@ -0,0 +1,307 @@
+import asyncio
+import copy
+import itertools
+import time
+from decouple import config
+from models.game_models import Game, GameAction
+from schemas.game_schemas import full_game
+import services.game_actions_service as GameActionService
+from repositories.repository import get_repository
+from config.logger.logger import get_logger
+from utils import exceptions as ex
+from utils.db_monitoring import db_call
+from utils.journal import Journal
+from utils.stats_engine import apply_statistics
+from utils.stats_pipeline import counter_name
+
+
+LOG = get_logger("games")
+
+
+# Opt-in write-behind of scored actions (WRITE_BEHIND=True). The first action of a game is
+# registered as usual, which checks the game, next ones are journaled and added to counters
+# kept in memory, and the response is sent without writing to DB. Buffered counters of a
+# game are written as one update every WRITE_BEHIND_FLUSH_MS, before the game is finished
+# or rebuilt and at shutdown. Reads of buffered games are served from memory with the
+# counters not written yet; team and player counters are updated when the game is written.
+#
+# The journal keeps buffered actions until they are written, it is rewritten without the
+# written ones after every flush. Actions left by a crashed worker are written at startup.
+# Buffer and journal belong to one API process, so all actions of a game must reach the
+# same worker.
+
+WRITE_BEHIND: bool = config("WRITE_BEHIND", default=False, cast=bool)
+WRITE_BEHIND_FLUSH_MS: int = config("WRITE_BEHIND_FLUSH_MS", default=500, cast=int)
+WRITE_BEHIND_JOURNAL: str = config("WRITE_BEHIND_JOURNAL", default="write_behind.journal")
+# Games without actions for longer are dropped from the buffer once written, so games that
+# are never finished do not stay in memory
+WRITE_BEHIND_IDLE_SECONDS: float = config("WRITE_BEHIND_IDLE_SECONDS", default=600, cast=float)
+
+
+class BufferedGame:
+
+    def __init__(self, game: dict, team_id: str, player_id: str):
+        # Game document as last written to DB
+        self.game = game
+        self.team_id = team_id
+        self.player_id = player_id
+        # (journal entry, action) pairs and their counter deltas, not written and being written
+        self.pending: list[tuple[int, GameAction]] = []
+        self.pending_deltas: dict[str, int] = {}
+        self.flushing: list[tuple[int, GameAction]] = []
+        self.flushing_deltas: dict[str, int] = {}
+        # Journal record of the flush in progress, kept when the journal is rewritten
+        self.flushing_record: dict | None = None
+        self.lock = asyncio.Lock()
+        # Game is being finished or rebuilt, its actions are registered by the usual path
+        self.closing = False
+        self.last_action: float = time.monotonic()
+
+    def add(self, entry: int, game_action: GameAction) -> None:
+        self.pending.append((entry, game_action))
+        self.last_action = time.monotonic()
+        counter: str = counter_name(game_action.action, game_action.action_result)
+        self.pending_deltas[counter] = self.pending_deltas.get(counter, 0) + 1
+
+    def buffered_actions(self) -> int:
+        return len(self.pending) + len(self.flushing)
+
+    def idle(self, now: float) -> bool:
+        return not self.closing and self.buffered_actions() == 0 and not self.lock.locked() \
+            and now - self.last_action > WRITE_BEHIND_IDLE_SECONDS
+
+    # Journal records of the actions not written yet, in the order they were appended
+    def journal_records(self) -> list[dict]:
+        records: list[dict] = [entry_record(entry, game_action, self.player_id)
+                               for entry, game_action in self.flushing]
+        if self.flushing_record is not None:
+            records.append(self.flushing_record)
+        return records + [entry_record(entry, game_action, self.player_id)
+                          for entry, game_action in self.pending]
+
+    def document(self) -> dict:
+        game: dict = copy.deepcopy(self.game)
+        for deltas in (self.flushing_deltas, self.pending_deltas):
+            for field, delta in deltas.items():
+                game[field] = game.get(field, 0) + delta
+        game["version"] = self.version()
+        return apply_statistics(game)
+
+    # Buffered actions are part of the version, which can not be the version of any game
+    # written to DB, so ETags change with every action
+    def version(self) -> int | str:
+        version: int = self.game.get("version", 0)
+        return version if self.buffered_actions() == 0 else \
+            f"{version}.{self.buffered_actions()}"
+
+
+BUFFER: dict[str, BufferedGame] = {}
+JOURNAL = Journal(WRITE_BEHIND_JOURNAL)
+ENTRIES = itertools.count(1)
+FLUSHER: asyncio.Task | None = None
+
+
+# Game was registered by the usual path, its next actions of the same team and player
+# are buffered while the flusher runs
+def track_game(game: dict | None, team_id: str, player_id: str) -> None:
+    if FLUSHER is None or game is None:
+        return
+    buffered: BufferedGame | None = BUFFER.get(str(game["game_id"]))
+    if buffered is None:
+        BUFFER[str(game["game_id"])] = BufferedGame(game, team_id, player_id)
+    else:
+        buffered.last_action = time.monotonic()
+        if game.get("version", 0) > buffered.game.get("version", 0):
+            buffered.game = game
+
+
+# None if game is not buffered, actions are then registered by the usual path
+async def buffer_actions(game_actions: list[GameAction], player_id: str) -> Game | None:
+    buffered: BufferedGame | None = BUFFER.get(game_actions[0].game_id)
+    if buffered is None or buffered.closing or buffered.team_id != game_actions[0].team_id \
+            or buffered.player_id != player_id:
+        return None
+    acknowledgements: list[asyncio.Future] = []
+    for game_action in game_actions:
+        entry: int = next(ENTRIES)
+        acknowledgements.append(JOURNAL.append(entry_record(entry, game_action, player_id)))
+        buffered.add(entry, game_action)
+    game: Game = full_game(buffered.document())
+    await asyncio.gather(*acknowledgements)
+    return game
+
+
+def entry_record(entry: int, game_action: GameAction, player_id: str) -> dict:
+    return {"entry": entry, "game_id": game_action.game_id, "team_id": game_action.team_id,
+            "player_id": player_id, "action": game_action.action,
+            "action_result": game_action.action_result}
+
+
+def buffered_game(game_id: str) -> dict | None:
+    buffered: BufferedGame | None = BUFFER.get(game_id)
+    return None if buffered is None else buffered.document()
+
+
+def buffered_version(game_id: str) -> int | str | None:
+    buffered: BufferedGame | None = BUFFER.get(game_id)
+    return None if buffered is None else buffered.version()
+
+
+# Only games closed by close_game are forgotten, they have no buffered actions
+def forget_game(game_id: str) -> None:
+    buffered: BufferedGame | None = BUFFER.get(game_id)
+    if buffered is not None and buffered.closing and buffered.buffered_actions() == 0:
+        BUFFER.pop(game_id)
+
+
+# Writes buffered actions of game before it is finished or rebuilt. Actions arriving from
+# then on are not buffered, so none is acknowledged and dropped when the game is forgotten;
+# the game stays in the buffer (closing) until forget_game is called.
+async def close_game(game_id: str) -> None:
+    buffered: BufferedGame | None = BUFFER.get(game_id)
+    if buffered is None:
+        return
+    async with buffered.lock:
+        buffered.closing = True
+    try:
+        with db_call("writeBehindService/close_game/find_one_and_update") as call_site:
+            await flush(game_id, buffered)
+    except Exception as exception:
+        buffered.closing = False
+        ex.no_data_connection(call_site, exception)
+
+
+async def flush(game_id: str, buffered: BufferedGame) -> None:
+    async with buffered.lock:
+        if len(buffered.pending) == 0:
+            return
+        buffered.flushing, buffered.pending = buffered.pending, []
+        buffered.flushing_deltas, buffered.pending_deltas = buffered.pending_deltas, {}
+        through: int = buffered.flushing[-1][0]
+        # Expected total_actions tells at startup if the update was written before a crash
+        buffered.flushing_record = {
+            "flushing": game_id, "through": through,
+            "total_actions": buffered.game["total_actions"] + len(buffered.flushing)}
+        await JOURNAL.append(buffered.flushing_record)
+        try:
+            game: dict | None = await get_repository().register_actions(
+                buffered.player_id, buffered.team_id, game_id, buffered.flushing_deltas)
+        except Exception:
+            # Actions are written on next flush
+            buffered.pending = buffered.flushing + buffered.pending
+            for field, delta in buffered.flushing_deltas.items():
+                buffered.pending_deltas[field] = buffered.pending_deltas.get(field, 0) + delta
+            buffered.flushing, buffered.flushing_deltas = [], {}
+            buffered.flushing_record = None
+            raise
+        game_actions: list[GameAction] = [game_action for _, game_action in buffered.flushing]
+        if game is None:
+            LOG.warning("Buffered actions dropped, game is no longer active. Game: %s, " +
+                        "actions: %s.", game_id, len(game_actions))
+            BUFFER.pop(game_id, None)
+        else:
+            buffered.game = game
+        buffered.flushing, buffered.flushing_deltas = [], {}
+        buffered.flushing_record = None
+        await JOURNAL.append({"flushed": game_id, "through": through})
+    if game is not None:
+        await GameActionService.log_game_actions(
+            game_actions, buffered.player_id, game["total_actions"])
+    LOG.debug("Buffered actions written. Game: %s, actions: %s.", game_id, len(game_actions))
+
+
+async def flush_all() -> None:
+    for game_id, buffered in list(BUFFER.items()):
+        try:
+            with db_call("writeBehindService/flush_all/find_one_and_update"):
+                await flush(game_id, buffered)
+        except Exception as exception:
+            LOG.warning("Unable to write buffered actions. Game: %s. Error: -> %s",
+                        game_id, exception)
+    # Idle games have nothing buffered, their next action is registered by the usual path
+    now: float = time.monotonic()
+    for game_id in [game_id for game_id, buffered in BUFFER.items() if buffered.idle(now)]:
+        BUFFER.pop(game_id)
+    if JOURNAL.appended > 0:
+        compact_journal()
+
+
+# Journal only keeps the actions not written yet, entries of written ones are dropped.
+# It is rewritten without awaiting, so no action is buffered meanwhile.
+def compact_journal() -> None:
+    JOURNAL.rewrite([record for buffered in BUFFER.values()
+                     for record in buffered.journal_records()])
+
+
+async def run_flusher() -> None:
+    while True:
+        await asyncio.sleep(WRITE_BEHIND_FLUSH_MS / 1000)
+        await flush_all()
+
+
+# Buffers again the actions of the journal that were not written. Raises if DB can not be
+# read, API must not start and append to a journal that was not recovered.
+async def recover(records: list[dict]) -> None:
+    global ENTRIES
+    games: dict[str, dict] = {}
+    last_entry: int = 0
+    for record in records:
+        if "entry" in record:
+            last_entry = record["entry"]
+            game: dict = games.setdefault(record["game_id"], {
+                "team_id": record["team_id"], "player_id": record["player_id"],
+                "actions": [], "flushing": None})
+            game["actions"].append((record["entry"], GameAction(
+                team_id=record["team_id"], game_id=record["game_id"],
+                action=record["action"], action_result=record["action_result"])))
+        elif "flushing" in record and record["flushing"] in games:
+            games[record["flushing"]]["flushing"] = (record["through"], record["total_actions"])
+        elif "flushed" in record and record["flushed"] in games:
+            game = games[record["flushed"]]
+            game["actions"] = [action for action in game["actions"]
+                               if action[0] > record["through"]]
+            game["flushing"] = None
+    ENTRIES = itertools.count(last_entry + 1)
+    recovered: int = 0
+    for game_id, game in games.items():
+        if len(game["actions"]) == 0:
+            continue
+        with db_call("writeBehindService/recover/find_one"):
+            document: dict | None = await get_repository().find_game(game_id)
+        actions: list[tuple[int, GameAction]] = game["actions"]
+        if game["flushing"] is not None and document is not None \
+                and document["total_actions"] >= game["flushing"][1]:
+            actions = [action for action in actions if action[0] > game["flushing"][0]]
+        if len(actions) == 0:
+            continue
+        if document is None or document["status"] != 1:
+            LOG.warning("Journaled actions dropped, game is no longer active. Game: %s, " +
+                        "actions: %s.", game_id, len(actions))
+            continue
+        buffered = BufferedGame(document, game["team_id"], game["player_id"])
+        for entry, game_action in actions:
+            buffered.add(entry, game_action)
+        BUFFER[game_id] = buffered
+        recovered += len(actions)
+    LOG.info("Write-behind journal recovered. Buffered actions: %s.", recovered)
+    await flush_all()
+    compact_journal()
+
+
+async def start() -> None:
+    global FLUSHER
+    if not WRITE_BEHIND:
+        return
+    await recover(JOURNAL.open())
+    FLUSHER = asyncio.create_task(run_flusher())
+
+
+async def stop() -> None:
+    global FLUSHER
+    if not WRITE_BEHIND:
+        return
+    if FLUSHER is not None:
+        FLUSHER.cancel()
+        FLUSHER = None
+    await flush_all()
+    JOURNAL.close()
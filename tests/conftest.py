@@ -7,7 +7,9 @@ from fastapi.testclient import TestClient
 sys.path.append(config("PROJECT_PATH"))
 
 from main import app
-from config.db.client import get_db_client
+from config.db.client import get_sync_db_client
+from config.db.indexes import create_indexes_sync
+from repositories.repository import STORAGE_MODE
 
 ENV: str = config("ENV")
 TEST_TOKEN = config("TEST_TOKEN")
@@ -24,17 +26,19 @@ def database_clean(request):
     # DO NOT CHANGE
     if ENV != "test":
         pytest.exit("No connection with test database.")
+    # Unique indexes are needed for duplicated email and ids to be rejected
+    create_indexes_sync(STORAGE_MODE)
         
     # Must set ENV in .env to "test"
     def clean_database():
         if ENV == "test":
             # Deletes all players created during test session
             # Need to keep this document in collection for login tests to work
-            get_db_client().players.delete_many(
+            get_sync_db_client().players.delete_many(
                 {"_id":
                     {"$ne": ObjectId(TEST_PLAYER_ID)}})
             # Deletes all teams created for test player during test session
-            get_db_client().players.update_one(
+            get_sync_db_client().players.update_one(
                 {"_id": ObjectId(TEST_PLAYER_ID)},
                 {"$pull":
                     {"teams":
@@ -43,7 +47,7 @@ def database_clean(request):
             # This is for keeping player total_teams = 1 and total_games = 1
             # because only one team is left after DB cleaning
             # It also resets player statistics
-            get_db_client().players.update_one(
+            get_sync_db_client().players.update_one(
                 {"_id": ObjectId(TEST_PLAYER_ID)},
                 {"$set":
                     {
@@ -86,7 +90,7 @@ def database_clean(request):
                         "total_actions": 0,
                         "total_effectiveness": 0}})
             # Deletes all games created for test player/team during test session
-            get_db_client().players.update_one(
+            get_sync_db_client().players.update_one(
                 {"teams": {"$elemMatch": {"team_id": ObjectId(TEST_TEAM_ID)}}},
                 {"$pull":
                     {"teams.$.games":
@@ -94,16 +98,26 @@ def database_clean(request):
                             {"$ne": ObjectId(TEST_GAME_ID)}}}})
             # This is for keeping team total_games = 1
             # because only one game is left after DB cleaning
-            get_db_client().players.update_one(
+            get_sync_db_client().players.update_one(
                 {"teams": {"$elemMatch": {"team_id": ObjectId(TEST_TEAM_ID)}}},
                 {"$set": {"teams.$.total_games": 1}})
             # This is for test game to remain active after DB cleaning
-            get_db_client().players.update_one(
+            get_sync_db_client().players.update_one(
                 {"teams.games.game_id": ObjectId(TEST_GAME_ID)},
                 {"$set": {"teams.$[t].games.$[g].status": 1}},
                 array_filters=[
                     {"t.team_id": ObjectId(TEST_TEAM_ID)},
                     {"g.game_id": ObjectId(TEST_GAME_ID)}])
+            # Same cleaning for teams and games collections (STORAGE_MODE="normalized")
+            get_sync_db_client().teams.delete_many({"_id": {"$ne": ObjectId(TEST_TEAM_ID)}})
+            get_sync_db_client().games.delete_many({"_id": {"$ne": ObjectId(TEST_GAME_ID)}})
+            get_sync_db_client().teams.update_one(
+                {"_id": ObjectId(TEST_TEAM_ID)}, {"$set": {"total_games": 1}})
+            get_sync_db_client().games.update_one(
+                {"_id": ObjectId(TEST_GAME_ID)}, {"$set": {"status": 1}})
+            # Deletes game actions log of test session
+            get_sync_db_client().game_actions.delete_many({})
+            get_sync_db_client().player_daily_stats.delete_many({})
             # TODO clean all test player/team/game statistics, set them to 0
 
     request.addfinalizer(clean_database)
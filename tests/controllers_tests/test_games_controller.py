@@ -1,5 +1,8 @@
+import asyncio
+import httpx
 from fastapi.testclient import TestClient
 from fastapi.encoders import jsonable_encoder
+from starlette.websockets import WebSocketDisconnect
 import sys
 import pytest
 from decouple import config
@@ -9,6 +12,7 @@ sys.path.append(config("PROJECT_PATH"))
 from main import app
 from models.team_models import Team
 from models.game_models import Game, EndGame, GameAction
+from models.player_models import NewPlayer
 
 TEST_GAME_ID = config("TEST_GAME_ID")
 TEST_TEAM_ID = config("TEST_TEAM_ID")
@@ -105,6 +109,162 @@ def test_create_game(token_for_tests, database_check):
     assert result.json()["detail"] == f"Game with id {game_id} was finished."
 
 
+game_batch: Game = Game(
+    game_country="Colombia",
+    game_city="Medellín",
+    opponent_team="Peru",
+    player_position="OH",
+    player_number="7"
+)
+
+
+team_batch: Team = Team(
+    team_name="Batch",
+    team_category="Mixed"
+)
+
+
+def test_play_game_actions_batch(token_for_tests, database_check):
+    token = token_for_tests
+    result = client.post(
+        f"{TEAMS_MAIN_ROUTE}/new_team",
+        json=jsonable_encoder(team_batch),
+        headers={"Authorization": f"Bearer {token}"})
+    team_id = result.json()["data"]["team_id"]
+    result = client.post(
+        f"{GAMES_MAIN_ROUTE}/{team_id}",
+        json=jsonable_encoder(game_batch),
+        headers={"Authorization": f"Bearer {token}"})
+    game_id = result.json()["data"]["game_id"]
+    actions: list = [
+        {"team_id": team_id, "game_id": game_id, "action": action, "action_result": result}
+        for action, result in [
+            ("attack", "point"), ("attack", "error"), ("attack", "point"),
+            ("reception", "perfect"), ("reception", "neutral")]]
+    result = client.put(
+        f"{GAMES_MAIN_ROUTE}/{game_id}/actions:batch",
+        json=actions,
+        headers={"Authorization": f"Bearer {token}"})
+    game = result.json()["data"]
+    assert result.json()["detail"] == "5 actions registered."
+    assert game["attack_points"] == 2
+    assert game["attack_errors"] == 1
+    assert game["total_attacks"] == 3
+    assert game["attack_effectiveness"] == 0.67
+    assert game["reception_perfects"] == 1
+    assert game["total_actions"] == 5
+    # Every action is kept in the game actions log in the same order
+    result = client.get(
+        f"{GAMES_MAIN_ROUTE}/{game_id}/actions",
+        headers={"Authorization": f"Bearer {token}"})
+    logged_actions = result.json()["data"]
+    assert [logged["seq"] for logged in logged_actions] == [1, 2, 3, 4, 5]
+    assert [(logged["action"], logged["action_result"]) for logged in logged_actions] == \
+        [(action["action"], action["action_result"]) for action in actions]
+    # Rebuilding game statistics from the log keeps the same counters
+    result = client.put(
+        f"{GAMES_MAIN_ROUTE}/rebuild_statistics",
+        json=jsonable_encoder({"team_id": team_id, "game_id": game_id}),
+        headers={"Authorization": f"Bearer {token}"})
+    assert result.json()["data"] == game
+    # Actions for another game are rejected
+    actions[0]["game_id"] = TEST_GAME_ID
+    result = client.put(
+        f"{GAMES_MAIN_ROUTE}/{game_id}/actions:batch",
+        json=actions,
+        headers={"Authorization": f"Bearer {token}"})
+    assert result.json() == {"detail": "Invalid value for game id."}
+    result = client.put(
+        f"{GAMES_MAIN_ROUTE}/finish_game",
+        json=jsonable_encoder({"team_id": team_id, "game_id": game_id}),
+        headers={"Authorization": f"Bearer {token}"})
+    assert result.json()["detail"] == f"Game with id {game_id} was finished."
+
+
+def test_game_actions_of_other_players(database_check):
+    other_player: NewPlayer = NewPlayer(
+        first_name="Mirta", last_name="Lago", category="Women", position="S",
+        email="mirta@lago.com", password="Mirtalago2023Pelitos")
+    client.post("/players", json=jsonable_encoder(other_player))
+    token = client.post("/auth/login", data={
+        "username": other_player.email, "password": other_player.password}).json()["access_token"]
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    # Log and counters of the test player can not be read nor rebuilt by another player
+    result = client.get(f"{GAMES_MAIN_ROUTE}/{TEST_GAME_ID}/actions", headers=headers)
+    assert result.json() == {"detail": "Game not found."}
+    result = client.put(
+        f"{GAMES_MAIN_ROUTE}/rebuild_statistics",
+        json=jsonable_encoder(end_game1),
+        headers=headers)
+    assert result.json() == {"detail": "Game not found."}
+
+
+def test_follow_game(token_for_tests, database_check):
+    token = token_for_tests
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    team_id = client.post(f"{TEAMS_MAIN_ROUTE}/new_team", headers=headers, json=jsonable_encoder(
+        Team(team_name="Live", team_category="Mixed"))).json()["data"]["team_id"]
+    game_id = client.post(f"{GAMES_MAIN_ROUTE}/{team_id}", headers=headers,
+                          json=jsonable_encoder(game1)).json()["data"]["game_id"]
+    with client.websocket_connect(f"{GAMES_MAIN_ROUTE}/{game_id}/live?token={token}") as live:
+        snapshot = live.receive_json()
+        assert snapshot["event"] == "snapshot"
+        assert snapshot["game"]["game_id"] == game_id
+        assert snapshot["game"]["total_actions"] == 0
+        client.put(f"{GAMES_MAIN_ROUTE}/play_game", headers=headers, json={
+            "team_id": team_id, "game_id": game_id, "action": "attack",
+            "action_result": "point"})
+        assert live.receive_json() == {"event": "action", "game_id": game_id,
+                                       "deltas": {"attack_points": 1}, "total_actions": 1}
+        client.put(f"{GAMES_MAIN_ROUTE}/finish_game", headers=headers,
+                   json={"team_id": team_id, "game_id": game_id})
+        assert live.receive_json() == {"event": "finished", "game_id": game_id}
+        assert live.receive()["type"] == "websocket.close"
+    # Finished games only get their snapshot
+    with client.websocket_connect(f"{GAMES_MAIN_ROUTE}/{game_id}/live?token={token}") as live:
+        assert live.receive_json()["game"]["status"] == 0
+        assert live.receive()["type"] == "websocket.close"
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect(f"{GAMES_MAIN_ROUTE}/{game_id}/live?token=invalid"):
+            pass
+    assert disconnect.value.code == 1008
+
+
+def test_concurrent_play_game(token_for_tests, database_check):
+    token = token_for_tests
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    team_id = client.post(f"{TEAMS_MAIN_ROUTE}/new_team", headers=headers, json=jsonable_encoder(
+        Team(team_name="Concurrent", team_category="Mixed"))).json()["data"]["team_id"]
+    game_id = client.post(f"{GAMES_MAIN_ROUTE}/{team_id}", headers=headers,
+                          json=jsonable_encoder(game1)).json()["data"]["game_id"]
+    actions: list[tuple[str, str]] = [("attack", "point"), ("block", "error"),
+                                      ("set", "perfect"), ("reception", "neutral")] * 250
+
+    # Requests are sent together, as from several scorekeepers
+    async def play_all() -> list[int]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as scorers:
+            responses = await asyncio.gather(*[scorers.put(
+                f"{GAMES_MAIN_ROUTE}/play_game", headers=headers, json={
+                    "team_id": team_id, "game_id": game_id, "action": action,
+                    "action_result": action_result}) for action, action_result in actions])
+        return [response.status_code for response in responses]
+    assert set(asyncio.run(play_all())) == {200}
+    game = client.get(f"{GAMES_MAIN_ROUTE}/{game_id}", headers=headers).json()["data"]
+    team = client.get(f"{TEAMS_MAIN_ROUTE}/{team_id}", headers=headers).json()["data"]
+    for document in (game, team):
+        assert (document["attack_points"], document["block_errors"], document["set_perfects"],
+                document["reception_neutrals"], document["total_actions"]) == \
+            (250, 250, 250, 250, 1000)
+        assert document["attack_effectiveness"] == 1
+        assert document["total_effectiveness"] == 0.5
+    logged_actions = client.get(f"{GAMES_MAIN_ROUTE}/{game_id}/actions",
+                                headers=headers).json()["data"]
+    assert sorted(logged["seq"] for logged in logged_actions) == list(range(1, 1001))
+    client.put(f"{GAMES_MAIN_ROUTE}/finish_game", headers=headers,
+               json={"team_id": team_id, "game_id": game_id})
+
+
 game2: Game = Game(
     game_country="Colombia",
     game_city="Bogotá",
@@ -270,3 +430,29 @@ def test_play_game(token_for_tests, database_check):
         else:
             for key in Game.__fields__:
                 assert key in result.json()["data"].keys()
+
+
+def test_get_game_by_id_not_modified(token_for_tests, database_check):
+    token = token_for_tests
+    headers: dict = {"Authorization": f"Bearer {token}"}
+    result = client.get(f"{GAMES_MAIN_ROUTE}/{TEST_GAME_ID}", headers=headers)
+    etag = result.headers["ETag"]
+    result = client.get(f"{GAMES_MAIN_ROUTE}/{TEST_GAME_ID}",
+                        headers={**headers, "If-None-Match": etag})
+    assert result.status_code == 304
+    assert result.headers["ETag"] == etag
+    assert result.content == b""
+    team_id = client.post(f"{TEAMS_MAIN_ROUTE}/new_team", headers=headers, json=jsonable_encoder(
+        Team(team_name="Etag", team_category="Mixed"))).json()["data"]["team_id"]
+    team_etag = client.get(f"{TEAMS_MAIN_ROUTE}/{team_id}", headers=headers).headers["ETag"]
+    player_etag = client.get("/players/player", headers=headers).headers["ETag"]
+    client.put(TEAMS_MAIN_ROUTE, headers=headers,
+               json={"team_id": team_id, "new_team_name": "Etag renamed"})
+    # Team and its player changed, game did not
+    for route, old_etag, status_code in [
+            (f"{TEAMS_MAIN_ROUTE}/{team_id}", team_etag, 200),
+            ("/players/player", player_etag, 200),
+            (f"{GAMES_MAIN_ROUTE}/{TEST_GAME_ID}", etag, 304)]:
+        result = client.get(route, headers={**headers, "If-None-Match": old_etag})
+        assert result.status_code == status_code
+        assert (result.headers["ETag"] != old_etag) == (status_code == 200)
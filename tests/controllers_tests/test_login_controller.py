@@ -1,4 +1,7 @@
+import asyncio
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from jose import jwt
 from bson import ObjectId
 import sys
 import pytest
@@ -8,6 +11,7 @@ sys.path.append(config("PROJECT_PATH"))
 
 from main import app
 from routers.login_controller import decode_token, create_auth_response
+from services.login_service import PRINCIPAL_CACHE
 from models.login_models import AuthResponse
 
 
@@ -19,10 +23,29 @@ client = TestClient(app)
 
 def test_decode_token():
     token: str = config("TEST_TOKEN")
-    result = decode_token(token)
+    result = asyncio.run(decode_token(token))
     assert ObjectId.is_valid(result)
     assert type(result) == str
-    
+
+
+def test_decode_token_without_expiration():
+    token: str = jwt.encode({"sub": config("TEST_PLAYER_ID")}, config("SECRET"),
+                            algorithm=config("ALGORITHM"))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(decode_token(token))
+    assert error.value.status_code == 401
+
+
+def test_decode_token_uses_principal_cache():
+    token: str = config("TEST_TOKEN")
+    first_result = asyncio.run(decode_token(token))
+    hits: int = PRINCIPAL_CACHE.hits
+    second_result = asyncio.run(decode_token(token))
+    assert second_result == first_result
+    assert PRINCIPAL_CACHE.hits == hits + 1
+    result = client.get("/auth/principal-cache")
+    assert result.json()["data"]["hits"] >= hits + 1
+
 
 def test_create_auth_response():
     player_id: str = config("TEST_PLAYER_ID")
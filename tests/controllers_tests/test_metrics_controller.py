@@ -0,0 +1,52 @@
+from fastapi.testclient import TestClient
+import sys
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from main import app
+from utils.metrics import METRICS
+
+TEST_GAME_ID = config("TEST_GAME_ID")
+
+client = TestClient(app)
+
+METRICS_MAIN_ROUTE = "/metrics"
+
+
+def test_get_metrics_by_route(token_for_tests, database_check):
+    METRICS.clear()
+    token = token_for_tests
+    client.get(f"/games/{TEST_GAME_ID}", headers={"Authorization": f"Bearer {token}"})
+    result = client.get(METRICS_MAIN_ROUTE)
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = result.text.splitlines()
+    labels = 'method="GET",route="/games/{game_id}"'
+    assert f'http_requests_total{{{labels},status="200"}} 1' in lines
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f'db_operations_per_request_count{{{labels}}} 1' in lines
+    assert f'http_requests_in_flight{{{labels}}} 0' in lines
+    # Request to /metrics is still being handled while metrics are rendered
+    assert 'http_requests_in_flight{method="GET",route="/metrics"} 1' in lines
+
+
+def test_get_metrics_errors(token_for_tests, database_check):
+    METRICS.clear()
+    token = token_for_tests
+    client.get("/games/646575c9ecda2d0a13333de", headers={"Authorization": f"Bearer {token}"})
+    client.get("/games/646575c9ecda2d0a13333de9", headers={"Authorization": f"Bearer {token}"})
+    client.get("/nowhere")
+    lines = client.get(METRICS_MAIN_ROUTE).text.splitlines()
+    labels = 'method="GET",route="/games/{game_id}"'
+    assert f'http_request_errors_total{{{labels},error="invalid_value"}} 1' in lines
+    assert f'http_request_errors_total{{{labels},error="game_not_found"}} 1' in lines
+    assert 'http_request_errors_total{method="GET",route="unmatched",error="HTTPException"} 1' \
+        in lines
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in lines
+
+
+def test_get_db_calls():
+    result = client.get(f"{METRICS_MAIN_ROUTE}/db-calls")
+    assert result.status_code == 200
+    assert type(result.json()["data"]) == list
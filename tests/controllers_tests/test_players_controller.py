@@ -1,12 +1,14 @@
 from fastapi.testclient import TestClient
 from fastapi.encoders import jsonable_encoder
+import json
 import pytest
 import sys
 from decouple import config
 
 sys.path.append(config("PROJECT_PATH"))
 
-from models.player_models import NewPlayer, PlayerBase, Player, NewPassword
+from models.player_models import NewPlayer, PlayerBase, Player, NewPassword, \
+    PlayerStatisticPoint
 from main import app
 
 
@@ -24,6 +26,32 @@ def test_get_all_players(database_clean, database_check) -> None:
     assert type(result.json()["data"]) == list
 
 
+def test_get_all_players_pages(database_check) -> None:
+    all_players = client.get(f"{PLAYERS_MAIN_ROUTE}?stream=true")
+    assert all_players.status_code == 200
+    assert all_players.headers["content-type"] == "application/x-ndjson"
+    emails = [json.loads(line)["email"] for line in all_players.text.splitlines()]
+    paged_emails = []
+    after = None
+    while True:
+        params = {"limit": 1} if after is None else {"limit": 1, "after": after}
+        result = client.get(PLAYERS_MAIN_ROUTE, params=params)
+        assert result.status_code == 200
+        assert len(result.json()["data"]) <= 1
+        paged_emails += [player["email"] for player in result.json()["data"]]
+        after = result.json()["next_cursor"]
+        if after is None:
+            break
+    assert len(emails) > 0
+    assert paged_emails == emails
+
+
+def test_get_all_players_invalid_cursor() -> None:
+    result = client.get(f"{PLAYERS_MAIN_ROUTE}?after=xxxxxx")
+    assert result.status_code == 400
+    assert result.json() == {"detail": "Invalid value for cursor."}
+
+
 player1: NewPlayer = NewPlayer(
     first_name="Calixta",
     last_name="Solar",
@@ -104,7 +132,8 @@ updated_player: PlayerBase = PlayerBase(
         (player6,
             {"data": None,
                 "detail":
-                    f"Player {player6.first_name} {player6.last_name} successfully registered."})
+                    f"Player {player6.first_name} {player6.last_name} successfully registered."}),
+        (player1, {"detail": "Player already registered in database."})
     ])
 # This database_clean call is enoguh for the entire test session
 def test_create_player(player: NewPlayer, expected: dict, database_clean) -> None:
@@ -126,6 +155,32 @@ def test_get_player_by_id(token_for_tests, database_check) -> None:
         assert key in data.keys()
 
 
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("metric=attack&bucket=day", {"detail": "Invalid value for metric."}),
+        ("metric=total_actions&bucket=year", {"detail": "Invalid value for bucket."})
+    ]
+)
+def test_get_player_timeseries_exceptions(query: str, expected: dict, token_for_tests) -> None:
+    result = client.get(
+        f"{PLAYERS_MAIN_ROUTE}/player/timeseries?{query}",
+        headers={"Authorization": f"Bearer {token_for_tests}"})
+    assert result.json() == expected
+
+
+def test_get_player_timeseries(token_for_tests, database_check) -> None:
+    result = client.get(
+        f"{PLAYERS_MAIN_ROUTE}/player/timeseries?metric=total_actions&bucket=month",
+        headers={"Authorization": f"Bearer {token_for_tests}"})
+    points = result.json()["data"]
+    assert type(points) == list
+    for point in points:
+        assert set(point.keys()) == set(PlayerStatisticPoint.__fields__)
+        assert point["value"] == point["total_actions"]
+        assert point["period_start"].endswith("-01")
+
+
 @pytest.mark.parametrize(
     "player, new_pass, expected",
     [
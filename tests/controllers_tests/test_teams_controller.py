@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from fastapi.encoders import jsonable_encoder
+import json
 import sys
 import pytest
 from decouple import config
@@ -22,6 +23,32 @@ def test_get_all_teams(database_clean, database_check):
     assert type(result.json()["data"]) == list
 
 
+def test_get_all_teams_pages(database_check):
+    all_teams = client.get(f"{TEAMS_MAIN_ROUTE}?stream=true")
+    assert all_teams.status_code == 200
+    assert all_teams.headers["content-type"] == "application/x-ndjson"
+    team_ids = [json.loads(line)["team_id"] for line in all_teams.text.splitlines()]
+    paged_team_ids = []
+    after = None
+    while True:
+        params = {"limit": 1} if after is None else {"limit": 1, "after": after}
+        result = client.get(TEAMS_MAIN_ROUTE, params=params)
+        assert result.status_code == 200
+        assert len(result.json()["data"]) <= 1
+        paged_team_ids += [team["team_id"] for team in result.json()["data"]]
+        after = result.json()["next_cursor"]
+        if after is None:
+            break
+    assert TEST_TEAM_ID in team_ids
+    assert paged_team_ids == team_ids
+
+
+def test_get_all_teams_invalid_cursor():
+    result = client.get(f"{TEAMS_MAIN_ROUTE}?after=xxxxxx")
+    assert result.status_code == 400
+    assert result.json() == {"detail": "Invalid value for cursor."}
+
+
 def test_get_teams_by_player(token_for_tests, database_check):
     token = token_for_tests
     result = client.get(
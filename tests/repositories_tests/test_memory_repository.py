@@ -0,0 +1,155 @@
+import asyncio
+import sys
+import pytest
+from bson import ObjectId
+from decouple import config
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+sys.path.append(config("PROJECT_PATH"))
+
+from models.game_models import Game
+from models.player_models import NewPlayer
+from models.team_models import Team
+from repositories.memory_repository import MemoryRepository
+
+
+def new_player(email: str) -> dict:
+    return NewPlayer(first_name="Calixta", last_name="Solar", category="Women",
+                     position="OH", email=email, password="Calypsa2023Pelitos").dict()
+
+
+def new_team() -> dict:
+    team: dict = Team(team_name="Vakif", team_category="Women").dict()
+    team["team_id"] = ObjectId()
+    return team
+
+
+def new_game() -> dict:
+    game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                      player_position="ANY", player_number="ANY").dict()
+    game["game_id"] = ObjectId()
+    return game
+
+
+async def player_with_game(repository: MemoryRepository) -> tuple[str, str, str]:
+    player_id = await repository.insert_player(new_player("calixta@solar.com"))
+    team, game = new_team(), new_game()
+    await repository.push_team(str(player_id), team)
+    await repository.push_game(str(team["team_id"]), game)
+    return str(player_id), str(team["team_id"]), str(game["game_id"])
+
+
+def test_unique_email():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id = await repository.insert_player(new_player("calixta@solar.com"))
+        other_id = await repository.insert_player(new_player("other@solar.com"))
+        with pytest.raises(DuplicateKeyError):
+            await repository.insert_player(new_player("calixta@solar.com"))
+        with pytest.raises(DuplicateKeyError):
+            await repository.update_player(str(other_id), {"email": "calixta@solar.com"})
+        assert await repository.update_player(str(player_id), {"email": "new@solar.com"}) == 1
+        assert await repository.find_player_by_email("calixta@solar.com") is None
+        assert await repository.insert_player(new_player("calixta@solar.com"))
+    asyncio.run(scenario())
+
+
+def test_modified_counts_and_projections():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id, team_id, _ = await player_with_game(repository)
+        assert await repository.update_player(player_id, {"first_name": "Calixta"}) == 0
+        assert await repository.update_team(team_id, {"team_name": "Vakifbank"}) == 1
+        assert await repository.update_team(str(ObjectId()), {"team_name": "Vakifbank"}) == 0
+        player: dict = await repository.find_player(player_id, {"email": 1})
+        assert player == {"_id": ObjectId(player_id), "email": "calixta@solar.com"}
+        player["email"] = "changed@solar.com"
+        assert (await repository.find_player(player_id))["email"] == "calixta@solar.com"
+    asyncio.run(scenario())
+
+
+def test_register_actions_updates_three_levels():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id, team_id, game_id = await player_with_game(repository)
+        deltas: dict = {"attack_points": 2, "attack_errors": 1}
+        game: dict = await repository.register_actions(player_id, team_id, game_id, deltas)
+        assert game["total_attacks"] == 3
+        assert game["attack_effectiveness"] == 0.67
+        assert (await repository.find_team(team_id))["total_points"] == 2
+        assert (await repository.find_player(player_id))["total_actions"] == 3
+        assert await repository.register_actions(
+            str(ObjectId()), team_id, game_id, deltas) is None
+        assert await repository.finish_game(team_id, game_id) == 1
+        assert await repository.finish_game(team_id, game_id) == 0
+        assert await repository.register_actions(player_id, team_id, game_id, deltas) is None
+    asyncio.run(scenario())
+
+
+def test_versions_follow_writes():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id, team_id, game_id = await player_with_game(repository)
+        versions = [await repository.find_player_version(player_id),
+                    await repository.find_team_version(team_id),
+                    await repository.find_game_version(game_id)]
+        assert versions == [2, 1, 0]
+        # Unchanged values do not increase versions
+        await repository.update_team(team_id, {"team_name": "Vakif"})
+        assert await repository.find_team_version(team_id) == 1
+        await repository.register_actions(player_id, team_id, game_id, {"attack_points": 1})
+        assert await repository.find_game_version(game_id) == 1
+        assert await repository.find_team_version(team_id) == 2
+        assert await repository.find_player_version(player_id) == 3
+        assert (await repository.find_game(game_id))["version"] == 1
+        assert await repository.find_game_version(str(ObjectId())) is None
+    asyncio.run(scenario())
+
+
+def test_pull_team_and_delete_player():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id, team_id, game_id = await player_with_game(repository)
+        assert await repository.pull_team(str(ObjectId()), team_id) == 0
+        assert await repository.pull_team(player_id, team_id) == 1
+        assert await repository.count_games(game_id) == 0
+        assert await repository.delete_player(player_id) == 1
+        assert await repository.find_player_by_email("calixta@solar.com") is None
+    asyncio.run(scenario())
+
+
+def test_teams_pages_are_not_shifted_by_deleted_teams():
+    async def scenario():
+        repository = MemoryRepository()
+        player_id, first_team_id, _ = await player_with_game(repository)
+        teams: list[dict] = [new_team(), new_team()]
+        for team in teams:
+            await repository.push_team(player_id, team)
+        first_page = [item async for item in repository.iterate_teams(None, 2)][:2]
+        assert [str(team["team_id"]) for _, team in first_page] == \
+            [first_team_id, str(teams[0]["team_id"])]
+        # Removing a team already sent does not make the next page skip one
+        await repository.pull_team(player_id, first_team_id)
+        next_page = [team async for _, team in repository.iterate_teams(first_page[-1][0], 2)]
+        assert [team["team_id"] for team in next_page] == [teams[1]["team_id"]]
+        with pytest.raises(ValueError):
+            repository.iterate_teams(f"{player_id}.1", 2)
+    asyncio.run(scenario())
+
+
+def test_game_actions_log():
+    async def scenario():
+        repository = MemoryRepository()
+        game_id, team_id = ObjectId(), ObjectId()
+        game_actions: list[dict] = [
+            {"game_id": game_id, "team_id": team_id, "player_id": ObjectId(), "seq": seq,
+             "action": "attack", "action_result": result}
+            for seq, result in ((2, "error"), (1, "point"), (3, "point"))]
+        assert await repository.insert_game_actions(game_actions) == 3
+        with pytest.raises(BulkWriteError):
+            await repository.insert_game_actions([dict(game_actions[0], _id=ObjectId())])
+        logged: list[dict] = await repository.find_game_actions(str(game_id))
+        assert [game_action["seq"] for game_action in logged] == [1, 2, 3]
+        assert await repository.count_game_actions("team_id", str(team_id)) == {
+            "attack_points": 2, "attack_errors": 1}
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+import sys
+import pytest
+from bson import ObjectId
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from models.game_models import EndGame, Game
+from models.player_models import NewPlayer
+from models.team_models import Team
+from repositories.memory_repository import MemoryRepository
+import services.active_games_service as ActiveGameService
+import services.games_service as GameService
+import services.players_service as PlayerService
+import services.teams_service as TeamService
+
+
+@pytest.fixture
+def repository(monkeypatch) -> MemoryRepository:
+    repository = MemoryRepository()
+    for module in (GameService, PlayerService, TeamService):
+        monkeypatch.setattr(module, "get_repository", lambda: repository)
+    ActiveGameService.ACTIVE_GAMES.clear()
+    return repository
+
+
+async def player_with_team(repository: MemoryRepository) -> tuple[str, str]:
+    player_id = str(await repository.insert_player(NewPlayer(
+        first_name="Calixta", last_name="Solar", category="Women", position="OH",
+        email="calixta@solar.com", password="Calypsa2023Pelitos").dict()))
+    team: dict = Team(team_name="Vakif", team_category="Women").dict()
+    team["team_id"] = ObjectId()
+    await repository.push_team(player_id, team)
+    await repository.update_player(player_id, {"total_teams": 1})
+    return player_id, str(team["team_id"])
+
+
+def new_game() -> Game:
+    return Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                player_position="ANY", player_number="ANY")
+
+
+def test_active_games_skip_existence_checks(repository, monkeypatch):
+    async def scenario():
+        player_id, team_id = await player_with_team(repository)
+        game_id: str = (await GameService.create_game(team_id, new_game(), player_id)).game_id
+        assert ActiveGameService.is_active_game(game_id, team_id)
+
+        async def no_count(_: str) -> int:
+            raise AssertionError("Existence checked in DB")
+        with monkeypatch.context() as patch:
+            patch.setattr(repository, "count_teams", no_count)
+            patch.setattr(repository, "count_games", no_count)
+            assert await GameService.finish_game(EndGame(team_id=team_id, game_id=game_id))
+        assert not ActiveGameService.is_active_game(game_id, team_id)
+        # Finished games are checked in DB again
+        with pytest.raises(Exception) as error:
+            await GameService.finish_game(EndGame(team_id=team_id, game_id=game_id))
+        assert error.value.detail == "Game was already finished."
+    asyncio.run(scenario())
+
+
+def test_active_games_are_forgotten_with_their_team_and_player(repository):
+    async def scenario():
+        player_id, team_id = await player_with_team(repository)
+        game_id: str = (await GameService.create_game(team_id, new_game(), player_id)).game_id
+        await TeamService.delete_team(team_id, player_id)
+        assert not ActiveGameService.is_active_game(game_id, team_id)
+        ActiveGameService.cache_active_game(game_id, team_id, player_id)
+        await PlayerService.delete_player(player_id)
+        assert len(ActiveGameService.ACTIVE_GAMES) == 0
+    asyncio.run(scenario())
+
+
+# Team deleted or game finished by another worker leaves a stale entry in this worker cache
+def test_stale_active_games_are_checked_in_db(repository):
+    async def scenario():
+        player_id, team_id = await player_with_team(repository)
+        finished_id: str = (await GameService.create_game(team_id, new_game(), player_id)).game_id
+        await repository.finish_game(team_id, finished_id)
+        with pytest.raises(Exception) as error:
+            await GameService.finish_game(EndGame(team_id=team_id, game_id=finished_id))
+        assert error.value.detail == "Game was already finished."
+        game_id: str = (await GameService.create_game(team_id, new_game(), player_id)).game_id
+        await repository.pull_team(player_id, team_id)
+        with pytest.raises(Exception) as error:
+            await GameService.finish_game(EndGame(team_id=team_id, game_id=game_id))
+        assert error.value.detail == "Team not found."
+        assert not ActiveGameService.is_active_game(game_id, team_id)
+    asyncio.run(scenario())
@@ -1,10 +1,27 @@
+import asyncio
 import pytest
+import random
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
 from decouple import config
+from pymongo.errors import DuplicateKeyError
 
 sys.path.append(config("PROJECT_PATH"))
 
-from services.games_service import valid_action_and_action_result
+from models.game_models import Game, GameAction
+from models.player_models import NewPlayer
+from models.team_models import Team
+from repositories.base_repository import Repository
+from repositories.memory_repository import MemoryRepository
+import repositories.mongo_repository as mongo_repository
+from repositories.mongo_repository import MongoRepository
+from repositories.normalized_repository import NormalizedMongoRepository
+from repositories.repository import get_repository
+import services.game_actions_service as GameActionService
+import services.games_service as GameService
+from services.games_service import fold_game_actions, valid_action_and_action_result
+from utils.stats_engine import STORED_COUNTER_FIELDS, statistics_from_counts
 
 
 @pytest.mark.parametrize(
@@ -20,3 +37,150 @@ from services.games_service import valid_action_and_action_result
 def test_check_for_valid_action_and_action_result(action: str, action_result: str, expected):
     result = valid_action_and_action_result(action, action_result)
     assert result == expected
+
+
+def test_fold_game_actions():
+    team_id = "646575c9ecda2d0a13333de9"
+    game_id = "646575c9ecda2d0a13333de8"
+    actions = [
+        GameAction(team_id=team_id, game_id=game_id, action=action, action_result=result)
+        for action, result in [
+            ("attack", "point"), ("attack", "point"), ("attack", "error"),
+            ("reception", "perfect"), ("set", "neutral"), ("attack", "point")]]
+    result = fold_game_actions(actions)
+    assert result == {
+        "attack_points": 3,
+        "attack_errors": 1,
+        "reception_perfects": 1,
+        "set_neutrals": 1
+    }
+
+
+async def player_with_game(repository: Repository) -> tuple[str, str, str]:
+    player_id = str(await repository.insert_player(NewPlayer(
+        first_name="Calixta", last_name="Solar", category="Women", position="OH",
+        email=f"calixta.{ObjectId()}@solar.com", password="Calypsa2023Pelitos").dict()))
+    team: dict = Team(team_name="Vakif", team_category="Women").dict()
+    team["team_id"] = ObjectId()
+    game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                      player_position="ANY", player_number="ANY").dict()
+    game["game_id"] = ObjectId()
+    await repository.push_team(player_id, team)
+    await repository.push_game(str(team["team_id"]), game)
+    return player_id, str(team["team_id"]), str(game["game_id"])
+
+
+def play_concurrently(repository: Repository, monkeypatch, actions_count: int) -> None:
+    monkeypatch.setattr(GameService, "get_repository", lambda: repository)
+    monkeypatch.setattr(GameActionService, "get_repository", lambda: repository)
+    player_id, team_id, game_id = asyncio.run(player_with_game(repository))
+    counters: list[str] = random.Random(7).choices(STORED_COUNTER_FIELDS, k=actions_count)
+    actions: list[GameAction] = [
+        GameAction(team_id=team_id, game_id=game_id, action=counter.split("_")[0],
+                   action_result=counter.split("_")[1][:-1]) for counter in counters]
+
+    # Scorekeepers in several threads, each one with its own event loop
+    def score(scorer_actions: list[GameAction]) -> None:
+        async def scenario():
+            await asyncio.gather(*[GameService.play_game(action, player_id)
+                                   for action in scorer_actions])
+        asyncio.run(scenario())
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(score, [actions[index::8] for index in range(8)]))
+    expected: dict = statistics_from_counts(fold_game_actions(actions))
+
+    async def stored_documents() -> list[dict]:
+        return [await repository.find_game(game_id), await repository.find_team(team_id),
+                await repository.find_player(player_id)]
+    for document in asyncio.run(stored_documents()):
+        assert {field: document[field] for field in expected} == expected
+    logged_actions: list[dict] = asyncio.run(repository.find_game_actions(game_id))
+    assert [action["seq"] for action in logged_actions] == list(range(1, len(actions) + 1))
+
+
+def test_concurrent_actions_are_all_counted(monkeypatch):
+    play_concurrently(MemoryRepository(), monkeypatch, 4000)
+
+
+# Same scenario with the atomic updates run by MongoDB, for both storage layouts
+@pytest.mark.parametrize("repository_class", [MongoRepository, NormalizedMongoRepository])
+def test_concurrent_actions_are_all_counted_in_mongo(repository_class, monkeypatch,
+                                                     database_clean):
+    play_concurrently(repository_class(), monkeypatch, 1000)
+
+
+def test_rebuild_keeps_counters_from_before_the_log(monkeypatch):
+    repository = MemoryRepository()
+    monkeypatch.setattr(GameService, "get_repository", lambda: repository)
+    monkeypatch.setattr(GameActionService, "get_repository", lambda: repository)
+
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        # Career counters scored before the log existed
+        await repository.update_team(team_id, {"attack_points": 50, "attack_errors": 5})
+        await repository.update_player(player_id, {"attack_points": 80, "attack_errors": 9})
+        attack = GameAction(team_id=team_id, game_id=game_id, action="attack",
+                            action_result="point")
+        await GameService.play_game(attack, player_id)
+        await GameService.play_game(attack, player_id)
+        # Action counted in the three levels whose log entry was lost
+        await repository.register_actions(player_id, team_id, game_id, {"attack_errors": 1})
+        await GameActionService.rebuild_statistics(team_id, game_id, player_id)
+        game, team, player = (await repository.find_game(game_id),
+                              await repository.find_team(team_id),
+                              await repository.find_player(player_id))
+        assert (game["attack_points"], game["attack_errors"]) == (2, 0)
+        assert (team["attack_points"], team["attack_errors"]) == (52, 5)
+        assert (player["attack_points"], player["attack_errors"]) == (82, 9)
+        assert team["attack_effectiveness"] == round(52 / 57, 2)
+    asyncio.run(scenario())
+
+
+def test_repeated_game_id_is_rejected(database_clean):
+    async def push_repeated_game() -> int:
+        game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                          player_position="ANY", player_number="ANY").dict()
+        game["game_id"] = ObjectId(config("TEST_GAME_ID"))
+        return await get_repository().push_game(config("TEST_TEAM_ID"), game)
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(push_repeated_game())
+
+
+
+# Both pushes of a race pass the lookup of the id, the update itself must reject the second
+def test_repeated_game_id_is_rejected_by_the_update(monkeypatch, database_clean):
+    class PlayersWithoutLookup:
+        def __init__(self, players):
+            self.players = players
+
+        async def count_documents(self, query: dict, **options) -> int:
+            if "teams.games.game_id" in query:
+                return 0
+            return await self.players.count_documents(query, **options)
+
+        def __getattr__(self, name: str):
+            return getattr(self.players, name)
+
+    get_db_client = mongo_repository.get_db_client
+
+    class RacedDatabase:
+        def __getattr__(self, name: str):
+            collection = getattr(get_db_client(), name)
+            return PlayersWithoutLookup(collection) if name == "players" else collection
+
+        def __getitem__(self, name: str):
+            return getattr(self, name)
+
+    async def push_twice() -> int:
+        repository = MongoRepository()
+        _, team_id, _ = await player_with_game(repository)
+        monkeypatch.setattr(mongo_repository, "get_db_client", RacedDatabase)
+        game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                          player_position="ANY", player_number="ANY").dict()
+        game["game_id"] = ObjectId()
+        assert await repository.push_game(team_id, game) == 1
+        with pytest.raises(DuplicateKeyError):
+            await repository.push_game(team_id, dict(game))
+        team: dict = await repository.find_team(team_id)
+        return [team_game["game_id"] for team_game in team["games"]].count(game["game_id"])
+    assert asyncio.run(push_twice()) == 1
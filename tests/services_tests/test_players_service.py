@@ -0,0 +1,59 @@
+import asyncio
+import sys
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from repositories.memory_repository import MemoryRepository
+import services.players_service as PlayerService
+from services.game_actions_service import utc_day
+from services.players_service import period_start
+
+
+@pytest.mark.parametrize(
+    "bucket, expected",
+    [
+        ("day", date(2023, 6, 14)),
+        ("week", date(2023, 6, 12)),
+        ("month", date(2023, 6, 1))
+    ])
+def test_period_start(bucket: str, expected: date):
+    assert period_start(date(2023, 6, 14), bucket) == expected
+
+
+def test_player_timeseries(monkeypatch):
+    repository = MemoryRepository()
+    monkeypatch.setattr(PlayerService, "get_repository", lambda: repository)
+    player_id = str(ObjectId())
+
+    async def scenario():
+        for day, deltas in [
+                (datetime(2023, 5, 30), {"attack_points": 1, "attack_errors": 1}),
+                (datetime(2023, 6, 2), {"attack_points": 3, "attack_neutrals": 1}),
+                (datetime(2023, 6, 5), {"attack_errors": 2, "set_perfects": 4}),
+                (datetime(2023, 6, 5), {"attack_points": 2})]:
+            await repository.increment_daily_counters(player_id, day, deltas)
+        await repository.increment_daily_counters(str(ObjectId()), datetime(2023, 6, 2),
+                                                  {"attack_points": 9})
+        months = await PlayerService.get_player_timeseries(
+            player_id, "attack_effectiveness", "month", None, None)
+        assert [(point.period_start, point.value, point.total_actions) for point in months] == \
+            [(date(2023, 5, 1), 0.5, 2), (date(2023, 6, 1), 0.62, 12)]
+        weeks = await PlayerService.get_player_timeseries(
+            player_id, "attack_points", "week", date(2023, 5, 31), date(2023, 6, 5))
+        assert [(point.period_start, point.value) for point in weeks] == \
+            [(date(2023, 5, 29), 3), (date(2023, 6, 5), 2)]
+        with pytest.raises(Exception) as error:
+            await PlayerService.get_player_timeseries(player_id, "attack", "day", None, None)
+        assert error.value.detail == "Invalid value for metric."
+    asyncio.run(scenario())
+
+
+def test_utc_day():
+    assert utc_day(datetime(2023, 6, 14, 23, 59)) == datetime(2023, 6, 14)
+    # 23:30 in Bogota is already next day in UTC
+    bogota = timezone(timedelta(hours=-5))
+    assert utc_day(datetime(2023, 6, 14, 23, 30, tzinfo=bogota)) == datetime(2023, 6, 15)
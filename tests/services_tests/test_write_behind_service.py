@@ -0,0 +1,181 @@
+import asyncio
+import sys
+import orjson
+import pytest
+from bson import ObjectId
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from models.game_models import EndGame, Game, GameAction
+from models.player_models import NewPlayer
+from models.team_models import Team
+from repositories.memory_repository import MemoryRepository
+import services.game_actions_service as GameActionService
+import services.games_service as GameService
+import services.teams_service as TeamService
+import services.write_behind_service as WriteBehindService
+from utils.journal import Journal
+
+
+@pytest.fixture
+def repository(monkeypatch, tmp_path) -> MemoryRepository:
+    repository = MemoryRepository()
+    for module in (GameService, GameActionService, TeamService, WriteBehindService):
+        monkeypatch.setattr(module, "get_repository", lambda: repository)
+    monkeypatch.setattr(WriteBehindService, "WRITE_BEHIND", True)
+    # Flushes are only run by tests
+    monkeypatch.setattr(WriteBehindService, "WRITE_BEHIND_FLUSH_MS", 60_000)
+    monkeypatch.setattr(WriteBehindService, "JOURNAL", Journal(str(tmp_path / "journal")))
+    monkeypatch.setattr(WriteBehindService, "BUFFER", {})
+    return repository
+
+
+async def player_with_game(repository: MemoryRepository) -> tuple[str, str, str]:
+    player_id = str(await repository.insert_player(NewPlayer(
+        first_name="Calixta", last_name="Solar", category="Women", position="OH",
+        email="calixta@solar.com", password="Calypsa2023Pelitos").dict()))
+    team: dict = Team(team_name="Vakif", team_category="Women").dict()
+    team["team_id"] = ObjectId()
+    game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                      player_position="ANY", player_number="ANY").dict()
+    game["game_id"] = ObjectId()
+    await repository.push_team(player_id, team)
+    await repository.push_game(str(team["team_id"]), game)
+    return player_id, str(team["team_id"]), str(game["game_id"])
+
+
+def journal_records() -> list[dict]:
+    with open(WriteBehindService.JOURNAL.path, "rb") as journal:
+        return [orjson.loads(line) for line in journal]
+
+
+def test_actions_are_buffered_and_written_in_one_update(repository):
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        await WriteBehindService.start()
+        attack = GameAction(team_id=team_id, game_id=game_id, action="attack",
+                            action_result="point")
+        for _ in range(3):
+            game: Game = await GameService.play_game(attack, player_id)
+        assert game.attack_points == 3
+        assert game.attack_effectiveness == 1
+        # First action checked the game and was written, next ones are buffered
+        assert (await repository.find_game(game_id))["attack_points"] == 1
+        assert (await GameService.get_game_by_id(game_id)).attack_points == 3
+        assert await GameService.get_game_version(game_id) == "1.2"
+        await WriteBehindService.flush_all()
+        assert (await repository.find_game(game_id))["attack_points"] == 3
+        assert (await repository.find_player(player_id))["attack_points"] == 3
+        assert await GameService.get_game_version(game_id) == 2
+        assert [action["seq"] for action in await repository.find_game_actions(game_id)] == \
+            [1, 2, 3]
+        await GameService.play_game(attack, player_id)
+        await GameService.finish_game(EndGame(team_id=team_id, game_id=game_id))
+        game_document: dict = await repository.find_game(game_id)
+        assert (game_document["status"], game_document["attack_points"]) == (0, 4)
+        assert WriteBehindService.BUFFER == {}
+        await WriteBehindService.stop()
+    asyncio.run(scenario())
+
+
+def test_journaled_actions_survive_a_crash(repository):
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        await WriteBehindService.start()
+        for action, action_result in [("block", "point"), ("set", "error"), ("set", "error")]:
+            await GameService.play_game(GameAction(
+                team_id=team_id, game_id=game_id, action=action, action_result=action_result),
+                player_id)
+        # Worker dies before buffered actions are written
+        WriteBehindService.FLUSHER.cancel()
+        WriteBehindService.FLUSHER = None
+        WriteBehindService.JOURNAL.close()
+        WriteBehindService.BUFFER.clear()
+        assert (await repository.find_game(game_id))["set_errors"] == 0
+        await WriteBehindService.start()
+        game_document: dict = await repository.find_game(game_id)
+        assert (game_document["block_points"], game_document["set_errors"]) == (1, 2)
+        # Actions are not written again by later restarts
+        await WriteBehindService.stop()
+        await WriteBehindService.start()
+        assert (await repository.find_game(game_id))["total_actions"] == 3
+        await WriteBehindService.stop()
+    asyncio.run(scenario())
+
+
+def test_actions_scored_while_game_is_finished_are_not_dropped(repository):
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        await WriteBehindService.start()
+        attack = GameAction(team_id=team_id, game_id=game_id, action="attack",
+                            action_result="point")
+        await GameService.play_game(attack, player_id)
+        await GameService.play_game(attack, player_id)
+        finish_game = repository.finish_game
+
+        # Action arrives after buffered ones are written and before the game is finished
+        async def finish_after_action(team_id: str, game_id: str) -> int:
+            await GameService.play_game(attack, player_id)
+            return await finish_game(team_id, game_id)
+
+        repository.finish_game = finish_after_action
+        await GameService.finish_game(EndGame(team_id=team_id, game_id=game_id))
+        assert (await repository.find_game(game_id))["attack_points"] == 3
+        assert WriteBehindService.BUFFER == {}
+        await WriteBehindService.stop()
+    asyncio.run(scenario())
+
+
+def test_journal_only_keeps_actions_not_written(repository):
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        await WriteBehindService.start()
+        attack = GameAction(team_id=team_id, game_id=game_id, action="attack",
+                            action_result="point")
+        for _ in range(3):
+            await GameService.play_game(attack, player_id)
+        register_actions = repository.register_actions
+
+        # Buffer is never empty: an action arrives while every flush is written
+        async def register_during_action(*arguments) -> dict | None:
+            await GameService.play_game(attack, player_id)
+            return await register_actions(*arguments)
+
+        repository.register_actions = register_during_action
+        await WriteBehindService.flush_all()
+        records: list[dict] = journal_records()
+        assert [(record["entry"], record["action"]) for record in records] == [(3, "attack")]
+        # Worker dies, the action left in the journal is written at startup
+        repository.register_actions = register_actions
+        WriteBehindService.FLUSHER.cancel()
+        WriteBehindService.FLUSHER = None
+        WriteBehindService.JOURNAL.close()
+        WriteBehindService.BUFFER.clear()
+        await WriteBehindService.start()
+        assert (await repository.find_game(game_id))["attack_points"] == 4
+        assert journal_records() == []
+        await WriteBehindService.stop()
+    asyncio.run(scenario())
+
+
+def test_idle_games_are_dropped_from_buffer(repository, monkeypatch):
+    async def scenario():
+        player_id, team_id, game_id = await player_with_game(repository)
+        await WriteBehindService.start()
+        attack = GameAction(team_id=team_id, game_id=game_id, action="attack",
+                            action_result="point")
+        await GameService.play_game(attack, player_id)
+        await GameService.play_game(attack, player_id)
+        await WriteBehindService.flush_all()
+        assert game_id in WriteBehindService.BUFFER
+        monkeypatch.setattr(WriteBehindService, "WRITE_BEHIND_IDLE_SECONDS", 0)
+        await WriteBehindService.flush_all()
+        assert WriteBehindService.BUFFER == {}
+        # Next action is registered by the usual path and buffering starts again
+        game: Game = await GameService.play_game(attack, player_id)
+        assert game.attack_points == 3
+        assert (await repository.find_game(game_id))["attack_points"] == 3
+        assert game_id in WriteBehindService.BUFFER
+        await WriteBehindService.stop()
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import time
+import sys
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from utils.cache import TTLCache
+
+
+def test_cache_hits_and_misses():
+    cache = TTLCache(max_size=10)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "max_size": 10}
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_expiration():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1, expires_at=time.time() - 1)
+    cache.set("b", 2)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_cache_discard_where():
+    cache = TTLCache(max_size=10)
+    cache.set("a", "player1")
+    cache.set("b", "player2")
+    cache.set("c", "player1")
+    assert cache.discard_where(lambda value: value == "player1") == 2
+    assert cache.get("a") is None
+    assert cache.get("b") == "player2"
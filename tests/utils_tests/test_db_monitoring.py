@@ -0,0 +1,60 @@
+import sys
+from types import SimpleNamespace
+from bson import ObjectId
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from utils.db_monitoring import CommandMonitor, command_filter, db_call, filter_shape
+
+
+def command_events(request_id: int, command_name: str, command: dict, duration_micros: int):
+    started = SimpleNamespace(connection_id=("localhost", 27017), request_id=request_id,
+                              command_name=command_name, command=command)
+    finished = SimpleNamespace(connection_id=("localhost", 27017), request_id=request_id,
+                               command_name=command_name, duration_micros=duration_micros,
+                               reply={"ok": 1}, failure={"ok": 0})
+    return started, finished
+
+
+def test_commands_by_call_site():
+    monitor = CommandMonitor()
+    with db_call("gamesService/get_game_by_id/find_one"):
+        for request_id, duration_micros in enumerate([1000, 3000, 2000]):
+            started, succeeded = command_events(request_id, "find", {}, duration_micros)
+            monitor.started(started)
+            monitor.succeeded(succeeded)
+    started, failed = command_events(3, "update", {}, 500)
+    monitor.started(started)
+    monitor.failed(failed)
+    game_calls, unlabelled_calls = monitor.call_sites()
+    assert game_calls == {
+        "call_site": "gamesService/get_game_by_id/find_one", "command": "find", "count": 3,
+        "failures": 0, "total_ms": 6.0, "mean_ms": 2.0, "p50_ms": 2.0, "p95_ms": 3.0,
+        "max_ms": 3.0}
+    assert unlabelled_calls["call_site"] == "unlabelled"
+    assert unlabelled_calls["failures"] == 1
+
+
+def test_slow_command_logged(caplog):
+    monitor = CommandMonitor()
+    command: dict = {"update": "players",
+                     "updates": [{"q": {"_id": ObjectId(), "email": "calixta@solar.com"},
+                                  "u": {"$set": {"total_games": 2}}}]}
+    started, succeeded = command_events(1, "update", command, 250_000)
+    with db_call("teams_service/sum_team_games/update_one"):
+        monitor.started(started)
+        monitor.succeeded(succeeded)
+    assert "teams_service/sum_team_games/update_one (update) took 250.0 ms" in caplog.text
+    assert "{'_id': 'ObjectId', 'email': 'str'}" in caplog.text
+    assert "calixta" not in caplog.text
+
+
+def test_filter_shape():
+    aggregate: dict = {"aggregate": "game_actions", "pipeline": [
+        {"$match": {"team_id": ObjectId()}}, {"$group": {"_id": "$action"}}]}
+    find: dict = {"find": "players", "filter": {"_id": {"$in": [ObjectId()]}, "status": 1}}
+    assert filter_shape(command_filter("aggregate", aggregate)) == {"team_id": "ObjectId"}
+    assert filter_shape(command_filter("find", find)) == {
+        "_id": {"$in": ["ObjectId"]}, "status": "int"}
+    assert command_filter("insert", {"insert": "players", "documents": [{}]}) is None
@@ -0,0 +1,45 @@
+import sys
+from datetime import datetime
+from bson import ObjectId
+from decouple import config
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(config("PROJECT_PATH"))
+
+from models.game_models import Game
+from models.player_models import Player
+from models.response_models import ResponseModel
+from models.team_models import Team
+from schemas.player_schemas import full_player
+from utils.fast_json import encode_document, model_response
+
+
+def player_document() -> dict:
+    game: dict = Game(game_country="Colombia", game_city="Cali", opponent_team="Random",
+                      player_position="ANY", player_number="ANY").dict()
+    game.update({"game_id": ObjectId(), "attack_points": 3, "total_attacks": 4,
+                 "attack_effectiveness": 0.75,
+                 "game_date_time": datetime(2023, 5, 1, 10, 0, 0, 123000)})
+    team: dict = Team(team_name="Vakif", team_category="Women").dict()
+    team.update({"team_id": ObjectId(), "games": [game], "total_games": 1,
+                 "attack_effectiveness": 0, "player_id": ObjectId()})
+    player: dict = Player(first_name="Calixta", last_name="Solar", category="Women",
+                          position="OH", email="calixta@solar.com").dict()
+    player.update({"_id": ObjectId(), "password": "hash", "teams": [team], "total_teams": 1})
+    return player
+
+
+def test_fast_response_matches_model_response():
+    document: dict = player_document()
+    expected = JSONResponse(jsonable_encoder(ResponseModel(data=full_player(document))))
+    assert model_response(encode_document(document, Player)).body == expected.body
+
+
+def test_fast_response_skips_fields_out_of_model():
+    encoded: dict = encode_document(player_document(), Player)
+    assert "password" not in encoded
+    assert "_id" not in encoded
+    assert "player_id" not in encoded["teams"][0]
+    assert type(encoded["teams"][0]["team_id"]) == str
+    assert encoded["teams"][0]["attack_effectiveness"] == 0.0
@@ -0,0 +1,48 @@
+import asyncio
+import sys
+import pytest
+from decouple import config
+from pymongo.errors import OperationFailure
+
+sys.path.append(config("PROJECT_PATH"))
+
+import config.db.indexes as indexes
+from config.db.indexes import (create_indexes, create_indexes_sync, plan_stages,
+                               required_indexes, verify_query_plans)
+from repositories.repository import STORAGE_MODE
+
+
+def test_email_index_is_unique():
+    for storage_mode in ("embedded", "normalized"):
+        email_index = required_indexes(storage_mode)["players"][0].document
+        assert email_index["key"] == {"email": 1}
+        assert email_index["unique"]
+
+
+def test_plan_stages():
+    plan: dict = {
+        "stage": "FETCH",
+        "inputStage": {"stage": "OR", "inputStages": [
+            {"stage": "IXSCAN", "indexName": "email_unique"},
+            {"stage": "COLLSCAN"}]}}
+    assert plan_stages(plan) == ["FETCH", "OR", "IXSCAN", "COLLSCAN"]
+
+
+def test_query_plans(database_clean):
+    create_indexes_sync(STORAGE_MODE)
+    assert verify_query_plans(STORAGE_MODE) == []
+
+
+def test_unique_index_failure_stops_startup(monkeypatch):
+    class Collection:
+        def __init__(self, name: str):
+            self.name = name
+
+        async def create_indexes(self, indexes: list) -> None:
+            raise OperationFailure(f"Index build failed on {self.name}.")
+
+    monkeypatch.setattr(indexes, "REPOSITORY_BACKEND", "mongo")
+    monkeypatch.setattr(indexes, "get_db_client", lambda: {
+        collection: Collection(collection) for collection in required_indexes(STORAGE_MODE)})
+    with pytest.raises(OperationFailure):
+        asyncio.run(create_indexes())
@@ -0,0 +1,47 @@
+import asyncio
+import sys
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+import utils.live_feed as live_feed
+from utils.live_feed import GameFeed, action_event, finished_event
+
+
+def test_events_are_encoded_once_for_all_viewers(monkeypatch):
+    encoded: list[dict] = []
+    encode_event = live_feed.encode_event
+    monkeypatch.setattr(live_feed, "encode_event",
+                        lambda event: encoded.append(event) or encode_event(event))
+
+    async def scenario():
+        feed = GameFeed()
+        # Games without viewers are not encoded
+        assert feed.publish("game", action_event("game", {"attack_points": 1}, 1)) == 0
+        subscribers = [feed.subscribe("game") for _ in range(3)]
+        assert feed.publish("game", action_event("game", {"attack_points": 1}, 2)) == 3
+        assert len(encoded) == 1
+        messages = [await subscriber.next_message() for subscriber in subscribers]
+        assert messages == [messages[0]] * 3
+        assert '"total_actions":2' in messages[0]
+        feed.publish("game", finished_event("game"), final=True)
+        for subscriber in subscribers:
+            assert '"finished"' in await subscriber.next_message()
+            assert await subscriber.next_message() is None
+            feed.unsubscribe(subscriber)
+        assert feed.viewers("game") == 0
+    asyncio.run(scenario())
+
+
+def test_slow_viewers_are_disconnected(monkeypatch):
+    monkeypatch.setattr(live_feed, "LIVE_FEED_QUEUE_SIZE", 2)
+
+    async def scenario():
+        feed = GameFeed()
+        subscriber = feed.subscribe("game")
+        for total_actions in range(1, 4):
+            feed.publish("game", action_event("game", {"set_perfects": 1}, total_actions))
+        # Pending messages are dropped, viewer gets a new snapshot when reconnecting
+        assert await subscriber.next_message() is None
+        assert subscriber.queue.empty()
+    asyncio.run(scenario())
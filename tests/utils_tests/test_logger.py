@@ -0,0 +1,39 @@
+import logging
+import sys
+import orjson
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from config.logger.logger import LazyQueueHandler, get_logger
+from config.logger.logger_config import DebugSamplingFilter, JSONFormatter
+
+
+def log_record(name: str, level: int, message: str = "Game: %s.", args: tuple = ("1",)):
+    return logging.LogRecord(name, level, __file__, 1, message, args, None)
+
+
+def test_debug_sampling_by_logger():
+    sampling = DebugSamplingFilter("volleystats.games:0, volleystats.teams:1")
+    assert get_logger("games").name == "volleystats.games"
+    assert not sampling.filter(log_record("volleystats.games", logging.DEBUG))
+    # Children are sampled with their parent rate
+    assert not sampling.filter(log_record("volleystats.games.actions", logging.DEBUG))
+    assert sampling.filter(log_record("volleystats.games", logging.INFO))
+    assert sampling.filter(log_record("volleystats.teams", logging.DEBUG))
+    assert sampling.filter(log_record("volleystats", logging.DEBUG))
+    assert DebugSamplingFilter().filter(log_record("volleystats.games", logging.DEBUG))
+
+
+def test_json_format():
+    entry: dict = orjson.loads(JSONFormatter().format(log_record("volleystats", logging.INFO)))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "volleystats"
+    assert entry["message"] == "Game: 1."
+
+
+def test_queued_records_are_not_formatted():
+    record = log_record("volleystats", logging.INFO)
+    queued = LazyQueueHandler(None).prepare(record)
+    assert queued.msg == "Game: %s."
+    assert queued.args == ("1",)
@@ -0,0 +1,23 @@
+import asyncio
+import sys
+from decouple import config
+from passlib.context import CryptContext
+
+sys.path.append(config("PROJECT_PATH"))
+
+from config.password.password_context import BCRYPT_ROUNDS, hash_password, verify_password
+
+
+def test_hash_and_verify_password():
+    hashed_password: str = asyncio.run(hash_password("Calypsa2023Pelitos"))
+    assert asyncio.run(verify_password("Calypsa2023Pelitos", hashed_password)) == (True, None)
+    assert asyncio.run(verify_password("Calypsa2023Pelitoz", hashed_password)) == (False, None)
+
+
+def test_verify_password_rehashes_other_cost():
+    rounds: int = 4 if BCRYPT_ROUNDS != 4 else 5
+    old_hash: str = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash("Calypsa2023")
+    valid, new_hash = asyncio.run(verify_password("Calypsa2023", old_hash))
+    assert valid
+    assert new_hash is not None and new_hash != old_hash
+    assert asyncio.run(verify_password("Calypsa2023", new_hash)) == (True, None)
@@ -0,0 +1,76 @@
+import random
+import sys
+import pytest
+from decouple import config
+
+sys.path.append(config("PROJECT_PATH"))
+
+from models.game_models import Game
+from utils.stats_engine import apply_statistics, round_effectiveness, statistics_for
+import numpy as np
+
+
+def reference_statistics(c: dict) -> dict:
+    # Hand written arithmetic that was used by update_*_statistics
+    s: dict = {}
+    for action, success in [("attack", "point"), ("block", "point"), ("service", "point"),
+                            ("defense", "perfect"), ("reception", "perfect"), ("set", "perfect")]:
+        total = c[f"{action}_{success}s"] + c[f"{action}_neutrals"] + c[f"{action}_errors"]
+        s[f"total_{action}s"] = total
+        s[f"{action}_effectiveness"] = round(c[f"{action}_{success}s"] / total, 2) \
+            if total > 0 else 0.00
+    s["total_points"] = c["attack_points"] + c["block_points"] + c["service_points"]
+    s["total_perfects"] = c["defense_perfects"] + c["reception_perfects"] + c["set_perfects"]
+    s["total_neutrals"] = sum(c[f"{a}_neutrals"] for a in
+                              ("attack", "block", "service", "defense", "reception", "set"))
+    s["total_errors"] = sum(c[f"{a}_errors"] for a in
+                            ("attack", "block", "service", "defense", "reception", "set"))
+    s["total_actions"] = s["total_points"] + s["total_perfects"] + s["total_neutrals"] \
+        + s["total_errors"]
+    s["total_effectiveness"] = round(
+        (s["total_points"] + s["total_perfects"]) / s["total_actions"], 2) \
+        if s["total_actions"] > 0 else 0.00
+    return s
+
+
+def random_counters(generator: random.Random, maximum: int) -> dict:
+    counters: dict = {}
+    for action, success in [("attack", "point"), ("block", "point"), ("service", "point"),
+                            ("defense", "perfect"), ("reception", "perfect"), ("set", "perfect")]:
+        for result in (success, "neutral", "error"):
+            counters[f"{action}_{result}s"] = generator.randint(0, maximum)
+    return counters
+
+
+@pytest.mark.parametrize("maximum", [0, 1, 3, 40, 5000])
+def test_statistics_match_reference(maximum: int):
+    generator = random.Random(maximum)
+    documents = [random_counters(generator, maximum) for _ in range(500)]
+    results = statistics_for(documents)
+    for document, result in zip(documents, results):
+        assert result == reference_statistics(document)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [0.125, 0.375, 0.625, 1 / 8, 5 / 8, 0.005, 0.015, 0.285, 0.345, 1.005, 2.675])
+def test_round_effectiveness_matches_python_round(value: float):
+    assert round_effectiveness(np.array([value]))[0] == round(value, 2)
+
+
+def test_apply_statistics_on_model():
+    game: Game = Game(
+        game_country="Colombia",
+        game_city="Cali",
+        opponent_team="Peru",
+        player_position="OH",
+        player_number="7",
+        attack_points=2,
+        attack_errors=1,
+        reception_perfects=1)
+    game = apply_statistics(game)
+    assert game.total_attacks == 3
+    assert game.attack_effectiveness == 0.67
+    assert game.total_actions == 4
+    assert game.total_effectiveness == 0.75
+    assert type(game.total_actions) == int
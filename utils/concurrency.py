@@ -0,0 +1,12 @@
+import asyncio
+from typing import Any, Awaitable
+
+
+# Runs awaitables concurrently but raises errors in the order they were given,
+# so concurrent checks keep the same error precedence as sequential ones
+async def gather_in_order(*awaitables: Awaitable) -> list[Any]:
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
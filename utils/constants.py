@@ -5,3 +5,17 @@ TEAM_CATEGORIES = ("Men", "Women", "Mixed")
 GAME_POSITIONS = ("OH", "S", "MB", "L", "O", "ANY")
 GAME_ACTIONS = ("attack", "block", "service", "defense", "reception", "set")
 ACTION_RESULTS = ("point", "perfect", "neutral", "error")
+# Result counted as effective for each action: points for attack, block and service,
+# perfects for defense, reception and set
+ACTION_SUCCESS_RESULTS = {
+    "attack": "point",
+    "block": "point",
+    "service": "point",
+    "defense": "perfect",
+    "reception": "perfect",
+    "set": "perfect"
+}
+# Periods of player statistics time series, weeks start on Monday
+TIMESERIES_BUCKETS = ("day", "week", "month")
+# Attempts to store a new team or game with a fresh ObjectId if its id is already in use
+NEW_ID_ATTEMPTS = 3
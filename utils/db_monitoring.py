@@ -0,0 +1,149 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Iterator
+import bson
+from decouple import config
+from pymongo import monitoring
+from config.logger.logger import LOG
+
+
+# Mongo commands are timed and attributed to the service call site that issued them, the
+# label services already use for their errors (e.g. "gamesService/get_game_by_id/find_one"):
+#
+#     try:
+#         with db_call("gamesService/get_game_by_id/find_one") as call_site:
+#             game_document = await get_repository().find_game(game_id)
+#     except Exception as exception:
+#         ex.no_data_connection(call_site, exception)
+#
+# Commands slower than SLOW_OPERATION_MS are logged with their filter shape and reply size,
+# rolling stats per call site are sent by GET /metrics/db-calls.
+
+SLOW_OPERATION_MS: float = config("SLOW_OPERATION_MS", default=100, cast=float)
+# Durations kept per call site for percentiles
+CALL_SITE_WINDOW: int = config("CALL_SITE_WINDOW", default=1000, cast=int)
+UNLABELLED_CALL_SITE = "unlabelled"
+
+CALL_SITE: ContextVar[str] = ContextVar("call_site", default=UNLABELLED_CALL_SITE)
+
+
+@contextmanager
+def db_call(call_site: str) -> Iterator[str]:
+    token = CALL_SITE.set(call_site)
+    try:
+        yield call_site
+    finally:
+        CALL_SITE.reset(token)
+
+
+class CallSiteStats:
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_ms: float = 0
+        self.max_ms: float = 0
+        self.durations: deque[float] = deque(maxlen=CALL_SITE_WINDOW)
+
+    def add(self, duration_ms: float, failed: bool) -> None:
+        self.count += 1
+        self.failures += int(failed)
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.durations.append(duration_ms)
+
+    def summary(self) -> dict:
+        durations: list[float] = sorted(self.durations)
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3),
+            "p50_ms": percentile(durations, 0.5),
+            "p95_ms": percentile(durations, 0.95),
+            "max_ms": round(self.max_ms, 3)
+        }
+
+
+# Motor runs commands in worker threads with a copy of the caller context, so CALL_SITE
+# is the label of the service call that issued the command
+class CommandMonitor(monitoring.CommandListener):
+
+    def __init__(self):
+        self._lock = Lock()
+        # Commands being run, by (connection_id, request_id), to get their filter when slow
+        self._started: dict[tuple, dict] = {}
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats: dict[tuple[str, str], CallSiteStats] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, event.reply, False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, event.failure, True)
+
+    def _finish(self, event, reply: dict, failed: bool) -> None:
+        duration_ms: float = event.duration_micros / 1000
+        call_site: str = CALL_SITE.get()
+        with self._lock:
+            command: dict | None = self._started.pop((event.connection_id, event.request_id),
+                                                     None)
+            self._stats.setdefault((call_site, event.command_name), CallSiteStats()).add(
+                duration_ms, failed)
+        if duration_ms >= SLOW_OPERATION_MS:
+            shape: Any = None if command is None else \
+                filter_shape(command_filter(event.command_name, command))
+            LOG.warning("Slow DB operation: %s (%s) took %.1f ms. Filter: %s. Reply: %s bytes.",
+                        call_site, event.command_name, duration_ms, shape,
+                        len(bson.encode(reply)))
+
+    # Call sites with most time spent in DB first
+    def call_sites(self) -> list[dict]:
+        with self._lock:
+            summaries: list[dict] = [
+                {"call_site": call_site, "command": command_name, **stats.summary()}
+                for (call_site, command_name), stats in self._stats.items()]
+        return sorted(summaries, key=lambda summary: summary["total_ms"], reverse=True)
+
+
+COMMAND_MONITOR = CommandMonitor()
+
+
+# Filter of the commands sent by repositories, None for commands without one
+def command_filter(command_name: str, command: dict) -> Any:
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name in ("update", "delete"):
+        statements: list[dict] = command.get(f"{command_name}s", [])
+        return statements[0].get("q") if len(statements) > 0 else None
+    if command_name == "aggregate":
+        return next((stage["$match"] for stage in command.get("pipeline", [])
+                     if "$match" in stage), None)
+    return None
+
+
+# Filter with values replaced by their type names, e.g. {"_id": {"$gt": "ObjectId"}}, so
+# queries can be logged without personal data
+def filter_shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(item) for item in value]
+    return type(value).__name__
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if len(values) == 0:
+        return 0
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 3)
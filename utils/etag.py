@@ -0,0 +1,27 @@
+from fastapi import Response, status
+
+
+# Player, team and game reads are sent with a strong ETag built from the id and version of
+# the document. Clients polling them send it back in If-None-Match and get 304 Not Modified,
+# checked by reading only the version, until the document changes.
+
+
+def entity_tag(entity_id: str, version: int | str) -> str:
+    return f"\"{entity_id}-{version}\""
+
+
+# Weak comparison, as If-None-Match requires (RFC 9110)
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags: list[str] = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+
+# Cached copies must be revalidated, as documents change while games are played
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
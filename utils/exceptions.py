@@ -64,8 +64,8 @@ def unable_to_create_team() -> Exception:
 
 
 def active_game(game) -> Exception:
-    LOG.debug(f"Active game: id {game.game_id}, started at {game.game_date_time}, \
-        vs {game.opponent_team}.")
+    LOG.debug("Active game: id %s, started at %s, vs %s.",
+              game.game_id, game.game_date_time, game.opponent_team)
     LOG.warning("There is another active game error response sent.")
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                         detail=f"There is another active game. Game with id {game.game_id}," +
@@ -116,7 +116,7 @@ def invalid_action_and_action_result() -> Exception:
 
 
 def no_data_connection(method: str, e: Exception) -> Exception:
-    LOG.warning(f"No connection with database. Method: {method}. Error: -> {e}")
+    LOG.warning("No connection with database. Method: %s. Error: -> %s", method, e)
     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail="No connection with database.")
 
@@ -140,6 +140,6 @@ def unable_to_delete_team() -> Exception:
 
 
 def invalid_value(value: str) -> Exception:
-    LOG.warning(f"Invalid value for {value} response sent.")
+    LOG.warning("Invalid value for %s response sent.", value)
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                         detail=f"Invalid value for {value}.")
@@ -0,0 +1,68 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+# Opt-in response path for big reads: raw MongoDB documents are encoded straight to JSON
+# bytes with the fields of their response model (same names and order, same number
+# types), so neither models nor jsonable_encoder have to walk the whole document.
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _converter(field_type: Any) -> Callable[[Any], Any]:
+    if isinstance(field_type, type) and issubclass(field_type, BaseModel):
+        return lambda document: encode_document(document, field_type)
+    if field_type in (int, float, str):
+        return field_type
+    if field_type is datetime:
+        return lambda value: value
+    raise TypeError(f"Field type not supported by fast JSON path: {field_type}")
+
+
+# (name, default, converter, is_list) for every field of model, built once per model
+@lru_cache(maxsize=None)
+def _plan(model: type[BaseModel]) -> tuple:
+    plan: list[tuple] = []
+    for name, field in model.__fields__.items():
+        is_list: bool = field.outer_type_ is not field.type_
+        plan.append((name, field.get_default(), _converter(field.type_), is_list))
+    return tuple(plan)
+
+
+# Documents returned by schemas full_* functions are all keyed by their model fields,
+# ObjectId values of str fields (team_id, game_id) are converted as schemas do
+def encode_document(document: dict, model: type[BaseModel]) -> dict:
+    encoded: dict = {}
+    for name, default, convert, is_list in _plan(model):
+        value = document.get(name, default)
+        if value is None:
+            encoded[name] = None
+        elif is_list:
+            encoded[name] = [convert(item) for item in value]
+        else:
+            encoded[name] = convert(value)
+    return encoded
+
+
+def encode_documents(documents: list[dict], model: type[BaseModel]) -> list[dict]:
+    return [encode_document(document, model) for document in documents]
+
+
+# Same body as ResponseModel(data=..., detail=...)
+def model_response(data: Any, detail: str = None, headers: dict[str, str] = None,
+                   **fields: Any) -> FastJSONResponse:
+    return FastJSONResponse({"detail": detail, "data": data, **fields}, headers=headers)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from typing import Any
+import orjson
+from utils.fast_json import json_default
+
+
+# Append-only file of JSON records, one per line. A record is only acknowledged once it is
+# on disk (fsync), so acknowledged records survive a crash of the process or the host.
+# A record cut by a crash while being written was never acknowledged and is skipped.
+class Journal:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        # Records appended since the journal was opened or last rewritten
+        self.appended = 0
+
+    # Opens journal for appending and returns the records already in it
+    def open(self) -> list[dict[str, Any]]:
+        records: list[dict[str, Any]] = []
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as journal:
+                for line in journal:
+                    try:
+                        records.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        continue
+        self._file = open(self.path, "ab")
+        self.appended = 0
+        return records
+
+    # Record is written before returning, so records keep the order of the calls, and is
+    # acknowledged when the returned fsync is awaited
+    def append(self, record: dict[str, Any]) -> asyncio.Future:
+        self._file.write(orjson.dumps(record, default=json_default) + b"\n")
+        self._file.flush()
+        self.appended += 1
+        return asyncio.ensure_future(asyncio.to_thread(self._sync, self._file))
+
+    def _sync(self, file) -> None:
+        try:
+            os.fsync(file.fileno())
+        except (OSError, ValueError):
+            # File was replaced by rewrite, which synced the records kept before replacing it
+            if file is self._file:
+                raise
+
+    # Replaces the journal with records, the ones left out are dropped. New file is synced
+    # and then renamed over the old one, a crash leaves one of both complete.
+    def rewrite(self, records: list[dict[str, Any]]) -> None:
+        temporary: str = f"{self.path}.tmp"
+        with open(temporary, "wb") as journal:
+            for record in records:
+                journal.write(orjson.dumps(record, default=json_default) + b"\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary, self.path)
+        directory: int = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._file.close()
+        self._file = open(self.path, "ab")
+        self.appended = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,129 @@
+import asyncio
+from threading import Lock
+from typing import Any
+import orjson
+from decouple import config
+from starlette.websockets import WebSocket
+from utils.fast_json import json_default
+
+
+# In process fan-out of game updates to the viewers following them (WS /games/{game_id}/live).
+# Updates are encoded once per event and the same text is queued for every viewer, so a
+# game with many viewers costs one DB write per action instead of one read per poll.
+#
+# Viewers are only fed by the process that registered the action: with several API
+# workers, a viewer must be connected to the same worker as the scorer (sticky sessions).
+
+# Messages kept for a viewer that does not read them, a viewer going over it is
+# disconnected and gets a new snapshot when reconnecting
+LIVE_FEED_QUEUE_SIZE: int = config("LIVE_FEED_QUEUE_SIZE", default=256, cast=int)
+
+
+class Subscriber:
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=LIVE_FEED_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+
+    # None closes the feed of the subscriber
+    def deliver(self, message: str | None) -> None:
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = None
+        self.queue.put_nowait(message)
+
+    async def next_message(self) -> str | None:
+        return await self.queue.get()
+
+
+class GameFeed:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers: dict[str, set[Subscriber]] = {}
+
+    def subscribe(self, game_id: str) -> Subscriber:
+        subscriber = Subscriber(game_id)
+        with self._lock:
+            self._subscribers.setdefault(game_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers: set[Subscriber] = self._subscribers.get(subscriber.game_id, set())
+            subscribers.discard(subscriber)
+            if len(subscribers) == 0:
+                self._subscribers.pop(subscriber.game_id, None)
+
+    def viewers(self, game_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(game_id, ()))
+
+    # Returns the number of viewers the event was sent to, events of games without viewers
+    # are not encoded. Viewers are closed after a final event (game finished).
+    def publish(self, game_id: str, event: dict[str, Any], final: bool = False) -> int:
+        with self._lock:
+            subscribers: list[Subscriber] = list(self._subscribers.get(game_id, ()))
+        if len(subscribers) == 0:
+            return 0
+        message: str = encode_event(event)
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        for subscriber in subscribers:
+            for item in (message, None) if final else (message,):
+                if subscriber.loop is running_loop:
+                    subscriber.deliver(item)
+                else:
+                    subscriber.loop.call_soon_threadsafe(subscriber.deliver, item)
+        return len(subscribers)
+
+
+LIVE_FEED = GameFeed()
+
+
+def encode_event(event: dict[str, Any]) -> str:
+    return orjson.dumps(event, default=json_default).decode()
+
+
+# Snapshot is sent first to every viewer. Viewers subscribe before it is read, so actions
+# with total_actions not over the one of the snapshot are already counted in it.
+def snapshot_event(game_id: str, game: dict[str, Any]) -> dict[str, Any]:
+    return {"event": "snapshot", "game_id": game_id, "game": game}
+
+
+def action_event(game_id: str, deltas: dict[str, int], total_actions: int) -> dict[str, Any]:
+    return {"event": "action", "game_id": game_id, "deltas": deltas,
+            "total_actions": total_actions}
+
+
+def finished_event(game_id: str) -> dict[str, Any]:
+    return {"event": "finished", "game_id": game_id}
+
+
+# Sends the messages of subscriber until its feed is closed (returns True) or the viewer
+# disconnects (returns False), messages sent by viewers are ignored
+async def stream(websocket: WebSocket, subscriber: Subscriber) -> bool:
+    disconnected: asyncio.Future = asyncio.ensure_future(wait_for_disconnect(websocket))
+    try:
+        while True:
+            next_message: asyncio.Future = asyncio.ensure_future(subscriber.next_message())
+            await asyncio.wait({next_message, disconnected},
+                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_message.cancel()
+                return False
+            message: str | None = next_message.result()
+            if message is None:
+                return True
+            await websocket.send_text(message)
+    finally:
+        disconnected.cancel()
+
+
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
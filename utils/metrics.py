@@ -0,0 +1,222 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from pymongo import monitoring
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Request and database metrics kept in process and exposed at GET /metrics in Prometheus
+# text format. Requests are labelled by route template (e.g. /games/{game_id}), not by
+# path, so ids do not create new series; paths without route are labelled "unmatched".
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_OPERATIONS_BUCKETS: tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # Last count is for values over the highest bucket (+Inf)
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+# Mongo operations of one request, updated by COMMAND_METRICS from Motor worker threads
+class RequestMetrics:
+
+    def __init__(self):
+        self.db_operations = 0
+        self.db_seconds: float = 0
+        self.error: str | None = None
+        self._lock = Lock()
+
+    def add_db_operation(self, seconds: float) -> None:
+        with self._lock:
+            self.db_operations += 1
+            self.db_seconds += seconds
+
+
+CURRENT_REQUEST: ContextVar[RequestMetrics | None] = ContextVar("current_request", default=None)
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            # Keys are (method, route) or (method, route, status/error)
+            self.requests: dict[tuple[str, ...], int] = {}
+            self.in_flight: dict[tuple[str, ...], int] = {}
+            self.errors: dict[tuple[str, ...], int] = {}
+            self.latency: dict[tuple[str, ...], Histogram] = {}
+            self.db_operations: dict[tuple[str, ...], Histogram] = {}
+            self.db_seconds: dict[tuple[str, ...], float] = {}
+
+    def request_started(self, route: tuple[str, str]) -> None:
+        with self._lock:
+            self.in_flight[route] = self.in_flight.get(route, 0) + 1
+
+    def request_finished(self, route: tuple[str, str], status: int, seconds: float,
+                         request: RequestMetrics) -> None:
+        with self._lock:
+            self.in_flight[route] -= 1
+            key: tuple[str, ...] = (*route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if request.error is not None:
+                key = (*route, request.error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.db_operations.setdefault(
+                route, Histogram(DB_OPERATIONS_BUCKETS)).observe(request.db_operations)
+            self.db_seconds[route] = self.db_seconds.get(route, 0) + request.db_seconds
+
+    def render(self) -> str:
+        with self._lock:
+            lines: list[str] = []
+            add_samples(lines, "http_requests_total", "counter",
+                        "Requests handled, by route and status code.",
+                        ("method", "route", "status"), self.requests)
+            add_histograms(lines, "http_request_duration_seconds",
+                           "Time to handle requests, response body included.", self.latency)
+            add_samples(lines, "http_requests_in_flight", "gauge",
+                        "Requests being handled.", ("method", "route"), self.in_flight)
+            add_samples(lines, "http_request_errors_total", "counter",
+                        "Error responses, by utils.exceptions function or exception type.",
+                        ("method", "route", "error"), self.errors)
+            add_histograms(lines, "db_operations_per_request",
+                           "Mongo operations issued by each request.", self.db_operations)
+            add_samples(lines, "db_operation_seconds_total", "counter",
+                        "Time spent in Mongo operations issued by requests.",
+                        ("method", "route"), self.db_seconds)
+            return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+# Registered in the Mongo clients: operations are added to the request that issued them,
+# operations out of requests (startup, scripts) are not counted
+class CommandMetrics(monitoring.CommandListener):
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        add_db_operation(event.duration_micros)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        add_db_operation(event.duration_micros)
+
+
+def add_db_operation(duration_micros: int) -> None:
+    # Motor runs operations with a copy of the caller context, so the request is found here
+    request: RequestMetrics | None = CURRENT_REQUEST.get()
+    if request is not None:
+        request.add_db_operation(duration_micros / 1_000_000)
+
+
+COMMAND_METRICS = CommandMetrics()
+
+
+# Name of the utils.exceptions function that raised exception, otherwise its type
+def error_type(exception: BaseException) -> str:
+    error: str = type(exception).__name__
+    traceback = exception.__traceback__
+    while traceback is not None:
+        if traceback.tb_frame.f_globals.get("__name__") == "utils.exceptions":
+            error = traceback.tb_frame.f_code.co_name
+        traceback = traceback.tb_next
+    return error
+
+
+# Called by exception handlers, that turn exceptions into responses before they get to
+# MetricsMiddleware
+def record_error(exception: BaseException) -> None:
+    request: RequestMetrics | None = CURRENT_REQUEST.get()
+    if request is not None:
+        request.error = error_type(exception)
+
+
+def route_template(scope: Scope) -> str:
+    partial: str | None = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route: tuple[str, str] = (scope["method"], route_template(scope))
+        request = RequestMetrics()
+        token = CURRENT_REQUEST.set(request)
+        status: int = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        METRICS.request_started(route)
+        start: float = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exception:
+            record_error(exception)
+            raise
+        finally:
+            METRICS.request_finished(route, status, time.perf_counter() - start, request)
+            CURRENT_REQUEST.reset(token)
+
+
+def add_samples(lines: list[str], name: str, kind: str, description: str,
+                label_names: tuple[str, ...], samples: dict[tuple[str, ...], float]) -> None:
+    lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for labels, value in sorted(samples.items()):
+        lines.append(f"{name}{{{label_pairs(label_names, labels)}}} {value}")
+
+
+def add_histograms(lines: list[str], name: str, description: str,
+                   histograms: dict[tuple[str, ...], Histogram]) -> None:
+    lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for labels, histogram in sorted(histograms.items()):
+        pairs: str = label_pairs(("method", "route"), labels)
+        cumulative: int = 0
+        for bucket, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{pairs},le="{bucket}"}} {cumulative}')
+        lines += [f"{name}_sum{{{pairs}}} {histogram.sum}",
+                  f"{name}_count{{{pairs}}} {cumulative}"]
+
+
+def label_pairs(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -0,0 +1,46 @@
+from contextlib import aclosing
+from typing import Any, AsyncIterator
+import orjson
+from decouple import config
+from pydantic import BaseModel
+from config.logger.logger import LOG
+from utils.db_monitoring import db_call
+from utils.fast_json import encode_document, json_default
+
+
+# Admin listings are read with keyset pagination: repositories yield (cursor, document)
+# pairs in a stable order and a page resumes right after the cursor of its last item
+PAGE_SIZE: int = config("PAGE_SIZE", default=100, cast=int)
+MAX_PAGE_SIZE: int = config("MAX_PAGE_SIZE", default=1000, cast=int)
+NDJSON_MEDIA_TYPE: str = "application/x-ndjson"
+
+
+# Reads limit + 1 items to know if there is a next page without counting documents,
+# returns the page and the cursor to resume from (None for last page)
+async def take_page(items: AsyncIterator[tuple[str, Any]],
+                    limit: int) -> tuple[list[Any], str | None]:
+    page: list[Any] = []
+    next_cursor: str | None = None
+    async with aclosing(items):
+        async for cursor, item in items:
+            if len(page) == limit:
+                return page, next_cursor
+            page.append(item)
+            next_cursor = cursor
+    return page, None
+
+
+# One JSON document per line, serialized as the repository yields them so memory does not
+# grow with the collection. Status is already sent when a read fails, so the error is logged
+# and raised again to cut the stream short.
+async def ndjson_lines(items: AsyncIterator[tuple[str, dict]], model: type[BaseModel],
+                       method: str) -> AsyncIterator[bytes]:
+    async with aclosing(items):
+        try:
+            with db_call(method):
+                async for _, item in items:
+                    line: bytes = orjson.dumps(encode_document(item, model), default=json_default)
+                    yield line + b"\n"
+        except Exception as exception:
+            LOG.error("Stream interrupted at %s. Error: %s.", method, exception)
+            raise
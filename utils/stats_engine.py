@@ -0,0 +1,99 @@
+from typing import Any
+import numpy as np
+from utils.constants import ACTION_RESULTS, ACTION_SUCCESS_RESULTS, GAME_ACTIONS
+
+
+# Counters of an entity (game, team or player) are laid out as a 6 x 4 matrix: one row
+# per action and one column per result. Combinations that are not valid for an action
+# (e.g. attack perfects) do not exist in models and are always zero.
+COUNTER_FIELDS: tuple = tuple(
+    f"{action}_{result}s" for action in GAME_ACTIONS for result in ACTION_RESULTS)
+
+# Counters that are actually stored in games, teams and players
+STORED_COUNTER_FIELDS: tuple = tuple(
+    f"{action}_{result}s" for action in GAME_ACTIONS
+    for result in (ACTION_SUCCESS_RESULTS[action], "neutral", "error"))
+
+_POINT = ACTION_RESULTS.index("point")
+_PERFECT = ACTION_RESULTS.index("perfect")
+_NEUTRAL = ACTION_RESULTS.index("neutral")
+_ERROR = ACTION_RESULTS.index("error")
+_ACTION_ROWS = np.arange(len(GAME_ACTIONS))
+_SUCCESS_COLUMNS = np.array(
+    [ACTION_RESULTS.index(ACTION_SUCCESS_RESULTS[action]) for action in GAME_ACTIONS])
+
+
+def _value(entity: Any, field: str) -> int:
+    if isinstance(entity, dict):
+        return entity.get(field, 0)
+    return getattr(entity, field, 0)
+
+
+def counters_matrix(entities: list) -> np.ndarray:
+    # Entities can be documents (dicts) or models, result has shape (n, 6, 4)
+    values = [[_value(entity, field) for field in COUNTER_FIELDS] for entity in entities]
+    return np.array(values, dtype=np.int64).reshape(
+        len(entities), len(GAME_ACTIONS), len(ACTION_RESULTS))
+
+
+def round_effectiveness(values: np.ndarray) -> np.ndarray:
+    # Same result as python's round(value, 2): np.round scales by 100 before rounding,
+    # so values next to a half are rounded again one by one with python's round
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    halves = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if halves.any():
+        rounded[halves] = [round(float(value), 2) for value in values[halves]]
+    return rounded
+
+
+def _effectiveness(effective: np.ndarray, total: np.ndarray) -> np.ndarray:
+    ratio = np.divide(effective, total, out=np.zeros(total.shape, dtype=np.float64),
+                      where=total > 0)
+    return round_effectiveness(ratio)
+
+
+def compute_statistics(counters: np.ndarray) -> dict[str, np.ndarray]:
+    # Totals and effectiveness for every entity in counters at once
+    totals = counters.sum(axis=2)
+    success = counters[:, _ACTION_ROWS, _SUCCESS_COLUMNS]
+    effectiveness = _effectiveness(success, totals)
+    statistics: dict[str, np.ndarray] = {}
+    for index, action in enumerate(GAME_ACTIONS):
+        statistics[f"total_{action}s"] = totals[:, index]
+        statistics[f"{action}_effectiveness"] = effectiveness[:, index]
+    by_result = counters.sum(axis=1)
+    statistics["total_points"] = by_result[:, _POINT]
+    statistics["total_perfects"] = by_result[:, _PERFECT]
+    statistics["total_neutrals"] = by_result[:, _NEUTRAL]
+    statistics["total_errors"] = by_result[:, _ERROR]
+    statistics["total_actions"] = by_result.sum(axis=1)
+    statistics["total_effectiveness"] = _effectiveness(
+        by_result[:, _POINT] + by_result[:, _PERFECT], statistics["total_actions"])
+    return statistics
+
+
+def statistics_for(entities: list) -> list[dict]:
+    # One dict of derived statistics (python ints and floats) per entity
+    if len(entities) == 0:
+        return []
+    columns = {field: values.tolist()
+               for field, values in compute_statistics(counters_matrix(entities)).items()}
+    return [{field: values[index] for field, values in columns.items()}
+            for index in range(len(entities))]
+
+
+def apply_statistics(entity: Any) -> Any:
+    # Updates derived statistics of a single model or document in place
+    for field, value in statistics_for([entity])[0].items():
+        if isinstance(entity, dict):
+            entity[field] = value
+        else:
+            setattr(entity, field, value)
+    return entity
+
+
+def statistics_from_counts(counts: dict[str, int]) -> dict:
+    # Full set of stored counters (missing ones as zero) plus their derived statistics
+    counters: dict = {field: counts.get(field, 0) for field in STORED_COUNTER_FIELDS}
+    return apply_statistics(counters)
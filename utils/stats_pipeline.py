@@ -0,0 +1,107 @@
+from bson import ObjectId
+from utils.constants import ACTION_SUCCESS_RESULTS, GAME_ACTIONS
+
+
+# Builders for MongoDB update pipelines that register game actions server-side.
+# Field references are given as prefixes: "$" for player document root,
+# "$$t." for a team inside $map and "$$g." for a game inside $map.
+
+
+def counter_name(action: str, action_result: str) -> str:
+    return f"{action}_{action_result}s"
+
+
+def _sum(fields: list[str], ref: str) -> dict:
+    return {"$add": [f"{ref}{field}" for field in fields]}
+
+
+def _effectiveness(effective: dict, total: dict) -> dict:
+    return {"$cond": [
+        {"$gt": [total, 0]},
+        {"$round": [{"$divide": [effective, total]}, 2]},
+        0.00]}
+
+
+def increments(deltas: dict[str, int], ref: str) -> dict:
+    return {field: {"$add": [f"{ref}{field}", delta]} for field, delta in deltas.items()}
+
+
+# Version of the document (or element) is increased on every write, read as a strong ETag
+def next_version(ref: str) -> dict:
+    return {"$add": [{"$ifNull": [f"{ref}version", 0]}, 1]}
+
+
+def derived_statistics(ref: str) -> dict:
+    # Same arithmetic as update_*_statistics, computed from counters already stored
+    statistics: dict = {}
+    for action in GAME_ACTIONS:
+        success: str = ACTION_SUCCESS_RESULTS[action]
+        counters = [counter_name(action, result) for result in (success, "neutral", "error")]
+        total: dict = _sum(counters, ref)
+        statistics[f"total_{action}s"] = total
+        statistics[f"{action}_effectiveness"] = _effectiveness(f"{ref}{counters[0]}", total)
+    points = _sum([counter_name(action, "point") for action in GAME_ACTIONS[0:3]], ref)
+    perfects = _sum([counter_name(action, "perfect") for action in GAME_ACTIONS[3:]], ref)
+    neutrals = _sum([counter_name(action, "neutral") for action in GAME_ACTIONS], ref)
+    errors = _sum([counter_name(action, "error") for action in GAME_ACTIONS], ref)
+    actions = {"$add": [points, perfects, neutrals, errors]}
+    statistics["total_points"] = points
+    statistics["total_perfects"] = perfects
+    statistics["total_neutrals"] = neutrals
+    statistics["total_errors"] = errors
+    statistics["total_actions"] = actions
+    statistics["total_effectiveness"] = _effectiveness({"$add": [points, perfects]}, actions)
+    return statistics
+
+
+def _in_team_and_game(team_id: ObjectId, game_id: ObjectId,
+                      team_fields: dict, game_fields: dict) -> dict:
+    # Rewrites only the matching team and game, every other element is kept as is
+    return {"$map": {
+        "input": "$teams",
+        "as": "t",
+        "in": {"$cond": [
+            {"$eq": ["$$t.team_id", team_id]},
+            {"$mergeObjects": ["$$t", {
+                **team_fields,
+                "games": {"$map": {
+                    "input": "$$t.games",
+                    "as": "g",
+                    "in": {"$cond": [
+                        {"$eq": ["$$g.game_id", game_id]},
+                        {"$mergeObjects": ["$$g", game_fields]},
+                        "$$g"]}}}}]},
+            "$$t"]}}}
+
+
+def register_actions_pipeline(team_id: ObjectId, game_id: ObjectId,
+                              deltas: dict[str, int]) -> list[dict]:
+    # First stage adds counters to game, team and player, second one recomputes
+    # totals and effectiveness of the three levels from the updated counters
+    return [
+        {"$set": {
+            **increments(deltas, "$"),
+            "version": next_version("$"),
+            "teams": _in_team_and_game(
+                team_id, game_id,
+                {**increments(deltas, "$$t."), "version": next_version("$$t.")},
+                {**increments(deltas, "$$g."), "version": next_version("$$g.")})}},
+        {"$set": {
+            **derived_statistics("$"),
+            "teams": _in_team_and_game(
+                team_id, game_id, derived_statistics("$$t."), derived_statistics("$$g."))}}]
+
+
+def register_document_actions_pipeline(deltas: dict[str, int]) -> list[dict]:
+    # Same as register_actions_pipeline for a game, team or player stored as its own document
+    return [
+        {"$set": {**increments(deltas, "$"), "version": next_version("$")}},
+        {"$set": derived_statistics("$")}]
+
+
+def active_game_filter(player_id: ObjectId, team_id: ObjectId, game_id: ObjectId) -> dict:
+    return {
+        "_id": player_id,
+        "teams": {"$elemMatch": {
+            "team_id": team_id,
+            "games": {"$elemMatch": {"game_id": game_id, "status": 1}}}}}